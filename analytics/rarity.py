@@ -0,0 +1,178 @@
+"""
+This is a rarity engine for scraped NFT collections which explodes the trait arrays of the assets into a compact
+trait-frequency index and scores every token with vectorized group operations
+
+Every trait type a token lacks counts as a trait of its own, valued MISSING_VALUE, as the absence of a common trait is
+as rare as the trait itself is common. The scores are:
+    rarity_score                The sum of 1 / frequency over the token's traits, as ranked by most rarity tools
+    statistical_rarity          The product of the frequencies of the token's traits; the lower, the rarer
+    information_content         The sum of -log2(frequency) over the token's traits, in bits
+    trait_count_rarity          1 / frequency of the token's number of traits
+"""
+
+import numpy as np
+import pandas as pd
+
+from utils.decoding import loads
+
+
+MISSING_VALUE = '<missing>'
+DEFAULT_ID_COLUMNS = ('token_id', 'name')
+
+
+def loadTraits(value):
+    """
+    Reads the traits of one asset, which the frame builder keeps as a JSON string
+
+    :param value:                   JSON string or list of trait dicts
+    :return:                        List of trait dicts
+    """
+
+    if isinstance(value, str):
+        value = loads(value) if value else []
+    return value if isinstance(value, list) else []
+
+
+def sumByToken(tokens, weights, n):
+    """
+    Sums the weights of the rows of every token; np.bincount returns integers when there are no rows at all, such as
+    for a collection without traits, which the float scores could not be added to
+
+    :param tokens:                  NumPy array of the token position of each row
+    :param weights:                 NumPy array of the weight of each row
+    :param n:                       Number of tokens
+    :return:                        NumPy float array indexed by token position
+    """
+
+    return np.bincount(tokens, weights=weights, minlength=n).astype('float64', copy=False)
+
+
+class TraitIndex:
+    """
+    Long table of (token, trait type, value) with categorical codes, and the frequency of every trait value across the
+    collection, including the frequency of lacking each trait type
+    """
+
+    def __init__(self, frame, traits_column='traits'):
+        """
+        :param frame:                   Pandas DataFrame of the assets of one collection, one row per token
+        :param traits_column:           Column holding the trait arrays
+        """
+
+        self.tokens = len(frame)
+        traits = frame[traits_column].map(loadTraits).reset_index(drop=True).explode().dropna()
+        records = pd.DataFrame.from_records([trait if isinstance(trait, dict) else {} for trait in traits.values],
+                                            columns=['trait_type', 'value'])
+        records['token'] = traits.index.to_numpy(dtype='int64')
+        records = records.dropna(subset=['trait_type'])
+
+        self.traits = pd.DataFrame({'token': records['token'].to_numpy(),
+                                    'trait_type': records['trait_type'].astype(str).astype('category'),
+                                    'value': records['value'].astype(str).astype('category')})
+
+        # each token counts once per trait type when working out who lacks it
+        present = self.traits[['token', 'trait_type']].drop_duplicates()
+        self.present = present
+        self.type_counts = present.groupby('trait_type', observed=True).size()
+        self.missing_counts = self.tokens - self.type_counts
+
+        counts = self.traits.groupby(['trait_type', 'value'], observed=True).size().rename('count')
+        missing = self.missing_counts[self.missing_counts > 0]
+        missing.index = pd.MultiIndex.from_arrays([missing.index.astype(str), [MISSING_VALUE] * len(missing)],
+                                                  names=['trait_type', 'value'])
+        counts.index = pd.MultiIndex.from_arrays([counts.index.get_level_values(0).astype(str),
+                                                  counts.index.get_level_values(1).astype(str)],
+                                                 names=['trait_type', 'value'])
+        self.counts = pd.concat([counts, missing.rename('count')]).sort_index()
+
+    def frequencies(self):
+        """
+        Returns how often each trait value occurs across the collection
+
+        :return:                        Pandas DataFrame of trait_type, value, count and frequency
+        """
+
+        frame = self.counts.reset_index()
+        frame['frequency'] = frame['count'] / self.tokens
+        return frame.sort_values(['trait_type', 'count'], ascending=[True, False], ignore_index=True)
+
+    def traitCounts(self):
+        """
+        Returns the number of trait types every token has
+
+        :return:                        NumPy array indexed by token position
+        """
+
+        return np.bincount(self.present['token'].to_numpy(), minlength=self.tokens)
+
+    def score(self, include_missing=True, include_trait_count=True):
+        """
+        Scores every token of the collection
+
+        :param include_missing:         Count every trait type a token lacks as a trait valued MISSING_VALUE
+        :param include_trait_count:     Count the number of traits of a token as a trait of its own
+        :return:                        Pandas DataFrame of the scores, indexed by token position
+        """
+
+        n = self.tokens
+        tokens = self.traits['token'].to_numpy()
+
+        # frequency of each row's trait value, looked up through the group sizes
+        frequency = self.traits.groupby(['trait_type', 'value'], observed=True)['token'].transform('size') \
+            .to_numpy(dtype='float64') / n
+        rarity = sumByToken(tokens, 1 / frequency, n)
+        log_probability = sumByToken(tokens, np.log(frequency), n)
+
+        if include_missing:
+            # every token lacks every trait type, less the ones it has
+            missing_frequency = (self.missing_counts / n).astype('float64')
+            lacking = missing_frequency[missing_frequency > 0]
+            present_frequency = self.present['trait_type'].map(missing_frequency).to_numpy(dtype='float64')
+            present_tokens = self.present['token'].to_numpy()
+            has_lacking = present_frequency > 0
+
+            rarity += (1 / lacking).sum() - sumByToken(present_tokens[has_lacking],
+                                                       1 / present_frequency[has_lacking], n)
+            log_probability += np.log(lacking).sum() - sumByToken(present_tokens[has_lacking],
+                                                                  np.log(present_frequency[has_lacking]), n)
+
+        trait_count = self.traitCounts()
+        count_frequency = np.bincount(trait_count)[trait_count] / n
+        if include_trait_count:
+            rarity += 1 / count_frequency
+            log_probability += np.log(count_frequency)
+
+        return pd.DataFrame({'trait_count': trait_count,
+                             'rarity_score': rarity,
+                             'statistical_rarity': np.exp(log_probability),
+                             'information_content': -log_probability / np.log(2),
+                             'trait_count_rarity': 1 / count_frequency})
+
+
+def rankRarity(frame, traits_column='traits', id_columns=DEFAULT_ID_COLUMNS, by='rarity_score',
+               include_missing=True, include_trait_count=True):
+    """
+    Scores and ranks the tokens of one collection by rarity
+
+    :param frame:                   Pandas DataFrame of the assets of one collection, one row per token
+    :param traits_column:           Column holding the trait arrays
+    :param id_columns:              Columns identifying the tokens, copied into the ranking where the frame has them
+    :param by:                      Score to rank by, one of rarity_score, statistical_rarity or information_content
+    :param include_missing:         Count every trait type a token lacks as a trait valued MISSING_VALUE
+    :param include_trait_count:     Count the number of traits of a token as a trait of its own
+    :return:                        Pandas DataFrame of the scores with a rank column, rarest token first
+    """
+
+    if traits_column not in frame.columns:
+        raise KeyError(f'Error: DataFrame has no {traits_column} column to rank by. Try again.')
+    if by not in ('rarity_score', 'statistical_rarity', 'information_content'):
+        raise ValueError(f'Error: Cannot rank by {by}. Try again.')
+
+    scores = TraitIndex(frame, traits_column).score(include_missing, include_trait_count)
+    ids = frame[[column for column in id_columns if column in frame.columns]].reset_index(drop=True)
+    ranking = pd.concat([ids, scores], axis=1)
+
+    # statistical rarity is a probability, so the rarest token has the lowest one
+    ascending = by == 'statistical_rarity'
+    ranking['rank'] = ranking[by].rank(method='min', ascending=ascending).astype('int64')
+    return ranking.sort_values('rank', kind='stable', ignore_index=True)
@@ -0,0 +1,344 @@
+"""
+This is a time-series engine for scraped Opensea events which normalizes the prices to ETH and USD and aggregates them
+into resampled OHLC, volume and floor series per collection
+
+The series are kept as one row of running state per collection and time bucket, so a refresh only aggregates the
+events it has not seen before and merges them into the buckets they fall in:
+    open, close                 Unit price of the first and last sale of the bucket
+    high, low                   Highest and lowest unit price of the bucket
+    volume_eth, volume_usd      Total value of the sales of the bucket
+    sales                       Number of sales in the bucket
+    floor                       Lowest unit price asked by the listings created in the bucket
+"""
+
+import os
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from pandas.tseries.frequencies import to_offset
+from utils.decoding import loads
+from utils.frame_builder import serializeNested
+
+
+DEFAULT_SERIES_DIR = os.path.join(os.environ.get('NFTSCRAPER_DATA_DIR', os.path.join(os.getcwd(), 'data')), 'series')
+CURRENCIES = ('eth', 'usd')
+SALE_EVENT = 'successful'
+LISTING_EVENT = 'created'
+# fields identifying an event when the extraction does not hold the id of the events
+KEY_COLUMNS = ('created_date', 'event_type', 'asset', 'asset_bundle', 'from_account', 'to_account', 'total_price',
+               'starting_price', 'quantity')
+STATE_COLUMNS = ['open', 'open_time', 'high', 'low', 'close', 'close_time', 'volume_eth', 'volume_usd', 'sales',
+                 'floor']
+
+_SERIES = {}
+_SERIES_LOCK = threading.Lock()
+
+
+def parseUnique(series, parse):
+    """
+    Parses the JSON strings of a column once per distinct value, as payment tokens and assets repeat across events
+
+    :param series:                  Pandas Series of JSON strings or already parsed values
+    :param parse:                   Function taking the parsed value and returning the field wanted
+    :return:                        Pandas Series of the fields, aligned with the input
+    """
+
+    codes, uniques = pd.factorize(series.map(serializeNested) if series.dtype == object else series)
+    parsed = []
+    for value in uniques:
+        try:
+            parsed.append(parse(loads(value) if isinstance(value, str) else value))
+        except (ValueError, TypeError, AttributeError):
+            parsed.append(None)
+    parsed.append(None)
+    # factorize marks missing values with -1, which picks the trailing None
+    return pd.Series(np.asarray(parsed, dtype=object)[codes], index=series.index)
+
+
+def eventIds(events):
+    """
+    Returns a key per event, the id Opensea gave it where the extraction holds one, else a hash of its fields
+
+    :param events:                  Pandas DataFrame of Opensea events
+    :return:                        NumPy array of uint64 keys
+    """
+
+    if 'id' in events.columns:
+        ids = pd.to_numeric(events['id'], errors='coerce')
+        if ids.notna().all():
+            return ids.to_numpy(dtype='uint64')
+
+    columns = [column for column in KEY_COLUMNS if column in events.columns]
+    return pd.util.hash_pandas_object(events[columns].astype(str), index=False).to_numpy()
+
+
+def normalizePrices(events):
+    """
+    Converts the raw prices of the events into unit prices in ETH and USD, using the decimals and exchange rates of
+    the payment token embedded in every event
+
+    :param events:                  Pandas DataFrame of Opensea events
+    :return:                        Pandas DataFrame of id, collection, event_type, time, quantity, price_eth and
+                                    price_usd
+    """
+
+    required = {'event_type', 'created_date', 'payment_token'}
+    missing = required - set(events.columns)
+    if missing:
+        raise KeyError(f'Error: Events are missing the fields {sorted(missing)}. Try again.')
+
+    def tokenField(name, default):
+        return lambda token: float(token.get(name) if token.get(name) is not None else default)
+
+    decimals = parseUnique(events['payment_token'], tokenField('decimals', 18)).astype('float64')
+    eth_rate = parseUnique(events['payment_token'], tokenField('eth_price', np.nan)).astype('float64')
+    usd_rate = parseUnique(events['payment_token'], tokenField('usd_price', np.nan)).astype('float64')
+
+    if 'collection_slug' in events.columns and events['collection_slug'].notna().all():
+        collection = events['collection_slug'].astype(str)
+    elif 'asset' in events.columns:
+        collection = parseUnique(events['asset'], lambda asset: asset['collection']['slug'])
+    else:
+        collection = pd.Series(None, index=events.index, dtype=object)
+
+    event_type = events['event_type'].astype(str)
+    total = pd.to_numeric(events['total_price'], errors='coerce') if 'total_price' in events.columns \
+        else pd.Series(np.nan, index=events.index)
+    asked = pd.to_numeric(events['starting_price'], errors='coerce') if 'starting_price' in events.columns \
+        else pd.Series(np.nan, index=events.index)
+    quantity = pd.to_numeric(events['quantity'], errors='coerce').fillna(1).replace(0, 1) \
+        if 'quantity' in events.columns else pd.Series(1.0, index=events.index)
+
+    # sales carry the total paid, listings the price asked, both in the token's smallest unit
+    raw = total.where(event_type == SALE_EVENT, asked)
+    amount = raw / np.power(10.0, decimals) / quantity
+
+    return pd.DataFrame({'id': eventIds(events),
+                         'collection': collection.fillna('<unknown>').astype(str),
+                         'event_type': event_type,
+                         'time': pd.to_datetime(events['created_date'], errors='coerce', utc=True),
+                         'quantity': quantity.astype('float64'),
+                         'price_eth': amount * eth_rate,
+                         'price_usd': amount * usd_rate})
+
+
+def aggregateBuckets(prices, freq, currency):
+    """
+    Aggregates normalized events into the running state of every collection and time bucket
+
+    :param prices:                  Pandas DataFrame from normalizePrices()
+    :param freq:                    Fixed-width Pandas offset alias of the buckets, such as 1H, 1D or 7D
+    :param currency:                Currency of the OHLC and floor prices, eth or usd
+    :return:                        Pandas DataFrame of STATE_COLUMNS indexed by collection and bucket
+    """
+
+    prices = prices.dropna(subset=['time'])
+    prices = prices.assign(bucket=prices['time'].dt.floor(freq),
+                           value_eth=prices['price_eth'] * prices['quantity'],
+                           value_usd=prices['price_usd'] * prices['quantity'])
+    price = f'price_{currency}'
+
+    sales = prices[(prices['event_type'] == SALE_EVENT) & prices[price].notna()].sort_values('time', kind='stable')
+    grouped = sales.groupby(['collection', 'bucket'], sort=False)
+    state = pd.DataFrame({'open': grouped[price].first(),
+                          'open_time': grouped['time'].first(),
+                          'high': grouped[price].max(),
+                          'low': grouped[price].min(),
+                          'close': grouped[price].last(),
+                          'close_time': grouped['time'].last(),
+                          'volume_eth': grouped['value_eth'].sum(min_count=1),
+                          'volume_usd': grouped['value_usd'].sum(min_count=1),
+                          'sales': grouped[price].size()})
+
+    listings = prices[(prices['event_type'] == LISTING_EVENT) & prices[price].notna()]
+    floor = listings.groupby(['collection', 'bucket'])[price].min().rename('floor')
+    state = state.join(floor, how='outer')
+    state['sales'] = state['sales'].fillna(0).astype('int64')
+    return state[STATE_COLUMNS]
+
+
+def mergeBuckets(old, new):
+    """
+    Merges the state of newly aggregated buckets into the existing state, bucket by bucket
+
+    :param old:                     Pandas DataFrame of STATE_COLUMNS indexed by collection and bucket
+    :param new:                     Pandas DataFrame of STATE_COLUMNS indexed by collection and bucket
+    :return:                        Merged Pandas DataFrame
+    """
+
+    if len(old) == 0:
+        return new.sort_index()
+    if len(new) == 0:
+        return old
+
+    both = old.join(new, how='outer', lsuffix='_old', rsuffix='_new')
+
+    def pick(column, take_new):
+        return both[f'{column}_new'].where(take_new, both[f'{column}_old'])
+
+    # the open belongs to whichever side saw the earliest sale, the close to whichever saw the latest
+    open_new = both['open_time_old'].isna() | (both['open_time_new'] < both['open_time_old'])
+    close_new = both['close_time_old'].isna() | (both['close_time_new'] > both['close_time_old'])
+
+    merged = pd.DataFrame({'open': pick('open', open_new),
+                           'open_time': pick('open_time', open_new),
+                           'high': both[['high_old', 'high_new']].max(axis=1),
+                           'low': both[['low_old', 'low_new']].min(axis=1),
+                           'close': pick('close', close_new),
+                           'close_time': pick('close_time', close_new),
+                           'volume_eth': both[['volume_eth_old', 'volume_eth_new']].sum(axis=1, min_count=1),
+                           'volume_usd': both[['volume_usd_old', 'volume_usd_new']].sum(axis=1, min_count=1),
+                           'sales': both[['sales_old', 'sales_new']].fillna(0).sum(axis=1).astype('int64'),
+                           'floor': both[['floor_old', 'floor_new']].min(axis=1)})
+    return merged.sort_index()
+
+
+class SalesSeries:
+    """
+    OHLC, volume and floor series of every collection seen in the events of one query, updated incrementally; the ids
+    of the events aggregated so far are kept so that overlapping refreshes never count an event twice
+    """
+
+    def __init__(self, freq='1D', currency='eth', scope=None):
+        """
+        :param freq:                    Fixed-width Pandas offset alias of the buckets, such as 1H, 1D or 7D
+        :param currency:                Currency of the OHLC and floor prices, eth or usd
+        :param scope:                   Key of the query whose events the series aggregates, such as a queryScope()
+        """
+
+        if currency not in CURRENCIES:
+            raise ValueError(f'Error: Unknown currency {currency}. Use one of {CURRENCIES}.')
+        try:
+            # buckets are cut with Series.dt.floor, which only takes fixed widths, so 7D rather than 1W
+            to_offset(freq).nanos
+        except ValueError:
+            raise ValueError(f'Error: {freq} is not a fixed bucket size such as 1H, 1D or 7D. Try again.')
+
+        self.freq = freq
+        self.currency = currency
+        self.scope = scope
+        self.state = pd.DataFrame(columns=STATE_COLUMNS,
+                                  index=pd.MultiIndex.from_arrays([[], []], names=['collection', 'bucket']))
+        self.seen_ids = np.array([], dtype='uint64')
+        self.lock = threading.Lock()
+
+    def update(self, events):
+        """
+        Aggregates the events not seen before and merges them into the series
+
+        :param events:                  Pandas DataFrame of Opensea events, such as Events.response_frame
+        :return:                        Number of new events aggregated
+        """
+
+        prices = normalizePrices(events)
+        prices = prices.drop_duplicates(subset=['id'])
+        with self.lock:
+            fresh = prices[~np.isin(prices['id'].to_numpy(), self.seen_ids)]
+            if len(fresh) == 0:
+                return 0
+
+            self.state = mergeBuckets(self.state, aggregateBuckets(fresh, self.freq, self.currency))
+            self.seen_ids = np.union1d(self.seen_ids, fresh['id'].to_numpy())
+            return len(fresh)
+
+    def series(self, collection=None, fill=True):
+        """
+        Returns the series, one row per collection and bucket
+
+        :param collection:              Slug of the collection to return, None for every collection
+        :param fill:                    Insert the buckets without any event, carrying the last close forward as their
+                                        open, high, low and close
+        :return:                        Pandas DataFrame of collection, bucket and the columns of the series
+        """
+
+        with self.lock:
+            state = self.state.copy()
+
+        if collection is not None:
+            state = state[state.index.get_level_values('collection') == collection]
+        state = state.drop(columns=['open_time', 'close_time'])
+
+        if fill and len(state) > 0:
+            filled = []
+            for name, group in state.groupby(level='collection', sort=True):
+                group = group.droplevel('collection')
+                group = group.reindex(pd.date_range(group.index.min(), group.index.max(), freq=self.freq,
+                                                    name='bucket'))
+                close = group['close'].ffill()
+                for column in ('open', 'high', 'low'):
+                    group[column] = group[column].fillna(close)
+                group['close'] = close
+                group['sales'] = group['sales'].fillna(0).astype('int64')
+                group[['volume_eth', 'volume_usd']] = group[['volume_eth', 'volume_usd']].fillna(0.0)
+                group['floor'] = group['floor'].ffill()
+                filled.append(group.assign(collection=name).set_index('collection', append=True)
+                              .reorder_levels(['collection', 'bucket']))
+            state = pd.concat(filled)
+
+        return state.reset_index()
+
+    def save(self, directory=DEFAULT_SERIES_DIR):
+        """
+        Writes the series and the ids seen so far, so that the next process carries on from where this one stopped
+
+        :param directory:               Directory of the series files
+        :return:                        Path of the series file
+        """
+
+        os.makedirs(directory, exist_ok=True)
+        path = seriesPath(directory, self.freq, self.currency, self.scope)
+        with self.lock:
+            state = self.state.reset_index()
+            ids = pa.table({'id': self.seen_ids})
+
+        pq.write_table(pa.Table.from_pandas(state, preserve_index=False), f'{path}.tmp')
+        os.replace(f'{path}.tmp', path)
+        pq.write_table(ids, f'{path}.ids.tmp')
+        os.replace(f'{path}.ids.tmp', f'{path}.ids')
+        return path
+
+    @classmethod
+    def load(cls, directory=DEFAULT_SERIES_DIR, freq='1D', currency='eth', scope=None):
+        """
+        Reads a series written by save(), or starts an empty one if there is none
+
+        :param directory:               Directory of the series files
+        :param freq:                    Fixed-width Pandas offset alias of the buckets
+        :param currency:                Currency of the OHLC and floor prices, eth or usd
+        :param scope:                   Key of the query whose events the series aggregates
+        :return:                        SalesSeries object
+        """
+
+        series = cls(freq=freq, currency=currency, scope=scope)
+        path = seriesPath(directory, freq, currency, scope)
+        if os.path.exists(path) and os.path.exists(f'{path}.ids'):
+            series.state = pq.read_table(path).to_pandas().set_index(['collection', 'bucket'])[STATE_COLUMNS]
+            series.seen_ids = pq.read_table(f'{path}.ids').column('id').to_numpy()
+        return series
+
+
+def seriesPath(directory, freq, currency, scope=None):
+    name = f'sales-{freq}-{currency}' if scope is None else f'sales-{scope}-{freq}-{currency}'
+    return os.path.join(directory, f'{name}.parquet')
+
+
+def getSalesSeries(freq='1D', currency='eth', directory=DEFAULT_SERIES_DIR, scope=None):
+    """
+    Returns the series of one query for the bucket size and currency, shared by the sessions of this process which
+    scrape the same query, loading it from disk the first time it is asked for
+
+    :param freq:                    Fixed-width Pandas offset alias of the buckets
+    :param currency:                Currency of the OHLC and floor prices, eth or usd
+    :param directory:               Directory of the series files
+    :param scope:                   Key of the query whose events the series aggregates, such as a queryScope()
+    :return:                        SalesSeries object
+    """
+
+    with _SERIES_LOCK:
+        key = (scope, freq, currency, directory)
+        if key not in _SERIES:
+            _SERIES[key] = SalesSeries.load(directory, freq, currency, scope)
+        return _SERIES[key]
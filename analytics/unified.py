@@ -0,0 +1,537 @@
+"""
+This is a unified model of the assets, collections and orders scraped from every marketplace, with one adapter per
+parse* method of the marketplace classes mapping their differently-shaped frames onto a shared schema
+
+Every table is keyed on (chain, contract, token_id), with the contract address lowercased and the token id kept as a
+decimal string, and held as a sorted MultiIndex so that the same token is found across marketplaces by an index join
+rather than by scanning string columns:
+    assets                      One row per token and marketplace: name, collection, owner, image and link
+    orders                      One row per listing (sell) or bid (buy): unit price in ETH and USD, maker and dates
+    collections                 One row per contract and marketplace: slug, name and floor price in ETH
+"""
+
+import json
+import threading
+import numpy as np
+import pandas as pd
+
+from utils.data_store import getDataStore
+from utils.decoding import loads
+
+
+KEY = ['chain', 'contract', 'token_id']
+ASSET_COLUMNS = ['marketplace', 'name', 'collection', 'owner', 'image_url', 'permalink']
+ORDER_COLUMNS = ['marketplace', 'side', 'price_eth', 'price_usd', 'currency', 'maker', 'listed_at', 'expires_at']
+COLLECTION_COLUMNS = ['marketplace', 'slug', 'name', 'floor_eth']
+TABLES = {'assets': ASSET_COLUMNS, 'orders': ORDER_COLUMNS, 'collections': COLLECTION_COLUMNS}
+# Mintable tells the network apart by chain id
+NETWORKS = {1: 'ethereum', 4: 'rinkeby'}
+
+_MARKET = None
+_MARKET_LOCK = threading.Lock()
+
+
+def loadRecord(value):
+    """
+    Reads a nested field which the frame builder keeps as a JSON string
+
+    :param value:                   JSON string, dict or list
+    :return:                        Dict or list, an empty dict if the value holds neither
+    """
+
+    if isinstance(value, str):
+        try:
+            value = loads(value) if value else {}
+        except ValueError:
+            return {}
+    return value if isinstance(value, (dict, list)) else {}
+
+
+def field(value, *path):
+    """
+    Walks a path of keys through a nested record, returning None as soon as a key is missing
+    """
+
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def column(frame, name):
+    """
+    Returns a column of the frame, or a column of missing values if the extraction did not keep it
+    """
+
+    if name in frame.columns:
+        return frame[name]
+    return pd.Series(None, index=frame.index, dtype=object)
+
+
+def records(frame, name):
+    """
+    Parses a column of nested JSON once per distinct value, as collections and contracts repeat across rows
+    """
+
+    values = column(frame, name)
+    codes, uniques = pd.factorize(values.map(lambda value: value if isinstance(value, str) or value is None
+                                             else json.dumps(value)))
+    parsed = np.empty(len(uniques) + 1, dtype=object)
+    parsed[:len(uniques)] = [loadRecord(value) for value in uniques]
+    # factorize marks missing values with -1, which picks the trailing empty record
+    parsed[-1] = {}
+    return pd.Series(parsed[codes], index=frame.index)
+
+
+def toUnits(amount, decimals):
+    """
+    Converts amounts in the smallest unit of a token, such as wei, into whole tokens
+    """
+
+    return pd.to_numeric(amount, errors='coerce') / np.power(10.0, pd.to_numeric(decimals, errors='coerce').fillna(18))
+
+
+def keyed(frame, columns):
+    """
+    Normalizes the key columns of an adapter's output and sets them as the index
+
+    :param frame:                   Pandas DataFrame holding chain, contract, token_id and the columns of the table
+    :param columns:                 Columns of the table, in order
+    :return:                        Pandas DataFrame indexed by KEY
+    """
+
+    frame = frame.reindex(columns=KEY + columns)
+    frame['contract'] = frame['contract'].astype('string').str.lower()
+    # token ids run past 2**64, so they are compared as decimal strings; floats from lossy sources lose their '.0'
+    frame['token_id'] = frame['token_id'].astype('string').str.replace(r'\.0$', '', regex=True)
+    frame = frame.dropna(subset=['chain', 'contract'])
+    return frame.set_index(KEY)
+
+
+def table(name, frame):
+    return keyed(frame, TABLES[name])
+
+
+# ---------------------------------------------------------------------------------------------------------------- #
+#                                                   Opensea                                                         #
+# ---------------------------------------------------------------------------------------------------------------- #
+def openseaOrder(order, fallback=None):
+    """
+    Maps one Opensea order onto the order columns; the side is 0 for listings and 1 for bids
+    """
+
+    token = order.get('payment_token_contract') or {}
+    quantity = float(order.get('quantity') or 1) or 1.0
+    price = toUnits(pd.Series([order.get('current_price')]), pd.Series([token.get('decimals')])).iloc[0] / quantity
+    asset = field(order, 'metadata', 'asset') or {}
+    return {'chain': 'ethereum',
+            'contract': asset.get('address') or (fallback or {}).get('contract'),
+            'token_id': asset.get('id') or (fallback or {}).get('token_id'),
+            'marketplace': 'opensea',
+            'side': 'buy' if order.get('side') == 1 else 'sell',
+            'price_eth': price * float(token.get('eth_price') or np.nan),
+            'price_usd': price * float(token.get('usd_price') or np.nan),
+            'currency': token.get('symbol'),
+            'maker': field(order, 'maker', 'address'),
+            'listed_at': order.get('created_date'),
+            'expires_at': order.get('expiration_time')}
+
+
+def openseaAssets(frame):
+    contracts = records(frame, 'asset_contract')
+    collections = records(frame, 'collection')
+    assets = pd.DataFrame({'chain': 'ethereum',
+                           'contract': contracts.map(lambda contract: contract.get('address')),
+                           'token_id': column(frame, 'token_id'),
+                           'marketplace': 'opensea',
+                           'name': column(frame, 'name'),
+                           'collection': collections.map(lambda collection: collection.get('slug')),
+                           'owner': records(frame, 'owner').map(lambda owner: owner.get('address')),
+                           'image_url': column(frame, 'image_url'),
+                           'permalink': column(frame, 'permalink')})
+
+    orders = [openseaOrder(order, {'contract': contract, 'token_id': token_id})
+              for contract, token_id, sell_orders in zip(assets['contract'], assets['token_id'],
+                                                         records(frame, 'sell_orders'))
+              for order in (sell_orders if isinstance(sell_orders, list) else [])]
+    return {'assets': table('assets', assets), 'orders': table('orders', pd.DataFrame(orders))}
+
+
+def openseaEvents(frame):
+    assets = records(frame, 'asset')
+    tokens = records(frame, 'payment_token')
+    event_type = column(frame, 'event_type').astype(str)
+    quantity = pd.to_numeric(column(frame, 'quantity'), errors='coerce').fillna(1).replace(0, 1)
+    decimals = tokens.map(lambda token: token.get('decimals'))
+
+    # listings ask a starting price and bids offer an amount, sales and transfers are not orders
+    raw = column(frame, 'starting_price').where(event_type == 'created', column(frame, 'bid_amount'))
+    price = toUnits(raw, decimals) / quantity
+    orders = pd.DataFrame({'chain': 'ethereum',
+                           'contract': assets.map(lambda asset: field(asset, 'asset_contract', 'address')),
+                           'token_id': assets.map(lambda asset: asset.get('token_id')),
+                           'marketplace': 'opensea',
+                           'side': event_type.map({'created': 'sell', 'bid_entered': 'buy'}),
+                           'price_eth': price * pd.to_numeric(tokens.map(lambda token: token.get('eth_price')),
+                                                              errors='coerce'),
+                           'price_usd': price * pd.to_numeric(tokens.map(lambda token: token.get('usd_price')),
+                                                              errors='coerce'),
+                           'currency': tokens.map(lambda token: token.get('symbol')),
+                           'maker': records(frame, 'from_account').map(lambda account: account.get('address')),
+                           'listed_at': column(frame, 'created_date'),
+                           'expires_at': None})
+    orders = orders[orders['side'].notna()]
+
+    asset_rows = pd.DataFrame({'chain': 'ethereum',
+                               'contract': assets.map(lambda asset: field(asset, 'asset_contract', 'address')),
+                               'token_id': assets.map(lambda asset: asset.get('token_id')),
+                               'marketplace': 'opensea',
+                               'name': assets.map(lambda asset: asset.get('name')),
+                               'collection': assets.map(lambda asset: field(asset, 'collection', 'slug')),
+                               'owner': assets.map(lambda asset: field(asset, 'owner', 'address')),
+                               'image_url': assets.map(lambda asset: asset.get('image_url')),
+                               'permalink': assets.map(lambda asset: asset.get('permalink'))})
+    return {'assets': table('assets', asset_rows.dropna(subset=['token_id'])), 'orders': table('orders', orders)}
+
+
+def openseaCollections(frame):
+    stats = records(frame, 'stats')
+    rows = [{'chain': 'ethereum', 'contract': contract.get('address'), 'token_id': None, 'marketplace': 'opensea',
+             'slug': slug, 'name': name, 'floor_eth': field(stat, 'floor_price')}
+            for slug, name, stat, contracts in zip(column(frame, 'slug'), column(frame, 'name'), stats,
+                                                   records(frame, 'primary_asset_contracts'))
+            for contract in (contracts if isinstance(contracts, list) else [])]
+    return {'collections': table('collections', pd.DataFrame(rows))}
+
+
+def openseaBundles(frame):
+    # a bundle is sold as a whole, so only the assets in it are kept; its price says nothing about any one token
+    rows = [asset for assets in records(frame, 'assets') for asset in (assets if isinstance(assets, list) else [])]
+    if len(rows) == 0:
+        return {'assets': table('assets', pd.DataFrame())}
+    return openseaAssets(pd.DataFrame(rows))
+
+
+# ---------------------------------------------------------------------------------------------------------------- #
+#                                                  ImmutableX                                                       #
+# ---------------------------------------------------------------------------------------------------------------- #
+def immutablexAssets(frame):
+    # tokens minted on ImmutableX are withdrawn to Ethereum under the same contract and id, so they share its key
+    assets = pd.DataFrame({'chain': 'ethereum',
+                           'contract': column(frame, 'token_address'),
+                           'token_id': column(frame, 'token_id'),
+                           'marketplace': 'immutablex',
+                           'name': column(frame, 'name'),
+                           'collection': records(frame, 'collection').map(lambda collection: collection.get('name')),
+                           'owner': column(frame, 'user'),
+                           'image_url': column(frame, 'image_url'),
+                           'permalink': None})
+
+    # sell orders are only embedded when the assets were listed with sell_orders=true; they are priced in ETH
+    orders = [{'chain': 'ethereum', 'contract': contract, 'token_id': token_id, 'marketplace': 'immutablex',
+               'side': 'sell',
+               'price_eth': float(order.get('buy_quantity') or np.nan) / 10 ** int(order.get('buy_decimals') or 18),
+               'price_usd': np.nan, 'currency': 'ETH', 'maker': order.get('user'), 'listed_at': None,
+               'expires_at': None}
+              for contract, token_id, embedded in zip(assets['contract'], assets['token_id'], records(frame, 'orders'))
+              for order in (field(embedded, 'sell_orders') or [])]
+    return {'assets': table('assets', assets), 'orders': table('orders', pd.DataFrame(orders))}
+
+
+def immutablexCollections(frame):
+    collections = pd.DataFrame({'chain': 'ethereum',
+                                'contract': column(frame, 'address'),
+                                'token_id': None,
+                                'marketplace': 'immutablex',
+                                'slug': column(frame, 'address'),
+                                'name': column(frame, 'name'),
+                                'floor_eth': np.nan})
+    return {'collections': table('collections', collections)}
+
+
+# ---------------------------------------------------------------------------------------------------------------- #
+#                                                   Mintable                                                        #
+# ---------------------------------------------------------------------------------------------------------------- #
+def mintableNFTs(frame):
+    chain = pd.to_numeric(column(frame, 'network'), errors='coerce').fillna(1).map(NETWORKS)
+    assets = pd.DataFrame({'chain': chain,
+                           'contract': column(frame, 'contractAddress'),
+                           'token_id': column(frame, 'tokenId'),
+                           'marketplace': 'mintable',
+                           'name': column(frame, 'name'),
+                           'collection': column(frame, 'category'),
+                           'owner': column(frame, 'owner'),
+                           'image_url': column(frame, 'image'),
+                           'permalink': None})
+
+    # listed items carry their asking price in ETH, auctions their current price
+    price = pd.to_numeric(column(frame, 'price'), errors='coerce')
+    orders = pd.DataFrame({'chain': chain,
+                           'contract': assets['contract'],
+                           'token_id': assets['token_id'],
+                           'marketplace': 'mintable',
+                           'side': 'sell',
+                           'price_eth': price,
+                           'price_usd': np.nan,
+                           'currency': 'ETH',
+                           'maker': assets['owner'],
+                           'listed_at': column(frame, 'createdAt'),
+                           'expires_at': None})
+    return {'assets': table('assets', assets), 'orders': table('orders', orders[price.notna() & (price > 0)])}
+
+
+# ---------------------------------------------------------------------------------------------------------------- #
+#                                                    Rarible                                                        #
+# ---------------------------------------------------------------------------------------------------------------- #
+def raribleOrder(order, side):
+    """
+    Maps one Rarible order onto the order columns; listings give away the NFT for the take asset and bids give the
+    make asset for the NFT, and the API prices one NFT in either case
+    """
+
+    nft, payment = ('make', 'take') if side == 'sell' else ('take', 'make')
+    prefix = 'make' if side == 'sell' else 'take'
+    currency = field(order, payment, 'assetType', 'assetClass')
+    price = pd.to_numeric(order.get(f'{prefix}Price'), errors='coerce')
+    return {'chain': 'ethereum',
+            'contract': field(order, nft, 'assetType', 'contract'),
+            'token_id': field(order, nft, 'assetType', 'tokenId'),
+            'marketplace': 'rarible',
+            'side': side,
+            'price_eth': price if currency == 'ETH' else np.nan,
+            'price_usd': pd.to_numeric(order.get(f'{prefix}PriceUsd'), errors='coerce'),
+            'currency': currency,
+            'maker': order.get('maker'),
+            'listed_at': order.get('createdAt'),
+            'expires_at': order.get('end')}
+
+
+def raribleItems(frame):
+    meta = records(frame, 'meta')
+    assets = pd.DataFrame({'chain': 'ethereum',
+                           'contract': column(frame, 'contract'),
+                           'token_id': column(frame, 'tokenId'),
+                           'marketplace': 'rarible',
+                           'name': meta.map(lambda record: record.get('name')),
+                           'collection': column(frame, 'contract'),
+                           'owner': column(frame, 'owner').fillna(
+                               records(frame, 'owners').map(lambda owners: owners[0] if owners else None)),
+                           'image_url': meta.map(lambda record: field(record, 'image', 'url', 'ORIGINAL')),
+                           'permalink': None})
+
+    # items of the order service embed their best listing and best bid
+    orders = [raribleOrder(order, side)
+              for name, side in (('bestSellOrder', 'sell'), ('bestBidOrder', 'buy'))
+              for order in records(frame, name) if order]
+    return {'assets': table('assets', assets), 'orders': table('orders', pd.DataFrame(orders))}
+
+
+def raribleCollections(frame):
+    collections = pd.DataFrame({'chain': 'ethereum',
+                                'contract': column(frame, 'id'),
+                                'token_id': None,
+                                'marketplace': 'rarible',
+                                'slug': column(frame, 'symbol'),
+                                'name': column(frame, 'name'),
+                                'floor_eth': np.nan})
+    return {'collections': table('collections', collections)}
+
+
+def raribleActivities(frame):
+    # only listings and bids are open orders, matches and transfers are history
+    kinds = column(frame, 'type').astype(str).str.upper().map({'LIST': 'sell', 'BID': 'buy'})
+    rows = []
+    for kind, make, take, price, price_usd, maker, date in zip(kinds, records(frame, 'make'), records(frame, 'take'),
+                                                                column(frame, 'price'), column(frame, 'priceUsd'),
+                                                                column(frame, 'maker'), column(frame, 'date')):
+        if not isinstance(kind, str):
+            continue
+        order = {'make': make, 'take': take, 'maker': maker, 'createdAt': date,
+                 'makePrice' if kind == 'sell' else 'takePrice': price,
+                 'makePriceUsd' if kind == 'sell' else 'takePriceUsd': price_usd}
+        rows.append(raribleOrder(order, kind))
+    return {'orders': table('orders', pd.DataFrame(rows))}
+
+
+# marketplace and class of the scraper: adapter of the frames its parse* methods build
+ADAPTERS = {('opensea', 'Assets'): openseaAssets,
+            ('opensea', 'Events'): openseaEvents,
+            ('opensea', 'Collections'): openseaCollections,
+            ('opensea', 'Bundles'): openseaBundles,
+            ('immutablex', 'Assets'): immutablexAssets,
+            ('immutablex', 'Collections'): immutablexCollections,
+            ('mintable', 'NFT'): mintableNFTs,
+            ('mintable', 'Auction'): mintableNFTs,
+            ('rarible', 'Ownership'): raribleItems,
+            ('rarible', 'Item'): raribleItems,
+            ('rarible', 'OrderOwnership'): raribleItems,
+            ('rarible', 'OrderItem'): raribleItems,
+            ('rarible', 'Collection'): raribleCollections,
+            ('rarible', 'OrderCollection'): raribleCollections,
+            ('rarible', 'OrderActivity'): raribleActivities}
+
+
+def unify(frame, marketplace, endpoint):
+    """
+    Maps the frame built by a parse* method onto the unified tables
+
+    :param frame:                   Pandas DataFrame built by the marketplace class
+    :param marketplace:             Name of the marketplace, as in the marketplace attribute of the classes
+    :param endpoint:                Name of the class which built the frame, such as Assets or NFT
+    :return:                        Dict of table name to Pandas DataFrame indexed by KEY
+    """
+
+    adapter = ADAPTERS.get((marketplace, endpoint))
+    if adapter is None:
+        raise ValueError(f'Error: No adapter for the {endpoint} endpoint of {marketplace}. Use one of '
+                         f'{sorted(ADAPTERS)}.')
+    return adapter(frame.reset_index(drop=True))
+
+
+class UnifiedMarket:
+    """
+    Merged assets, orders and collections of every marketplace, kept sorted by key so that the listings and bids of a
+    token on every marketplace are found through the index
+    """
+
+    def __init__(self):
+        self.tables = {name: keyed(pd.DataFrame(), columns) for name, columns in TABLES.items()}
+        self.lock = threading.Lock()
+
+    def add(self, scraper=None, frame=None, marketplace=None, endpoint=None):
+        """
+        Merges the frame of a scraper into the tables, replacing the rows the same marketplace reported before for the
+        same keys
+
+        :param scraper:                 Marketplace class whose response_frame is merged
+        :param frame:                   Pandas DataFrame to merge instead of the scraper's, such as a stored scrape
+        :param marketplace:             Marketplace of the frame, defaults to the scraper's
+        :param endpoint:                Class name of the endpoint of the frame, defaults to the scraper's
+        :return:                        Dict of table name to the number of rows merged
+        """
+
+        frame = frame if frame is not None else scraper.response_frame
+        marketplace = marketplace or scraper.marketplace
+        endpoint = endpoint or type(scraper).__name__
+        unified = unify(frame, marketplace, endpoint)
+
+        with self.lock:
+            for name, new in unified.items():
+                old = self.tables[name]
+                if name == 'orders':
+                    # orders of a token replace each other only if the whole order is the same
+                    merged = pd.concat([old, new]).reset_index().drop_duplicates(keep='last')
+                else:
+                    merged = pd.concat([old, new]).reset_index().drop_duplicates(subset=KEY + ['marketplace'],
+                                                                                  keep='last')
+                self.tables[name] = merged.set_index(KEY).sort_index()
+        return {name: len(new) for name, new in unified.items()}
+
+    def loadStore(self, store=None, since=None, until=None):
+        """
+        Merges every scrape kept in the local data store which has an adapter, across every marketplace
+
+        :param store:                   DataStore object, defaults to the shared data store
+        :param since:                   Earliest scrape date as YYYY-MM-DD, None for no lower bound
+        :param until:                   Latest scrape date as YYYY-MM-DD, None for no upper bound
+        :return:                        Dict of table name to the number of rows merged
+        """
+
+        store = store if store is not None else getDataStore()
+        # the store partitions by the lowercased class name
+        endpoints = {(marketplace, endpoint.lower()): endpoint for marketplace, endpoint in ADAPTERS}
+        merged = {name: 0 for name in TABLES}
+        for marketplace, endpoint in sorted({partition[:2] for partition in store.partitions(since=since,
+                                                                                                until=until)}):
+            if (marketplace, endpoint) not in endpoints:
+                continue
+            frame = store.read(marketplace, endpoint, since=since, until=until)
+            added = self.add(frame=frame.drop(columns=['marketplace', 'endpoint', 'date'], errors='ignore'),
+                             marketplace=marketplace, endpoint=endpoints[(marketplace, endpoint)])
+            for name, count in added.items():
+                merged[name] += count
+        return merged
+
+    def table(self, name):
+        with self.lock:
+            return self.tables[name]
+
+    def bestOrders(self, side='sell', currency='eth'):
+        """
+        Returns the best order of every token on every marketplace, the cheapest listing or the highest bid
+
+        :param side:                    sell for listings, buy for bids
+        :param currency:                Currency of the prices compared, eth or usd
+        :return:                        Pandas DataFrame indexed by KEY with one price column per marketplace
+        """
+
+        orders = self.table('orders')
+        price = f'price_{currency}'
+        orders = orders[(orders['side'] == side) & orders[price].notna()]
+        best = orders.set_index('marketplace', append=True)[price]
+        best = best.groupby(level=KEY + ['marketplace']).min() if side == 'sell' \
+            else best.groupby(level=KEY + ['marketplace']).max()
+        return best.unstack('marketplace')
+
+    def comparePrices(self, currency='eth'):
+        """
+        Compares the cheapest listing of every token listed on more than one marketplace
+
+        :param currency:                Currency of the prices compared, eth or usd
+        :return:                        Pandas DataFrame indexed by KEY with the best ask per marketplace, the cheapest
+                                        and dearest marketplace and the spread between them
+        """
+
+        asks = self.bestOrders('sell', currency)
+        asks = asks[asks.notna().sum(axis=1) > 1]
+        if len(asks) == 0:
+            return asks
+
+        comparison = asks.copy()
+        comparison['cheapest'] = asks.idxmin(axis=1)
+        comparison['dearest'] = asks.idxmax(axis=1)
+        comparison['spread'] = asks.max(axis=1) - asks.min(axis=1)
+        comparison['spread_share'] = comparison['spread'] / asks.min(axis=1)
+        return comparison.sort_values('spread_share', ascending=False)
+
+    def arbitrage(self, min_spread=0.0, currency='eth'):
+        """
+        Finds tokens listed on one marketplace for less than a bid for them on another
+
+        :param min_spread:              Smallest profit kept, as a share of the ask
+        :param currency:                Currency of the prices compared, eth or usd
+        :return:                        Pandas DataFrame of the key, the marketplaces to buy and sell on, the ask, the
+                                        bid and the profit, most profitable first
+        """
+
+        asks = self.bestOrders('sell', currency).stack().rename('ask')
+        bids = self.bestOrders('buy', currency).stack().rename('bid')
+        asks.index = asks.index.set_names('buy_on', level='marketplace')
+        bids.index = bids.index.set_names('sell_on', level='marketplace')
+
+        # joining on the shared key levels pairs every ask of a token with every bid for it
+        pairs = asks.to_frame().join(bids.to_frame(), how='inner').reset_index()
+        pairs = pairs[(pairs['buy_on'] != pairs['sell_on']) & (pairs['bid'] > pairs['ask'] * (1 + min_spread))]
+        pairs = pairs.assign(profit=pairs['bid'] - pairs['ask'], profit_share=(pairs['bid'] - pairs['ask']) /
+                             pairs['ask'])
+        return pairs.sort_values('profit_share', ascending=False, ignore_index=True)
+
+    def clear(self):
+        with self.lock:
+            self.tables = {name: keyed(pd.DataFrame(), columns) for name, columns in TABLES.items()}
+
+
+def getUnifiedMarket():
+    """
+    Returns the unified market shared by every session in this process
+
+    :return:                        UnifiedMarket object
+    """
+
+    global _MARKET
+
+    with _MARKET_LOCK:
+        if _MARKET is None:
+            _MARKET = UnifiedMarket()
+    return _MARKET
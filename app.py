@@ -1,16 +1,15 @@
 # CUSTOM PAGE IMPORTS
 import streamlit as st
-from multipage import MultiPage
-from pages import opensea, immutablex, mintable, rarible
+from multipage import MultiPage, lazyPage
 
 # INSTANTIATE THE APP
 app = MultiPage()
 
-# DEFINE THE PAGES AND THE APPS THEY CONTAIN
-app.add_page('Opensea', opensea.app)
-app.add_page('ImmutableX', immutablex.app)
-app.add_page('Mintable', mintable.app)
-app.add_page('Rarible', rarible.app)
+# DEFINE THE PAGES AND THE APPS THEY CONTAIN, IMPORTED ON FIRST USE
+app.add_page('Opensea', lazyPage('pages.opensea'))
+app.add_page('ImmutableX', lazyPage('pages.immutablex'))
+app.add_page('Mintable', lazyPage('pages.mintable'))
+app.add_page('Rarible', lazyPage('pages.rarible'))
 
 # RUN THE APP
 app.run()
@@ -0,0 +1,305 @@
+"""
+This is a headless entry point which runs the marketplace classes from a declarative job spec and writes each scrape
+straight to a file, so that bulk scrapes can be scheduled from cron without starting the Streamlit app
+
+The spec is a JSON file holding a list of jobs, or an object with a "jobs" list and "defaults" shared by every job:
+
+    {
+        "defaults": {"use_cache": true, "paginate": true, "max_pages": 20},
+        "jobs": [
+            {"name": "bayc-assets", "marketplace": "opensea", "endpoint": "assets",
+             "params": {"collection": "boredapeyachtclub", "limit": 50, "api_key": "${OPENSEA_API_KEY}"},
+             "output": "exports/{name}-{date}.parquet"},
+            {"name": "imx-tokens", "marketplace": "immutablex", "endpoint": "tokens",
+             "params": {"address": null, "symbol": null}, "paginate": false, "output": "exports/{name}.csv"}
+        ]
+    }
+
+Every job runs on a background thread while all of their requests share the one event loop of the process:
+
+    python batch.py jobs.json
+    python batch.py jobs.json --concurrency 8 --only bayc-assets
+    python batch.py --list
+"""
+
+import argparse
+import importlib
+import json
+import os
+import re
+import sys
+import time
+
+from datetime import datetime, timezone
+from utils.exporter import exportFrame, formatOf
+from utils.jobs import JobManager
+
+
+# endpoint name: (module, class, set* function, parse* function) of each marketplace
+ENDPOINTS = {
+    'opensea': {
+        'assets': ('pages.classes.opensea_class', 'Assets', 'setAssetParameters', 'parseResponse'),
+        'events': ('pages.classes.opensea_class', 'Events', 'setEventsParameters', 'parseResponse'),
+        'collections': ('pages.classes.opensea_class', 'Collections', 'setCollectionsParameters', 'parseResponse'),
+        'bundles': ('pages.classes.opensea_class', 'Bundles', 'setBundlesParameter', 'parseResponse')
+    },
+    'immutablex': {
+        'assets': ('pages.classes.immutablex_class', 'Assets', 'setListAssetParameter', 'parseAllAssets'),
+        'asset': ('pages.classes.immutablex_class', 'Assets', 'setSingleAssetParameter', 'parseSingleAsset'),
+        'collections': ('pages.classes.immutablex_class', 'Collections', 'setCollectionListParameters',
+                        'parseAllCollections'),
+        'collection': ('pages.classes.immutablex_class', 'Collections', 'setSingleCollectionParameters',
+                       'parseSingleCollection'),
+        'collection-filter': ('pages.classes.immutablex_class', 'Collections', 'setCollectionFilter',
+                              'parseSingleCollection'),
+        'tokens': ('pages.classes.immutablex_class', 'Tokens', 'setTokenListParameters', 'parseAllTokens'),
+        'token': ('pages.classes.immutablex_class', 'Tokens', 'setSingleTokenParameters', 'parseSingleToken')
+    },
+    'mintable': {
+        'nfts': ('pages.classes.mintable_class', 'NFT', 'setAllNFTParameter', 'parseAllNFTs'),
+        'nft': ('pages.classes.mintable_class', 'NFT', 'setSingleNFTParameter', 'parseSingleNFT'),
+        'gasless-nft': ('pages.classes.mintable_class', 'NFT', 'setGaslessNFTParameters', 'parseSingleNFT'),
+        'ending-soon-auctions': ('pages.classes.mintable_class', 'Auction', 'setEndingSoonAuctions',
+                                 'parseEndingSoonAndHotAuctions'),
+        'hot-auctions': ('pages.classes.mintable_class', 'Auction', 'setHotAuctions', 'parseEndingSoonAndHotAuctions')
+    },
+    'rarible': {
+        'ownership': ('pages.classes.rarible_class', 'Ownership', 'setNFTByIDParameter', 'parseNFTByIDParameter'),
+        'ownerships-by-item': ('pages.classes.rarible_class', 'Ownership', 'setNFTByItemParameter',
+                               'parseNFTByItemParameter'),
+        'ownerships': ('pages.classes.rarible_class', 'Ownership', 'setNFTAllParameter', 'parseNFTAllParameter'),
+        'item': ('pages.classes.rarible_class', 'Item', 'setNFTItemByID', 'parseNFTItemByID'),
+        'item-meta': ('pages.classes.rarible_class', 'Item', 'setNFTMetaByID', 'parseNFTMetaByID'),
+        'lazy-item': ('pages.classes.rarible_class', 'Item', 'setNFTLazyItemByID', 'parseNFTLazyItemByID'),
+        'items-by-owner': ('pages.classes.rarible_class', 'Item', 'setNFTItemByOwner', 'parseNFTItemByOwner'),
+        'items-by-creator': ('pages.classes.rarible_class', 'Item', 'setNFTItemByCreator', 'parseNFTItemByCreator'),
+        'items-by-collection': ('pages.classes.rarible_class', 'Item', 'setNFTItemByCollection',
+                                'parseNFTItemByCollection'),
+        'items': ('pages.classes.rarible_class', 'Item', 'setNFTAllItems', 'parseNFTAllItems'),
+        'collection': ('pages.classes.rarible_class', 'Collection', 'setNFTCollectionByID', 'parseNFTCollectionByID'),
+        'collections-by-owner': ('pages.classes.rarible_class', 'Collection', 'setQueryCollectionsByOwner',
+                                 'parseQueryCollectionsByOwner'),
+        'collections': ('pages.classes.rarible_class', 'Collection', 'setQueryAllCollections',
+                        'parseQueryAllCollections'),
+        'order-ownership': ('pages.classes.rarible_class', 'OrderOwnership', 'setGetNFTOrderByOwnershipID',
+                            'parseGetNFTOrderByOwnershipID'),
+        'order-ownerships': ('pages.classes.rarible_class', 'OrderOwnership', 'setGetAllNFTOwnership',
+                             'parseGetAllNFTOwnership'),
+        'order-items-by-owner': ('pages.classes.rarible_class', 'OrderItem', 'setNFTOrderItemByOwner',
+                                 'parseNFTOrderItemByOwner'),
+        'order-items-by-creator': ('pages.classes.rarible_class', 'OrderItem', 'setNFTOrderItemByCreator',
+                                   'parseNFTOrderItemByCreator'),
+        'order-items-by-collection': ('pages.classes.rarible_class', 'OrderItem', 'setNFTItemByCollection',
+                                      'parseNFTItemByCollection'),
+        'order-items': ('pages.classes.rarible_class', 'OrderItem', 'setNFTAllItems', 'parseNFTAllItems'),
+        'activities-by-user': ('pages.classes.rarible_class', 'OrderActivity', 'setNFTOrderActivityByUser',
+                               'parseNFTOrderActivityByUser'),
+        'activities-by-item': ('pages.classes.rarible_class', 'OrderActivity', 'setNFTOrderActivityByItem',
+                               'parseNFTOrderActivityByItem'),
+        'activities-by-collection': ('pages.classes.rarible_class', 'OrderActivity',
+                                     'setNFTOrderActivityByCollection', 'parseNFTOrderActivityByCollection'),
+        'activities': ('pages.classes.rarible_class', 'OrderActivity', 'setAllNFTOrderActivity',
+                       'parseAllNFTOrderActivity'),
+        'order-collections': ('pages.classes.rarible_class', 'OrderCollection', 'setQueryAllNFTOrderCollections',
+                              'parseQueryAllNFTOrderCollections')
+    }
+}
+
+JOB_DEFAULTS = {'params': {}, 'paginate': False, 'max_pages': None, 'columns': None, 'use_cache': False,
+                'store': False, 'output': None}
+ENV_PATTERN = re.compile(r'^\$\{(\w+)\}$')
+
+
+class BatchJob:
+    """
+    One scrape of the spec: which class and set* function to call with which parameters, and where to write the result
+    """
+
+    def __init__(self, spec, defaults=None):
+        """
+        :param spec:                    Dict of the job as given in the spec file
+        :param defaults:                Dict of values applied to every job which does not set them itself
+        """
+
+        settings = dict(JOB_DEFAULTS)
+        settings.update(defaults or {})
+        settings.update(spec)
+
+        unknown = set(settings) - set(JOB_DEFAULTS) - {'name', 'marketplace', 'endpoint'}
+        if unknown:
+            raise ValueError(f'Error: Unknown job settings {sorted(unknown)}. Try again.')
+
+        self.marketplace = settings.get('marketplace')
+        self.endpoint = settings.get('endpoint')
+        if self.endpoint not in ENDPOINTS.get(self.marketplace, {}):
+            raise ValueError(f'Error: Unknown endpoint {self.marketplace}/{self.endpoint}. Run with --list to see '
+                             f'the endpoints available.')
+
+        self.name = settings.get('name') or f'{self.marketplace}-{self.endpoint}'
+        self.params = {key: expandEnv(value) for key, value in settings['params'].items()}
+        self.paginate = settings['paginate']
+        self.max_pages = settings['max_pages']
+        self.columns = settings['columns']
+        self.use_cache = settings['use_cache']
+        self.store = settings['store']
+        self.output = settings['output']
+        if self.output is None and not self.store:
+            raise ValueError(f'Error: Job {self.name} has neither an output path nor store set. Try again.')
+        if self.output is not None:
+            formatOf(self.output)
+
+    def outputPath(self, started_at):
+        if self.output is None:
+            return None
+        return self.output.format(name=self.name, marketplace=self.marketplace, endpoint=self.endpoint,
+                                  date=started_at.strftime('%Y-%m-%d'), time=started_at.strftime('%H%M%S'))
+
+    def build(self):
+        """
+        Creates the marketplace class and loads the URLs of the job through its set* function
+
+        :return:                        Marketplace class with its URLs set
+        """
+
+        module, name, setter, _ = ENDPOINTS[self.marketplace][self.endpoint]
+        scraper = getattr(importlib.import_module(module), name)()
+        getattr(scraper, setter)(**self.params)
+        return scraper
+
+    def run(self):
+        """
+        Fetches and parses the job, then writes the result to its output file and the local data store
+
+        :return:                        Dict of the job's name, rows, output path and seconds taken
+        """
+
+        started_at = datetime.now(timezone.utc)
+        start = time.perf_counter()
+
+        scraper = self.build()
+        if self.paginate:
+            scraper.loadAndPaginate(max_pages=self.max_pages, use_cache=self.use_cache)
+        else:
+            scraper.loadAndSendPayload(use_cache=self.use_cache)
+        getattr(scraper, ENDPOINTS[self.marketplace][self.endpoint][3])(columns=self.columns)
+
+        path = self.outputPath(started_at)
+        if path is not None:
+            exportFrame(scraper.response_frame, path)
+        if self.store:
+            scraper.saveToStore()
+
+        result = {'name': self.name, 'rows': len(scraper.response_frame), 'output': path,
+                  'seconds': time.perf_counter() - start}
+        scraper.resetAll()
+        return result
+
+
+def expandEnv(value):
+    """
+    Replaces a "${NAME}" value with the environment variable NAME, so that API keys stay out of the spec file
+
+    :param value:                   Value of a parameter
+    :return:                        Value of the environment variable, or the value itself if it is not a reference
+    """
+
+    if isinstance(value, str):
+        match = ENV_PATTERN.match(value)
+        if match is not None:
+            if match.group(1) not in os.environ:
+                raise ValueError(f'Error: Environment variable {match.group(1)} is not set. Try again.')
+            return os.environ[match.group(1)]
+    return value
+
+
+def loadSpec(path):
+    """
+    Reads a job spec file
+
+    :param path:                    Path of the JSON spec
+    :return:                        List of BatchJob objects
+    """
+
+    with open(path, 'r') as f:
+        spec = json.load(f)
+
+    if isinstance(spec, list):
+        spec = {'jobs': spec}
+    jobs = [BatchJob(job, spec.get('defaults')) for job in spec.get('jobs', [])]
+
+    names = [job.name for job in jobs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f'Error: Job names {duplicates} are used more than once. Try again.')
+    return jobs
+
+
+def runJobs(jobs, concurrency):
+    """
+    Runs the jobs on a pool of background threads and reports each one as it finishes
+
+    :param jobs:                    List of BatchJob objects
+    :param concurrency:             Maximum number of jobs running at once
+    :return:                        Number of jobs which failed
+    """
+
+    manager = JobManager(max_workers=concurrency)
+    running = {manager.submit(job.name, job.run).id: job for job in jobs}
+
+    failed = 0
+    while running:
+        for job_id in list(running):
+            job = manager.get(job_id)
+            if not job.isFinished():
+                continue
+
+            manager.pop(job_id)
+            del running[job_id]
+            if job.status == 'done':
+                result = job.result
+                target = result['output'] if result['output'] is not None else 'the data store'
+                print(f'[done] {result["name"]}: {result["rows"]} rows from {job.pages} pages in '
+                      f'{result["seconds"]:.1f}s -> {target}')
+                if job.failures:
+                    kinds = ', '.join(f'{kind}: {count}' for kind, count in job.error_kinds.most_common())
+                    print(f'[warn] {job.name}: {job.errors} requests failed ({kinds})', file=sys.stderr)
+                    for url in job.failedURLs():
+                        print(f'    {url}', file=sys.stderr)
+            else:
+                failed += 1
+                print(f'[{job.status}] {job.name}: {job.error}', file=sys.stderr)
+        time.sleep(0.1)
+
+    manager.executor.shutdown()
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Runs scrapes from a job spec without the Streamlit app')
+    parser.add_argument('spec', nargs='?', help='JSON file of the jobs to run')
+    parser.add_argument('--concurrency', type=int, default=4, help='Maximum number of jobs running at once')
+    parser.add_argument('--only', nargs='*', default=None, help='Names of the jobs to run, defaults to all of them')
+    parser.add_argument('--list', action='store_true', help='List the endpoints available and exit')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for marketplace, endpoints in ENDPOINTS.items():
+            for endpoint, (_, name, setter, _) in endpoints.items():
+                print(f'{marketplace:<12}{endpoint:<28}{name}.{setter}()')
+        return 0
+
+    if args.spec is None:
+        parser.error('the spec file is required')
+
+    jobs = loadSpec(args.spec)
+    if args.only is not None:
+        unknown = set(args.only) - {job.name for job in jobs}
+        if unknown:
+            parser.error(f'unknown jobs {sorted(unknown)}')
+        jobs = [job for job in jobs if job.name in args.only]
+
+    return 1 if runJobs(jobs, args.concurrency) > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
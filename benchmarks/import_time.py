@@ -0,0 +1,86 @@
+"""
+This is an import-time report which measures what each module of the app costs to import in a fresh interpreter, using
+the interpreter's own -X importtime tracing, so that cold-start regressions on the dynos show up before deploying
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --modules utils.utils pages.opensea --top 15
+    python -m benchmarks.import_time --output imports.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+# what app.py pays on start, then what each page and the profiling stack add on first use
+DEFAULT_MODULES = ['streamlit', 'multipage', 'utils.utils', 'pages.opensea', 'pages.immutablex', 'pages.mintable',
+                   'pages.rarible', 'pandas_profiling']
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measureImport(module):
+    """
+    Imports a module in a fresh interpreter and parses the -X importtime trace it prints
+
+    :param module:                  Dotted path of the module to import
+    :return:                        Dict of the module, its total import time in ms and the list of (module, self ms,
+                                    cumulative ms) of every module imported along the way, or the error if the import
+                                    failed
+    """
+
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                             cwd=PROJECT_DIR, capture_output=True, text=True)
+    if process.returncode != 0:
+        lines = process.stderr.strip().splitlines()
+        return {'module': module, 'total_ms': None, 'imports': [], 'error': lines[-1] if lines else 'failed'}
+
+    imports = []
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        imports.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000))
+
+    # the module asked for is imported last, so its cumulative time covers everything it pulled in
+    total = imports[-1][2] if imports else 0.0
+    return {'module': module, 'total_ms': total, 'imports': imports, 'error': None}
+
+
+def printReport(results, top):
+    print(f'{"module":<30}{"import ms":>12}{"modules":>10}')
+    print('-' * 52)
+    for result in results:
+        if result['error'] is not None:
+            print(f'{result["module"]:<30}{"-":>12}{"-":>10}  {result["error"]}')
+        else:
+            print(f'{result["module"]:<30}{result["total_ms"]:>12.1f}{len(result["imports"]):>10}')
+
+    for result in results:
+        if result['error'] is not None or top == 0:
+            continue
+        print(f'\nHeaviest imports under {result["module"]} (self ms):')
+        for name, self_ms, _ in sorted(result['imports'], key=lambda item: item[1], reverse=True)[:top]:
+            print(f'  {self_ms:>9.1f}  {name}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Reports what each module of the app costs to import')
+    parser.add_argument('--modules', nargs='*', default=DEFAULT_MODULES, help='Modules to import, one fresh '
+                                                                              'interpreter each')
+    parser.add_argument('--top', type=int, default=10, help='Heaviest imports listed per module, 0 for none')
+    parser.add_argument('--output', default=None, help='Write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    results = [measureImport(module) for module in args.modules]
+    printReport(results, args.top)
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
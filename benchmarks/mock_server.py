@@ -0,0 +1,218 @@
+"""
+This is a local stand-in for the marketplace APIs which replays recorded responses with configurable latency, page
+counts, throttling and payload sizes, so that the scraper can be benchmarked without hitting the live APIs
+"""
+
+import asyncio
+import copy
+import json
+import os
+import random
+import threading
+
+from aiohttp import web
+
+
+# one recorded record per marketplace, cloned with a fresh id for every record served; a JSON file named after the
+# marketplace in the fixtures directory replaces the built-in record
+RECORDED_RECORDS = {
+    'opensea': {'id': 0,
+                'token_id': '0',
+                'name': 'Recorded Asset',
+                'image_url': 'https://lh3.googleusercontent.com/recorded',
+                'num_sales': 3,
+                'permalink': 'https://opensea.io/assets/0x0/0',
+                'asset_contract': {'address': '0x0', 'name': 'Recorded Contract', 'schema_name': 'ERC721'},
+                'collection': {'slug': 'recorded-collection', 'name': 'Recorded Collection'},
+                'owner': {'address': '0x1', 'user': {'username': 'recorded'}},
+                'traits': [{'trait_type': 'Background', 'value': 'Blue'}, {'trait_type': 'Eyes', 'value': 'Laser'}],
+                'event_type': 'successful',
+                'total_price': '1000000000000000000',
+                'payment_token': {'symbol': 'ETH', 'decimals': 18, 'usd_price': '3000.0'},
+                'created_date': '2022-01-01T00:00:00.000000',
+                'description': ''},
+    'immutablex': {'token_address': '0x0',
+                   'token_id': '0',
+                   'id': '0x0',
+                   'user': '0x1',
+                   'status': 'imx',
+                   'uri': None,
+                   'name': 'Recorded Asset',
+                   'image_url': 'https://recorded.example/image.png',
+                   'metadata': {'attack': 3, 'health': 4, 'rarity': 'common'},
+                   'collection': {'name': 'Recorded Collection', 'icon_url': None},
+                   'created_at': '2022-01-01T00:00:00.000Z',
+                   'updated_at': '2022-01-01T00:00:00.000Z',
+                   'description': ''},
+    'mintable': {'id': '0',
+                 'tokenId': '0',
+                 'title': 'Recorded NFT',
+                 'category': 'art',
+                 'price': 0.1,
+                 'auction': False,
+                 'network': 1,
+                 'owner': '0x1',
+                 'createdAt': 1640995200,
+                 'description': ''},
+    'rarible': {'id': '0x0:0:0x1',
+                'token': '0x0',
+                'tokenId': '0',
+                'owner': '0x1',
+                'value': '1',
+                'date': '2022-01-01T00:00:00Z',
+                'creators': [{'account': '0x1', 'value': 10000}],
+                'description': ''}
+}
+
+OPENSEA_RECORD_KEYS = {'assets': 'assets', 'events': 'asset_events', 'collections': 'collections',
+                       'bundles': 'bundles'}
+
+
+class MockMarketplace:
+    """
+    Serves pages in the shape of one marketplace's API: offset/limit pages for Opensea, and next-page tokens in the
+    body for ImmutableX (cursor), Mintable (lastKey) and Rarible (continuation)
+    """
+
+    def __init__(self, marketplace, pages=10, page_size=50, latency=0.0, jitter=0.0, throttle_rate=0.0,
+                 retry_after=0, record_bytes=0, fixtures_dir=None, seed=0):
+        """
+        :param marketplace:             One of opensea, immutablex, mintable or rarible
+        :param pages:                   Number of full pages before the data runs out
+        :param page_size:               Records per page when the request does not define one
+        :param latency:                 Seconds added to every response
+        :param jitter:                  Seconds of uniform noise added to the latency
+        :param throttle_rate:           Share of requests answered with a 429
+        :param retry_after:             Retry-After header sent with every 429
+        :param record_bytes:            Bytes of padding added to every record to model larger payloads
+        :param fixtures_dir:            Optional directory of recorded records named <marketplace>.json
+        :param seed:                    Seed of the random throttling and jitter
+        """
+
+        self.marketplace = marketplace
+        self.pages = pages
+        self.page_size = page_size
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+
+        record = RECORDED_RECORDS[marketplace]
+        if fixtures_dir is not None and os.path.exists(os.path.join(fixtures_dir, f'{marketplace}.json')):
+            with open(os.path.join(fixtures_dir, f'{marketplace}.json'), 'r') as f:
+                record = json.load(f)
+        self.record = copy.deepcopy(record)
+        self.record['description'] = 'x' * record_bytes
+
+        self.requests = 0
+        self.throttled = 0
+        self.loop = None
+        self.runner = None
+        self.base_url = None
+
+    def records(self, start, count):
+        """
+        Returns the records from start to start + count, cut off where the data runs out
+
+        :param start:                   Index of the first record
+        :param count:                   Number of records requested
+        :return:                        List of records
+        """
+
+        end = min(start + count, self.pages * self.page_size)
+        records = []
+        for index in range(start, end):
+            record = dict(self.record)
+            record['id'] = index
+            records.append(record)
+        return records
+
+    def page(self, request):
+        """
+        Builds the body of the page requested, in the shape of the marketplace's API
+
+        :param request:                 aiohttp Request object
+        :return:                        Dict in the JSON format
+        """
+
+        query = request.query
+        if self.marketplace == 'opensea':
+            offset = int(query.get('offset', 0))
+            limit = int(query.get('limit', self.page_size))
+            key = OPENSEA_RECORD_KEYS.get(request.path.rstrip('/').split('/')[-1], 'assets')
+            return {key: self.records(offset, limit)}
+
+        if self.marketplace == 'immutablex':
+            start = int(query.get('cursor', 0))
+            size = int(query.get('page_size', self.page_size))
+            records = self.records(start, size)
+            remaining = start + len(records) < self.pages * self.page_size
+            return {'result': records, 'cursor': str(start + len(records)), 'remaining': int(remaining)}
+
+        if self.marketplace == 'mintable':
+            start = int(query.get('lastKey', 0))
+            size = int(query.get('size', self.page_size))
+            records = self.records(start, size)
+            more = start + len(records) < self.pages * self.page_size
+            return {'result': records, 'lastKey': str(start + len(records)) if more else None}
+
+        start = int(query.get('continuation', 0))
+        size = int(query.get('size', self.page_size))
+        records = self.records(start, size)
+        if len(records) == 0:
+            return {'total': 0, 'ownerships': []}
+        more = start + len(records) < self.pages * self.page_size
+        return {'total': len(records),
+                'ownerships': records,
+                'continuation': str(start + len(records)) if more else None}
+
+    async def handle(self, request):
+        self.requests += 1
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if self.throttle_rate > 0 and self.random.random() < self.throttle_rate:
+            self.throttled += 1
+            return web.json_response({'detail': 'Request was throttled.'}, status=429,
+                                     headers={'Retry-After': str(self.retry_after)})
+        return web.json_response(self.page(request))
+
+    def resetCounters(self):
+        self.requests = 0
+        self.throttled = 0
+
+    def start(self, host='127.0.0.1', port=0):
+        """
+        Starts the server on its own event loop in a daemon thread
+
+        :param host:                    Interface to listen on
+        :param port:                    Port to listen on, 0 to pick a free one
+        :return:                        Base URL of the server
+        """
+
+        started = threading.Event()
+
+        def serve():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            app = web.Application()
+            app.router.add_route('GET', '/{tail:.*}', self.handle)
+            self.runner = web.AppRunner(app, access_log=None)
+            self.loop.run_until_complete(self.runner.setup())
+            site = web.TCPSite(self.runner, host, port)
+            self.loop.run_until_complete(site.start())
+            bound_port = site._server.sockets[0].getsockname()[1]
+            self.base_url = f'http://{host}:{bound_port}'
+            started.set()
+            self.loop.run_forever()
+
+        threading.Thread(target=serve, name=f'mock-{self.marketplace}', daemon=True).start()
+        started.wait()
+        return self.base_url
+
+    def stop(self):
+        if self.loop is not None and self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result(5)
+            self.loop.call_soon_threadsafe(self.loop.stop)
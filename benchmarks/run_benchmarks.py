@@ -0,0 +1,337 @@
+"""
+This is a benchmark harness which runs the set*/load*/parse* paths of the marketplace classes against local stand-ins
+of the marketplace APIs and reports requests/sec, p50/p99 request latency, peak RSS and parse time for each of them
+
+Every scenario runs in a fresh interpreter so that its peak RSS is its own, while the stand-in servers run in this
+process. Pass --output to keep the results and --baseline to fail when a scenario regressed against kept results:
+
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --pages 50 --latency 0.05 --throttle-rate 0.05 --record-bytes 2048
+    python -m benchmarks.run_benchmarks --output baseline.json
+    python -m benchmarks.run_benchmarks --baseline baseline.json --tolerance 0.2
+"""
+
+import argparse
+import json
+import multiprocessing
+import resource
+import sys
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+from benchmarks.mock_server import MockMarketplace
+
+
+MARKETPLACE_HOSTS = {'opensea': 'api.opensea.io',
+                     'immutablex': 'api.x.immutable.com',
+                     'mintable': 'api.mintable.app',
+                     'rarible': 'api-staging.rarible.com'}
+UNPACED_LIMITS = (1000, 1000, 256)
+
+
+class Scenario:
+    """
+    One path through a marketplace class: the set* call builds the URLs, the load* call fetches them and the optional
+    parse* call turns them into a DataFrame
+    """
+
+    def __init__(self, marketplace, build, fetch, parse=None, fetch_kwargs=None):
+        """
+        :param marketplace:             Marketplace whose stand-in serves the scenario
+        :param build:                   Function taking the page count and page size which returns the class with its
+                                        URLs set through its set* functions
+        :param fetch:                   Name of the load* function to call
+        :param parse:                   Name of the parse* function to call, None if the fetch already parses
+        :param fetch_kwargs:            Optional keyword arguments of the load* function
+        """
+
+        self.marketplace = marketplace
+        self.build = build
+        self.fetch = fetch
+        self.parse = parse
+        self.fetch_kwargs = fetch_kwargs if fetch_kwargs is not None else {}
+
+
+def buildOpenseaAssetPages(pages, page_size):
+    from pages.classes.opensea_class import Assets
+
+    asset = Assets()
+    for page in range(pages + 1):
+        asset.setAssetParameters(offset=page * page_size, limit=page_size)
+    return asset
+
+
+def buildOpenseaAssets(pages, page_size):
+    from pages.classes.opensea_class import Assets
+
+    asset = Assets()
+    asset.setAssetParameters(offset=0, limit=page_size)
+    return asset
+
+
+def buildOpenseaEvents(pages, page_size):
+    from pages.classes.opensea_class import Events
+
+    events = Events()
+    events.setEventsParameters(offset=0, limit=page_size)
+    return events
+
+
+def buildImmutableXAssets(pages, page_size):
+    from pages.classes.immutablex_class import Assets
+
+    asset = Assets()
+    asset.setListAssetParameter(page_size=page_size, cursor=None, order_by=None, direction=None, user=None,
+                                status=None, name=None, metadata=None, sell_orders=None, buy_orders=None,
+                                include_fees=None, collection=None, updated_min_timestamp=None,
+                                updated_max_timestamp=None)
+    return asset
+
+
+def buildImmutableXTokens(pages, page_size):
+    from pages.classes.immutablex_class import Tokens
+
+    token = Tokens()
+    token.setTokenListParameters(address=None, symbol=None)
+    return token
+
+
+def buildMintableAuctions(pages, page_size):
+    from pages.classes.mintable_class import Auction
+
+    auction = Auction()
+    auction.setHotAuctions()
+    return auction
+
+
+def buildRaribleOwnerships(pages, page_size):
+    from pages.classes.rarible_class import Ownership
+
+    ownership = Ownership()
+    ownership.setNFTAllParameter(continuation=None, size=str(page_size))
+    return ownership
+
+
+SCENARIOS = {
+    'opensea-assets-payload': Scenario('opensea', buildOpenseaAssetPages, 'loadAndSendPayload', 'parseResponse'),
+    'opensea-assets-paginate': Scenario('opensea', buildOpenseaAssets, 'loadAndPaginate', 'parseResponse'),
+    'opensea-events-paginate': Scenario('opensea', buildOpenseaEvents, 'loadAndPaginate', 'parseResponse'),
+    'opensea-events-stream': Scenario('opensea', buildOpenseaEvents, 'loadAndBuild',
+                                      fetch_kwargs={'paginate': True}),
+    'immutablex-assets-paginate': Scenario('immutablex', buildImmutableXAssets, 'loadAndPaginate', 'parseAllAssets'),
+    'immutablex-tokens-payload': Scenario('immutablex', buildImmutableXTokens, 'loadAndSendPayload', 'parseAllTokens'),
+    'mintable-auctions-paginate': Scenario('mintable', buildMintableAuctions, 'loadAndPaginate',
+                                           'parseEndingSoonAndHotAuctions'),
+    'rarible-ownerships-paginate': Scenario('rarible', buildRaribleOwnerships, 'loadAndPaginate',
+                                            'parseNFTAllParameter')
+}
+
+
+def percentile(values, share):
+    """
+    Returns the nearest-rank percentile of the values
+
+    :param values:                  List of numbers
+    :param share:                   Percentile between 0 and 1
+    :return:                        Percentile, or None if there are no values
+    """
+
+    if len(values) == 0:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(share * len(values))) - 1))]
+
+
+def rewriteURL(url, base_url):
+    """
+    Points a marketplace URL at the stand-in server, keeping its path and query
+
+    :param url:                     URL built by a set* function
+    :param base_url:                Base URL of the stand-in server
+    :return:                        Rewritten URL
+    """
+
+    return urlunsplit(urlsplit(base_url)[:2] + urlsplit(url)[2:])
+
+
+def runScenario(name, base_urls, pages, page_size, unpaced):
+    """
+    Runs one scenario in the current interpreter; meant to be called in a fresh worker process
+
+    :param name:                    Name of the scenario in SCENARIOS
+    :param base_urls:               Dict of marketplace to the base URL of its stand-in server
+    :param pages:                   Number of pages the stand-in serves
+    :param page_size:               Records per page
+    :param unpaced:                 Lift the per-host rate limits to measure the raw throughput
+    :return:                        Dict of measurements
+    """
+
+    import aiohttp
+
+    from utils.rate_limiter import DEFAULT_HOST_LIMITS, getRateLimiter
+    from utils.session_pool import getSessionPool
+
+    latencies = []
+
+    async def onRequestStart(session, context, params):
+        context.start = time.perf_counter()
+
+    async def onRequestEnd(session, context, params):
+        latencies.append(time.perf_counter() - context.start)
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(onRequestStart)
+    trace.on_request_end.append(onRequestEnd)
+    getSessionPool().trace_configs.append(trace)
+
+    # pace the stand-ins like the hosts they stand in for
+    getRateLimiter().host_limits = {urlsplit(base_url).netloc: UNPACED_LIMITS if unpaced
+                                    else DEFAULT_HOST_LIMITS[MARKETPLACE_HOSTS[marketplace]]
+                                    for marketplace, base_url in base_urls.items()}
+
+    scenario = SCENARIOS[name]
+    result = {'scenario': name}
+
+    start = time.perf_counter()
+    scraper = scenario.build(pages, page_size)
+    result['set_seconds'] = time.perf_counter() - start
+    scraper.URLs = [rewriteURL(url, base_urls[scenario.marketplace]) for url in scraper.URLs]
+
+    start = time.perf_counter()
+    getattr(scraper, scenario.fetch)(**scenario.fetch_kwargs)
+    result['fetch_seconds'] = time.perf_counter() - start
+
+    result['parse_seconds'] = None
+    if scenario.parse is not None:
+        start = time.perf_counter()
+        getattr(scraper, scenario.parse)()
+        result['parse_seconds'] = time.perf_counter() - start
+
+    frame = getattr(scraper, 'response_frame', None)
+    result['rows'] = len(frame) if frame is not None else None
+    result['responses'] = len(latencies)
+    result['p50_ms'] = percentile(latencies, 0.5) * 1000 if latencies else None
+    result['p99_ms'] = percentile(latencies, 0.99) * 1000 if latencies else None
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    result['peak_rss_mb'] = peak_rss / (1024 * 1024) if sys.platform == 'darwin' else peak_rss / 1024
+    return result
+
+
+def compareResults(results, baseline, tolerance):
+    """
+    Lists the scenarios which got slower or heavier than the baseline by more than the tolerance
+
+    :param results:                 List of result dicts of this run
+    :param baseline:                List of result dicts of a previous run
+    :param tolerance:               Allowed relative regression, e.g. 0.2 for 20%
+    :return:                        List of regression descriptions
+    """
+
+    previous = {result['scenario']: result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get(result['scenario'])
+        if before is None:
+            continue
+
+        if before.get('requests_per_second') and result['requests_per_second'] is not None \
+                and result['requests_per_second'] < before['requests_per_second'] * (1 - tolerance):
+            regressions.append(f'{result["scenario"]}: requests/sec {before["requests_per_second"]:.1f} -> '
+                               f'{result["requests_per_second"]:.1f}')
+        for metric in ('p99_ms', 'peak_rss_mb', 'parse_seconds'):
+            if before.get(metric) and result.get(metric) is not None \
+                    and result[metric] > before[metric] * (1 + tolerance):
+                regressions.append(f'{result["scenario"]}: {metric} {before[metric]:.3f} -> {result[metric]:.3f}')
+    return regressions
+
+
+def printResults(results):
+    def show(value, pattern):
+        return pattern.format(value) if value is not None else '-'
+
+    header = f'{"scenario":<30}{"req/s":>10}{"p50 ms":>10}{"p99 ms":>10}{"429s":>7}{"rows":>9}' \
+             f'{"fetch s":>10}{"parse s":>10}{"RSS MB":>10}'
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        print(f'{result["scenario"]:<30}'
+              f'{show(result["requests_per_second"], "{:.1f}"):>10}'
+              f'{show(result["p50_ms"], "{:.1f}"):>10}'
+              f'{show(result["p99_ms"], "{:.1f}"):>10}'
+              f'{result["throttled"]:>7}'
+              f'{show(result["rows"], "{}"):>9}'
+              f'{result["fetch_seconds"]:>10.3f}'
+              f'{show(result["parse_seconds"], "{:.3f}"):>10}'
+              f'{result["peak_rss_mb"]:>10.1f}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks the scraper against local stand-ins of the marketplace '
+                                                 'APIs')
+    parser.add_argument('--scenarios', nargs='*', default=list(SCENARIOS), choices=list(SCENARIOS),
+                        help='Scenarios to run, defaults to all of them')
+    parser.add_argument('--pages', type=int, default=20, help='Pages served before the data runs out')
+    parser.add_argument('--page-size', type=int, default=50, help='Records per page')
+    parser.add_argument('--latency', type=float, default=0.02, help='Seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.01, help='Seconds of noise added to the latency')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Share of requests answered with a 429')
+    parser.add_argument('--retry-after', type=int, default=0, help='Retry-After header sent with every 429')
+    parser.add_argument('--record-bytes', type=int, default=0, help='Bytes of padding added to every record')
+    parser.add_argument('--fixtures', default=None, help='Directory of recorded records named <marketplace>.json')
+    parser.add_argument('--unpaced', action='store_true', help='Lift the per-host rate limits')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per scenario')
+    parser.add_argument('--output', default=None, help='Write the results to this JSON file')
+    parser.add_argument('--baseline', default=None, help='Fail if a scenario regressed against this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed relative regression')
+    args = parser.parse_args(argv)
+
+    servers = {}
+    for marketplace in sorted({SCENARIOS[name].marketplace for name in args.scenarios}):
+        servers[marketplace] = MockMarketplace(marketplace, pages=args.pages, page_size=args.page_size,
+                                               latency=args.latency, jitter=args.jitter,
+                                               throttle_rate=args.throttle_rate, retry_after=args.retry_after,
+                                               record_bytes=args.record_bytes, fixtures_dir=args.fixtures)
+    base_urls = {marketplace: server.start() for marketplace, server in servers.items()}
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    try:
+        for name in args.scenarios:
+            for _ in range(args.repeat):
+                server = servers[SCENARIOS[name].marketplace]
+                server.resetCounters()
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    result = executor.submit(runScenario, name, base_urls, args.pages, args.page_size,
+                                             args.unpaced).result()
+
+                result['requests'] = server.requests
+                result['throttled'] = server.throttled
+                result['requests_per_second'] = server.requests / result['fetch_seconds'] \
+                    if result['fetch_seconds'] > 0 else None
+                results.append(result)
+    finally:
+        for server in servers.values():
+            server.stop()
+
+    printResults(results)
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as f:
+            regressions = compareResults(results, json.load(f), args.tolerance)
+        if regressions:
+            print('\nRegressions against the baseline:')
+            for regression in regressions:
+                print(f'  {regression}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
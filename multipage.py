@@ -3,12 +3,32 @@ Generates a helper class to assist with the generation of multiple Streamlit app
 """
 
 # IMPORT STREAMLIT
+import importlib
 import numpy as np
 import streamlit as st
 import pathlib
 import pandas as pd
 
 
+def lazyPage(module, function='app'):
+    """
+    Returns a function which imports the page's module the first time the page is shown, so that starting the app
+    only pays for the page that is selected
+
+    Arguments
+    ----------
+    module ([str]):         Dotted path of the page's module, such as pages.opensea
+    function ([str]):       Name of the function rendering the page
+    ----------
+    """
+
+    def run():
+        # later reruns find the module in sys.modules and skip the import
+        return getattr(importlib.import_module(module), function)()
+
+    return run
+
+
 # DEFINE THE MULTIPAGE CLASS TO MANAGE THE APPS
 class MultiPage:
     """
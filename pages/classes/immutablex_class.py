@@ -1,10 +1,13 @@
-import os
-import pickle
 import pandas as pd
-import json
+import pages.config.immutablex_config as config
 
 from typing import Optional
-from utils.utils import assertType
+from utils.validation import assertType
+from utils.frame_builder import FrameBuilder, applySchema
+from utils.data_store import getDataStore
+from utils.async_requests import fetchAll, iterFetch, fetchAllFromSubprocess, loadDumps, discardDumps
+from utils.decoding import RecordStream
+from utils.pagination import TokenPagination, fetchAllPages
 
 
 class ImmutableX:
@@ -46,22 +49,150 @@ class ImmutableX:
         self.URLs = []
         self.endpoint = ''
         self.responses = []
+        self.workspace = None
         self.response_frame = pd.DataFrame()
+        self.pagination = TokenPagination(token_key='cursor', record_key='result', more_key='remaining')
+        self.schema = {}
+        self.marketplace = 'immutablex'
 
-    def loadAndSendPayload(self):
+    def loadAndSendPayload(self, use_subprocess=False, use_cache=False):
         """
-        Loads up the requests and prepares them for asynchronous request sending
+        Sends the requests loaded into self.URLs on the shared event loop and stores the parsed payloads in
+        self.responses
+
+        :param use_subprocess:          Fall back to handing the URLs over to a separate interpreter through temporary
+                                        files in a workspace of its own instead of fetching them in-process
+        :param use_cache:               Serve and store the responses through the shared on-disk response cache
         """
 
-        # serialize urls for passing it on to the async component
-        try:
-            url_filepath = os.path.join(os.getcwd(), 'url_dumps.pkl')
-            with open(url_filepath, 'wb') as output:
-                pickle.dump(self.URLs, output)
-        except Exception as ex:
-            raise
+        if use_subprocess:
+            # serialize urls for passing it on to the async component
+            self.workspace = fetchAllFromSubprocess(self.URLs)
         else:
-            os.system('python utils/async_requests.py')
+            self.responses = fetchAll(self.URLs, use_cache=use_cache)
+
+    def loadAndPaginate(self, max_pages=None, use_cache=False):
+        """
+        Follows the API's own pagination from every URL loaded into self.URLs until the data runs out, and stores the
+        pages in self.responses
+
+        :param max_pages:               Maximum number of pages to request per URL, None to follow until the data runs
+                                        out
+        :param use_cache:               Serve and store the responses through the shared on-disk response cache
+        """
+
+        self.responses = fetchAllPages(self.URLs, self.pagination, max_pages=max_pages, use_cache=use_cache)
+
+    def loadAndParse(self, parse, paginate=False, use_cache=False):
+        """
+        Sends the requests loaded into self.URLs and hands the payloads over to one of the parse methods, so that a
+        whole scrape can run as a single background job
+
+        :param parse:                   Bound parse method to call once the payloads are in, such as self.parseAllAssets
+        :param paginate:                Follow the API's own pagination from every URL until the data runs out
+        :param use_cache:               Serve and store the responses through the shared on-disk response cache
+        """
+
+        if paginate:
+            self.loadAndPaginate(use_cache=use_cache)
+        else:
+            self.loadAndSendPayload(use_cache=use_cache)
+        parse()
+
+    def loadResponses(self):
+        """
+        Returns the payloads obtained from loadAndSendPayload(), reading them back from the subprocess fallback's
+        temporary files if they were not fetched in-process
+
+        :return:                        List of responses in the JSON format, or None if nothing was fetched
+        """
+
+        if self.responses:
+            return self.responses
+        if self.workspace is not None:
+            data = loadDumps(self.workspace)
+            self.workspace = None
+            return data
+        return None
+
+    def buildFrame(self, record_key=None, columns=None):
+        """
+        Builds a DataFrame page by page from the payloads obtained from loadAndSendPayload(), releasing each page as
+        soon as it has been converted
+
+        :param record_key:              Key of the list of records in each page, None to treat each page as one record
+        :param columns:                 Columns to keep, None or empty to keep all columns
+        :return:                        Complete Pandas DataFrame
+        """
+
+        builder = FrameBuilder(record_key=record_key, columns=columns, schema=self.schema)
+        data = self.loadResponses()
+
+        if data is not None:
+            for index in range(len(data)):
+                builder.addPage(data[index])
+                data[index] = None
+
+        self.responses = []
+        return builder.build()
+
+    def loadAndBuild(self, columns=None, paginate=False, spill_rows=None, use_cache=False):
+        """
+        Sends the requests loaded into self.URLs and turns each page into a columnar chunk as soon as it arrives, so
+        that the raw pages are never all held in memory at once; only applies to the list queries
+
+        :param columns:                 Columns to keep, None or empty to keep all columns
+        :param paginate:                Follow the API's own pagination from every URL until the data runs out
+        :param spill_rows:              Number of buffered rows after which the chunks are written to disk, None to
+                                        keep every chunk in memory
+        :param use_cache:               Serve and store the responses through the shared on-disk response cache
+        """
+
+        builder = FrameBuilder(record_key=self.pagination.record_key, columns=columns, spill_rows=spill_rows,
+                               schema=self.schema)
+        # with columns of interest, pages are parsed as they stream in and only those fields are ever built
+        record_stream = RecordStream(self.pagination.record_key, columns) if columns else None
+
+        if paginate:
+            fetchAllPages(self.URLs, self.pagination, callback=builder.addPage, use_cache=use_cache,
+                          record_stream=record_stream)
+        else:
+            for result in iterFetch(self.URLs, use_cache=use_cache, record_stream=record_stream):
+                if result.error is not None:
+                    # the decoded body of an error response is not a page of records; the request is kept as a
+                    # failure by the job it was sent for, to be retried on its own
+                    continue
+                builder.addPage(result.payload)
+
+        self.response_frame = builder.build()
+
+    def saveToStore(self, store=None):
+        """
+        Appends the parsed DataFrame to the local data store, partitioned by marketplace, endpoint and scrape date
+
+        :param store:                   DataStore object, defaults to the shared data store
+        :return:                        Path of the written file, or None if there was nothing to store
+        """
+
+        store = store if store is not None else getDataStore()
+        return store.append(self.response_frame, self.marketplace, type(self).__name__.lower())
+
+    def loadFromStore(self, columns=None, filters=None, since=None, until=None, store=None):
+        """
+        Reads the scrapes of this endpoint back from the local data store instead of sending any request
+
+        :param columns:                 Columns to read, None or empty to read all columns
+        :param filters:                 List of (column, operator, value) tuples pushed down to the scan
+        :param since:                   Earliest scrape date as YYYY-MM-DD, None for no lower bound
+        :param until:                   Latest scrape date as YYYY-MM-DD, None for no upper bound
+        :param store:                   DataStore object, defaults to the shared data store
+        :return:                        Pandas DataFrame
+        """
+
+        store = store if store is not None else getDataStore()
+        self.response_frame = applySchema(store.read(self.marketplace, type(self).__name__.lower(), columns=columns,
+                                                     filters=filters, since=since, until=until), self.schema)
+        return self.response_frame
 
     def resetAll(self):
         """
@@ -71,6 +202,8 @@ class ImmutableX:
         self.URLs = []
         self.response_frame = pd.DataFrame()
         self.responses = []
+        discardDumps(self.workspace)
+        self.workspace = None
 
 
 class Assets(ImmutableX):
@@ -81,6 +214,7 @@ class Assets(ImmutableX):
     def __init__(self):
         super().__init__()
         self.endpoint = 'https://api.x.immutable.com/v1/assets'
+        self.schema = config.SCHEMA_ASSETS
 
     def setListAssetParameter(self,
                               page_size: Optional[int],
@@ -219,45 +353,18 @@ class Assets(ImmutableX):
 
         self.URLs.append(f'{self.endpoint}{temp}')
 
-    def parseAllAssets(self):
-        base_filepath = os.path.join(os.getcwd(), 'data_dumps.json')
-        url_filepath = os.path.join(os.getcwd(), 'url_dumps.pkl')
-
-        if os.path.exists(base_filepath):
-            main_list = []
-            with open(f'{base_filepath}', 'rb') as f:
-                data = json.load(f)
-
-                if data is not None:
-                    for dat in data:
-                        if dat is None:
-                            pass
-                        elif 'result' in dat:
-                            main_list.extend(dat['result'])
-
-            self.response_frame = pd.DataFrame(data=main_list).astype(str)
-            os.remove(base_filepath)
-            os.remove(url_filepath)
-
-    def parseSingleAsset(self):
-        base_filepath = os.path.join(os.getcwd(), 'data_dumps.json')
-        url_filepath = os.path.join(os.getcwd(), 'url_dumps.pkl')
+    def parseAllAssets(self, columns=None):
+        self.response_frame = self.buildFrame(record_key='result', columns=columns)
 
-        if os.path.exists(base_filepath):
-            with open(f'{base_filepath}', 'rb') as f:
-                data = json.load(f)
-
-            self.response_frame = pd.DataFrame(data=data).astype(str)
-
-            # clean up temp files
-            os.remove(base_filepath)
-            os.remove(url_filepath)
+    def parseSingleAsset(self, columns=None):
+        self.response_frame = self.buildFrame(columns=columns)
 
 
 class Collections(ImmutableX):
     def __init__(self):
         super().__init__()
         self.endpoint = 'https://api.x.immutable.com/v1/collections'
+        self.schema = config.SCHEMA_COLLECTIONS
 
     def setCollectionListParameters(self,
                                     page_size: Optional[int],
@@ -358,45 +465,18 @@ class Collections(ImmutableX):
 
         self.URLs.append(f'{self.endpoint}{temp}')
 
-    def parseAllCollections(self):
-        base_filepath = os.path.join(os.getcwd(), 'data_dumps.json')
-        url_filepath = os.path.join(os.getcwd(), 'url_dumps.pkl')
-
-        if os.path.exists(base_filepath):
-            main_list = []
-            with open(f'{base_filepath}', 'rb') as f:
-                data = json.load(f)
-
-                if data is not None:
-                    for dat in data:
-                        if dat is None:
-                            pass
-                        elif 'result' in dat:
-                            main_list.extend(dat['result'])
-
-            self.response_frame = pd.DataFrame(data=main_list).astype(str)
-            os.remove(base_filepath)
-            os.remove(url_filepath)
-
-    def parseSingleCollection(self):
-        base_filepath = os.path.join(os.getcwd(), 'data_dumps.json')
-        url_filepath = os.path.join(os.getcwd(), 'url_dumps.pkl')
-
-        if os.path.exists(base_filepath):
-            with open(f'{base_filepath}', 'rb') as f:
-                data = json.load(f)
+    def parseAllCollections(self, columns=None):
+        self.response_frame = self.buildFrame(record_key='result', columns=columns)
 
-                self.response_frame = pd.DataFrame(data=data).astype(str)
-
-            # clean up temp files
-            os.remove(base_filepath)
-            os.remove(url_filepath)
+    def parseSingleCollection(self, columns=None):
+        self.response_frame = self.buildFrame(columns=columns)
 
 
 class Tokens(ImmutableX):
     def __init__(self):
         super().__init__()
         self.endpoint = 'https://api.x.immutable.com/v1/tokens'
+        self.schema = config.SCHEMA_TOKENS
 
     def setTokenListParameters(self,
                                address: Optional[str],
@@ -441,36 +521,8 @@ class Tokens(ImmutableX):
             else:
                 raise ValueError('Error: Token Address must not be empty. Try again.')
 
-    def parseAllTokens(self):
-        base_filepath = os.path.join(os.getcwd(), 'data_dumps.json')
-        url_filepath = os.path.join(os.getcwd(), 'url_dumps.pkl')
-
-        if os.path.exists(base_filepath):
-            main_list = []
-            with open(f'{base_filepath}', 'rb') as f:
-                data = json.load(f)
-
-                if data is not None:
-                    for dat in data:
-                        if dat is None:
-                            pass
-                        elif 'result' in dat:
-                            main_list.extend(dat['result'])
-
-            self.response_frame = pd.DataFrame(data=main_list).astype(str)
-            os.remove(base_filepath)
-            os.remove(url_filepath)
-
-    def parseSingleToken(self):
-        base_filepath = os.path.join(os.getcwd(), 'data_dumps.json')
-        url_filepath = os.path.join(os.getcwd(), 'url_dumps.pkl')
-
-        if os.path.exists(base_filepath):
-            with open(f'{base_filepath}', 'rb') as f:
-                data = json.load(f)
-
-                self.response_frame = pd.DataFrame(data=data).astype(str)
+    def parseAllTokens(self, columns=None):
+        self.response_frame = self.buildFrame(record_key='result', columns=columns)
 
-            # clean up temp files
-            os.remove(base_filepath)
-            os.remove(url_filepath)
+    def parseSingleToken(self, columns=None):
+        self.response_frame = self.buildFrame(columns=columns)
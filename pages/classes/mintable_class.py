@@ -1,9 +1,12 @@
-import os
-import pickle
 import pandas as pd
-import json
+import pages.config.mintable_config as config
 
-from utils.utils import assertType
+from utils.validation import assertType
+from utils.frame_builder import FrameBuilder, applySchema
+from utils.data_store import getDataStore
+from utils.async_requests import fetchAll, iterFetch, fetchAllFromSubprocess, loadDumps, discardDumps
+from utils.decoding import RecordStream
+from utils.pagination import TokenPagination, fetchAllPages
 
 
 class Mintable:
@@ -26,20 +29,155 @@ class Mintable:
         self.api_key_type = str
 
         self.URLs = []
+        self.headers = {}
         self.responses = []
+        self.workspace = None
         self.response_frame = pd.DataFrame()
         self.endpoint = ''
+        self.pagination = TokenPagination(token_key='lastKey', record_key='result')
+        self.schema = {}
+        self.marketplace = 'mintable'
 
-    def loadAndSendPayload(self):
-        # serialize urls for passing it on to the async component
-        try:
-            url_filepath = os.path.join(os.getcwd(), 'url_dumps.pkl')
-            with open(url_filepath, 'wb') as output:
-                pickle.dump(self.URLs, output)
-        except Exception as ex:
-            raise
+    def loadAndSendPayload(self, use_subprocess=False, use_cache=False):
+        """
+        Sends the requests loaded into self.URLs on the shared event loop and stores the parsed payloads in
+        self.responses
+
+        :param use_subprocess:          Fall back to handing the URLs over to a separate interpreter through temporary
+                                        files in a workspace of its own instead of fetching them in-process
+        :param use_cache:               Serve and store the responses through the shared on-disk response cache
+        """
+
+        if use_subprocess:
+            # serialize urls for passing it on to the async component
+            self.workspace = fetchAllFromSubprocess(self.URLs, headers=self.headers)
+        else:
+            self.responses = fetchAll(self.URLs, headers=self.headers, use_cache=use_cache)
+
+    def loadAndPaginate(self, max_pages=None, use_cache=False):
+        """
+        Follows the API's own pagination from every URL loaded into self.URLs until the data runs out, and stores the
+        pages in self.responses
+
+        :param max_pages:               Maximum number of pages to request per URL, None to follow until the data runs
+                                        out
+        :param use_cache:               Serve and store the responses through the shared on-disk response cache
+        """
+
+        self.responses = fetchAllPages(self.URLs, self.pagination, headers=self.headers, max_pages=max_pages,
+                                       use_cache=use_cache)
+
+    def loadAndParse(self, parse, paginate=False, use_cache=False):
+        """
+        Sends the requests loaded into self.URLs and hands the payloads over to one of the parse methods, so that a
+        whole scrape can run as a single background job
+
+        :param parse:                   Bound parse method to call once the payloads are in, such as self.parseAllNFTs
+        :param paginate:                Follow the API's own pagination from every URL until the data runs out
+        :param use_cache:               Serve and store the responses through the shared on-disk response cache
+        """
+
+        if paginate:
+            self.loadAndPaginate(use_cache=use_cache)
         else:
-            os.system('python utils/async_requests.py')
+            self.loadAndSendPayload(use_cache=use_cache)
+        parse()
+
+    def loadResponses(self):
+        """
+        Returns the payloads obtained from loadAndSendPayload(), reading them back from the subprocess fallback's
+        temporary files if they were not fetched in-process
+
+        :return:                        List of responses in the JSON format, or None if nothing was fetched
+        """
+
+        if self.responses:
+            return self.responses
+        if self.workspace is not None:
+            data = loadDumps(self.workspace)
+            self.workspace = None
+            return data
+        return None
+
+    def buildFrame(self, record_key=None, columns=None):
+        """
+        Builds a DataFrame page by page from the payloads obtained from loadAndSendPayload(), releasing each page as
+        soon as it has been converted
+
+        :param record_key:              Key of the list of records in each page, None to treat each page as one record
+        :param columns:                 Columns to keep, None or empty to keep all columns
+        :return:                        Complete Pandas DataFrame
+        """
+
+        builder = FrameBuilder(record_key=record_key, columns=columns, schema=self.schema)
+        data = self.loadResponses()
+
+        if data is not None:
+            for index in range(len(data)):
+                builder.addPage(data[index])
+                data[index] = None
+
+        self.responses = []
+        return builder.build()
+
+    def loadAndBuild(self, columns=None, paginate=False, spill_rows=None, use_cache=False):
+        """
+        Sends the requests loaded into self.URLs and turns each page into a columnar chunk as soon as it arrives, so
+        that the raw pages are never all held in memory at once; only applies to the list queries
+
+        :param columns:                 Columns to keep, None or empty to keep all columns
+        :param paginate:                Follow the API's own pagination from every URL until the data runs out
+        :param spill_rows:              Number of buffered rows after which the chunks are written to disk, None to
+                                        keep every chunk in memory
+        :param use_cache:               Serve and store the responses through the shared on-disk response cache
+        """
+
+        builder = FrameBuilder(record_key=self.pagination.record_key, columns=columns, spill_rows=spill_rows,
+                               schema=self.schema)
+        # with columns of interest, pages are parsed as they stream in and only those fields are ever built
+        record_stream = RecordStream(self.pagination.record_key, columns) if columns else None
+
+        if paginate:
+            fetchAllPages(self.URLs, self.pagination, headers=self.headers, callback=builder.addPage,
+                          use_cache=use_cache, record_stream=record_stream)
+        else:
+            for result in iterFetch(self.URLs, headers=self.headers, use_cache=use_cache,
+                                    record_stream=record_stream):
+                if result.error is not None:
+                    # the decoded body of an error response is not a page of records; the request is kept as a
+                    # failure by the job it was sent for, to be retried on its own
+                    continue
+                builder.addPage(result.payload)
+
+        self.response_frame = builder.build()
+
+    def saveToStore(self, store=None):
+        """
+        Appends the parsed DataFrame to the local data store, partitioned by marketplace, endpoint and scrape date
+
+        :param store:                   DataStore object, defaults to the shared data store
+        :return:                        Path of the written file, or None if there was nothing to store
+        """
+
+        store = store if store is not None else getDataStore()
+        return store.append(self.response_frame, self.marketplace, type(self).__name__.lower())
+
+    def loadFromStore(self, columns=None, filters=None, since=None, until=None, store=None):
+        """
+        Reads the scrapes of this endpoint back from the local data store instead of sending any request
+
+        :param columns:                 Columns to read, None or empty to read all columns
+        :param filters:                 List of (column, operator, value) tuples pushed down to the scan
+        :param since:                   Earliest scrape date as YYYY-MM-DD, None for no lower bound
+        :param until:                   Latest scrape date as YYYY-MM-DD, None for no upper bound
+        :param store:                   DataStore object, defaults to the shared data store
+        :return:                        Pandas DataFrame
+        """
+
+        store = store if store is not None else getDataStore()
+        self.response_frame = applySchema(store.read(self.marketplace, type(self).__name__.lower(), columns=columns,
+                                                     filters=filters, since=since, until=until), self.schema)
+        return self.response_frame
 
     def resetAll(self):
         """
@@ -49,11 +187,14 @@ class Mintable:
         self.URLs = []
         self.response_frame = pd.DataFrame()
         self.responses = []
+        discardDumps(self.workspace)
+        self.workspace = None
 
 
 class NFT(Mintable):
     def __init__(self):
         super().__init__()
+        self.schema = config.SCHEMA_NFTS
 
     def setGaslessNFTParameters(self,
                                 user_address: str):
@@ -145,46 +286,16 @@ class NFT(Mintable):
                 self.endpoint = f'{self.endpoint}{id}'
 
         # this is going into headers
-        if assertType(self.api_key, api_key):
+        if assertType(self.api_key_type, api_key):
             if api_key is not None:
                 self.api_key = api_key
+                self.headers['x-api-key'] = api_key
 
-        with open('headers_temp.pkl', 'wb') as f:
-            pickle.dump(self.api_key, f)
-
-    def parseAllNFTs(self):
-        base_filepath = os.path.join(os.getcwd(), 'data_dumps.json')
-        url_filepath = os.path.join(os.getcwd(), 'url_dumps.pkl')
-
-        if os.path.exists(base_filepath):
-            main_list = []
-            with open(f'{base_filepath}', 'rb') as f:
-                data = json.load(f)
-
-                if data is not None:
-                    for dat in data:
-                        if dat is None:
-                            pass
-                        elif 'result' in dat:
-                            main_list.extend(dat['result'])
-
-            self.response_frame = pd.DataFrame(data=main_list).astype(str)
-            os.remove(base_filepath)
-            os.remove(url_filepath)
-
-    def parseSingleNFT(self):
-        base_filepath = os.path.join(os.getcwd(), 'data_dumps.json')
-        url_filepath = os.path.join(os.getcwd(), 'url_dumps.pkl')
-
-        if os.path.exists(base_filepath):
-            with open(f'{base_filepath}', 'rb') as f:
-                data = json.load(f)
-
-                self.response_frame = pd.DataFrame(data=data).astype(str)
+    def parseAllNFTs(self, columns=None):
+        self.response_frame = self.buildFrame(record_key='result', columns=columns)
 
-            # clean up temp files
-            os.remove(base_filepath)
-            os.remove(url_filepath)
+    def parseSingleNFT(self, columns=None):
+        self.response_frame = self.buildFrame(columns=columns)
 
 
 class Auction(Mintable):
@@ -193,26 +304,11 @@ class Auction(Mintable):
 
     def setEndingSoonAuctions(self):
         self.endpoint = 'https://api.mintable.app/auctions-ending-soon'
+        self.URLs.append(self.endpoint)
 
     def setHotAuctions(self):
         self.endpoint = 'https://api.mintable.app/hot-auctions'
+        self.URLs.append(self.endpoint)
 
-    def parseEndingSoonAndHotAuctions(self):
-        base_filepath = os.path.join(os.getcwd(), 'data_dumps.json')
-        url_filepath = os.path.join(os.getcwd(), 'url_dumps.pkl')
-
-        if os.path.exists(base_filepath):
-            main_list = []
-            with open(f'{base_filepath}', 'rb') as f:
-                data = json.load(f)
-
-                if data is not None:
-                    for dat in data:
-                        if dat is None:
-                            pass
-                        elif 'result' in dat:
-                            main_list.extend(dat['result'])
-
-            self.response_frame = pd.DataFrame(data=main_list).astype(str)
-            os.remove(base_filepath)
-            os.remove(url_filepath)
+    def parseEndingSoonAndHotAuctions(self, columns=None):
+        self.response_frame = self.buildFrame(record_key='result', columns=columns)
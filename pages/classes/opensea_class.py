@@ -1,10 +1,15 @@
-import os
-import pickle
 import pandas as pd
-import json
+import pages.config.opensea_config as config
 
 from typing import Optional
-from utils.utils import assertType
+from utils.validation import assertType
+from utils.frame_builder import FrameBuilder, applySchema
+from utils.data_store import getDataStore
+from utils.async_requests import fetchAll, iterFetch, fetchAllFromSubprocess, loadDumps, discardDumps
+from utils.decoding import RecordStream
+from utils.pagination import OffsetPagination, TimeSlicedPagination, fetchAllPages, getQueryParameter, \
+    setQueryParameter
+from utils.sync_store import SyncStore, DEFAULT_SYNC_DIR
 
 
 class Opensea:
@@ -53,22 +58,136 @@ class Opensea:
         self.URLs = []
         self.response_frame = pd.DataFrame()
         self.responses = []
+        self.workspace = None
+        self.pagination = None
+        self.schema = {}
+        self.marketplace = 'opensea'
         self.timeout = 1200
 
-    def loadAndSendPayload(self):
+    def loadAndSendPayload(self, use_subprocess=False, use_cache=False):
         """
-        Loads up the requests and prepares them for asynchronous request sending
+        Sends the requests loaded into self.URLs on the shared event loop and stores the parsed payloads in
+        self.responses
+
+        :param use_subprocess:          Fall back to handing the URLs over to a separate interpreter through temporary
+                                        files in a workspace of its own instead of fetching them in-process
+        :param use_cache:               Serve and store the responses through the shared on-disk response cache
         """
 
-        # serialize urls for passing it on to the async component
-        try:
-            url_filepath = os.path.join(os.getcwd(), 'url_dumps.pkl')
-            with open(url_filepath, 'wb') as output:
-                pickle.dump(self.URLs, output)
-        except Exception as ex:
-            raise
+        if use_subprocess:
+            # serialize urls for passing it on to the async component
+            self.workspace = fetchAllFromSubprocess(self.URLs)
+        else:
+            self.responses = fetchAll(self.URLs, timeout=self.timeout, use_cache=use_cache)
+
+    def loadAndPaginate(self, max_pages=None, use_cache=False):
+        """
+        Follows the API's own pagination from every URL loaded into self.URLs until the data runs out, and stores the
+        pages in self.responses
+
+        :param max_pages:               Maximum number of pages to request per URL, None to follow until the data runs
+                                        out
+        :param use_cache:               Serve and store the responses through the shared on-disk response cache
+        """
+
+        self.responses = fetchAllPages(self.URLs, self.pagination, max_pages=max_pages, timeout=self.timeout,
+                                       use_cache=use_cache)
+
+    def loadResponses(self):
+        """
+        Returns the payloads obtained from loadAndSendPayload(), reading them back from the subprocess fallback's
+        temporary files if they were not fetched in-process
+
+        :return:                        List of responses in the JSON format, or None if nothing was fetched
+        """
+
+        if self.responses:
+            return self.responses
+        if self.workspace is not None:
+            data = loadDumps(self.workspace)
+            self.workspace = None
+            return data
+        return None
+
+    def buildFrame(self, record_key=None, columns=None):
+        """
+        Builds a DataFrame page by page from the payloads obtained from loadAndSendPayload(), releasing each page as
+        soon as it has been converted
+
+        :param record_key:              Key of the list of records in each page, None to treat each page as one record
+        :param columns:                 Columns to keep, None or empty to keep all columns
+        :return:                        Complete Pandas DataFrame
+        """
+
+        builder = FrameBuilder(record_key=record_key, columns=columns, schema=self.schema)
+        data = self.loadResponses()
+
+        if data is not None:
+            for index in range(len(data)):
+                builder.addPage(data[index])
+                data[index] = None
+
+        self.responses = []
+        return builder.build()
+
+    def loadAndBuild(self, columns=None, paginate=False, spill_rows=None, use_cache=False):
+        """
+        Sends the requests loaded into self.URLs and turns each page into a columnar chunk as soon as it arrives, so
+        that the raw pages are never all held in memory at once
+
+        :param columns:                 Columns to keep, None or empty to keep all columns
+        :param paginate:                Follow the API's own pagination from every URL until the data runs out
+        :param spill_rows:              Number of buffered rows after which the chunks are written to disk, None to
+                                        keep every chunk in memory
+        :param use_cache:               Serve and store the responses through the shared on-disk response cache
+        """
+
+        builder = FrameBuilder(record_key=self.pagination.record_key, columns=columns, spill_rows=spill_rows,
+                               schema=self.schema)
+        # with columns of interest, pages are parsed as they stream in and only those fields are ever built
+        record_stream = RecordStream(self.pagination.record_key, columns) if columns else None
+
+        if paginate:
+            fetchAllPages(self.URLs, self.pagination, callback=builder.addPage, timeout=self.timeout,
+                          use_cache=use_cache, record_stream=record_stream)
         else:
-            os.system('python utils/async_requests.py')
+            for result in iterFetch(self.URLs, timeout=self.timeout, use_cache=use_cache,
+                                    record_stream=record_stream):
+                if result.error is not None:
+                    # the decoded body of an error response is not a page of records; the request is kept as a
+                    # failure by the job it was sent for, to be retried on its own
+                    continue
+                builder.addPage(result.payload)
+
+        self.response_frame = builder.build()
+
+    def saveToStore(self, store=None):
+        """
+        Appends the parsed DataFrame to the local data store, partitioned by marketplace, endpoint and scrape date
+
+        :param store:                   DataStore object, defaults to the shared data store
+        :return:                        Path of the written file, or None if there was nothing to store
+        """
+
+        store = store if store is not None else getDataStore()
+        return store.append(self.response_frame, self.marketplace, type(self).__name__.lower())
+
+    def loadFromStore(self, columns=None, filters=None, since=None, until=None, store=None):
+        """
+        Reads the scrapes of this endpoint back from the local data store instead of sending any request
+
+        :param columns:                 Columns to read, None or empty to read all columns
+        :param filters:                 List of (column, operator, value) tuples pushed down to the scan
+        :param since:                   Earliest scrape date as YYYY-MM-DD, None for no lower bound
+        :param until:                   Latest scrape date as YYYY-MM-DD, None for no upper bound
+        :param store:                   DataStore object, defaults to the shared data store
+        :return:                        Pandas DataFrame
+        """
+
+        store = store if store is not None else getDataStore()
+        self.response_frame = applySchema(store.read(self.marketplace, type(self).__name__.lower(), columns=columns,
+                                                     filters=filters, since=since, until=until), self.schema)
+        return self.response_frame
 
     def resetAll(self):
         """
@@ -79,6 +198,8 @@ class Opensea:
         self.URLs = []
         self.response_frame = pd.DataFrame()
         self.responses = []
+        discardDumps(self.workspace)
+        self.workspace = None
 
 
 class Assets(Opensea):
@@ -89,6 +210,8 @@ class Assets(Opensea):
     def __init__(self):
         super().__init__()
         self.endpoint = 'https://api.opensea.io/api/v1/assets'
+        self.pagination = OffsetPagination(record_key='assets', max_offset=10000)
+        self.schema = config.SCHEMA_ASSETS
 
     def setAssetParameters(self,
                            owner: Optional[str] = None,
@@ -183,37 +306,27 @@ class Assets(Opensea):
 
         self.URLs.append(f'{self.endpoint}{temp}')
 
-    def parseResponse(self):
+    def parseResponse(self, columns=None):
         """
         This parses the response object obtained from loadAndSendPayload()
 
+        :param columns:                 Columns to keep, None or empty to keep all columns
         :return:                        Complete Pandas DataFrame
         """
 
-        base_filepath = os.path.join(os.getcwd(), 'data_dumps.json')
-        url_filepath = os.path.join(os.getcwd(), 'url_dumps.pkl')
-
-        if os.path.exists(base_filepath):
-            main_list = []
-            with open(f'{base_filepath}', 'rb') as f:
-                data = json.load(f)
-
-                if data is not None:
-                    for dat in data:
-                        if 'assets' in dat:
-                            main_list.extend(dat['assets'])
-                        if 'detail' in dat:
-                            pass
-
-            self.response_frame = pd.DataFrame(data=main_list).astype(str)
-            os.remove(base_filepath)
-            os.remove(url_filepath)
+        self.response_frame = self.buildFrame(record_key='assets', columns=columns)
 
 
 class Events(Opensea):
     def __init__(self):
         super().__init__()
         self.endpoint = 'https://api.opensea.io/api/v1/events'
+        self.pagination = OffsetPagination(record_key='asset_events', max_offset=10000)
+        self.schema = config.SCHEMA_EVENTS
+        self.new_events = 0
+        self.new_frame = None
+        self.truncated_windows = []
+        self.failed_pages = []
 
     def setEventsParameters(self,
                             asset_contract_address: Optional[str] = None,
@@ -313,37 +426,151 @@ class Events(Opensea):
 
         self.URLs.append(f'{self.endpoint}{temp}')
 
-    def parseResponse(self):
+    def parseResponse(self, columns=None):
         """
         This parses the response object obtained from loadAndSendPayload()
 
+        :param columns:                 Columns to keep, None or empty to keep all columns
         :return:                        Complete Pandas DataFrame
         """
 
-        base_filepath = os.path.join(os.getcwd(), 'data_dumps.json')
-        url_filepath = os.path.join(os.getcwd(), 'url_dumps.pkl')
+        self.response_frame = self.buildFrame(record_key='asset_events', columns=columns)
+
+    def loadAndSlice(self, columns=None, shards=8, spill_rows=None, use_cache=False):
+        """
+        Sends the queries loaded into self.URLs and follows each of them past Opensea's offset cap by splitting its
+        occurred_after/occurred_before window into sub-windows which are paged concurrently, splitting again the ones
+        which come back full; a query without a window covers everything from config.EARLIEST_EVENT until now
+
+        :param columns:                 Columns to keep, None or empty to keep all columns
+        :param shards:                  Number of sub-windows each query is first split into, which is also the
+                                        maximum number of sub-windows paged at once
+        :param spill_rows:              Number of buffered rows after which the chunks are written to disk, None to
+                                        keep every chunk in memory
+        :param use_cache:               Serve and store the responses through the shared on-disk response cache
+        """
+
+        pagination = TimeSlicedPagination(record_key='asset_events', max_offset=10000, shards=shards,
+                                          earliest=config.EARLIEST_EVENT)
+        builder = FrameBuilder(record_key=pagination.record_key, columns=columns, spill_rows=spill_rows,
+                               schema=self.schema)
+        record_stream = RecordStream(pagination.record_key, columns) if columns else None
+
+        fetchAllPages(self.URLs, pagination, callback=builder.addPage, timeout=self.timeout, use_cache=use_cache,
+                      record_stream=record_stream)
 
-        if os.path.exists(base_filepath):
-            main_list = []
-            with open(f'{base_filepath}', 'rb') as f:
-                data = json.load(f)
+        self.response_frame = builder.build()
+        self.truncated_windows = pagination.truncated
+        self.failed_pages = pagination.failures
 
-                if data is not None:
-                    for dat in data:
-                        if 'asset_events' in dat:
-                            main_list.extend(dat['asset_events'])
-                        if 'detail' in dat:
-                            pass
+    def syncEvents(self, store_dir=DEFAULT_SYNC_DIR, spill_rows=None, shards=None):
+        """
+        Incrementally syncs the query loaded through setEventsParameters() into a local store; only the events which
+        occurred after the store's high-water mark are fetched, and they are merged into the store and deduplicated on
+        the event id; the high-water mark only moves once every page of the window came back, so that the events of
+        a failed page are fetched by the next sync, and never past a second which held more events than could be
+        fetched. A window holding more events than the offset cap lets through has the rest of it sliced as
+        loadAndSlice() does
+
+        :param store_dir:               Directory holding the sync stores
+        :param spill_rows:              Number of buffered rows after which the chunks are written to disk, None to
+                                        keep every chunk in memory
+        :param shards:                  Split the window since the high-water mark into this many sub-windows paged
+                                        concurrently, as loadAndSlice() does, None to page it by offset alone
+        :return:                        Complete Pandas DataFrame of every event synced for the query, newest first; the
+                                        events the sync added are kept in self.new_frame
+        """
 
-            self.response_frame = pd.DataFrame(data=main_list).astype(str)
-            os.remove(base_filepath)
-            os.remove(url_filepath)
+        if len(self.URLs) != 1:
+            raise ValueError('Error: Incremental sync requires exactly one query. Try again.')
+
+        store = SyncStore(self.URLs[0], store_dir=store_dir)
+        watermark = store.loadWatermark()
+        if watermark is not None:
+            # from the second before the mark, as events which share the second of the newest one stored may not all
+            # have been fetched; the ones fetched twice are dropped on their id
+            start = watermark - 1
+            occurred_after = getQueryParameter(self.URLs[0], 'occurred_after')
+            if occurred_after is None or not occurred_after.isdigit() or int(occurred_after) < start:
+                self.URLs = [setQueryParameter(self.URLs[0], 'occurred_after', start)]
+
+        # always ask the API, the response cache would hide new events
+        complete = True
+        if shards is not None:
+            self.loadAndSlice(shards=shards, spill_rows=spill_rows, use_cache=False)
+        else:
+            self.loadAndBuild(paginate=True, spill_rows=spill_rows, use_cache=False)
+            self.failed_pages = self.pagination.failures
+            if self.pagination.capped:
+                complete = self.sliceOlderEvents(spill_rows)
+
+        ceiling = min(second for second, _ in self.truncated_windows) if self.truncated_windows else None
+        self.new_frame = applySchema(store.unseen(self.response_frame, key='id'), self.schema)
+        self.new_events = len(self.new_frame)
+        self.response_frame = applySchema(store.merge(self.response_frame, key='id', timestamp='created_date',
+                                                      advance=complete and not self.failed_pages, ceiling=ceiling),
+                                          self.schema)
+        return self.response_frame
+
+    def saveToStore(self, store=None):
+        """
+        Appends the parsed DataFrame to the local data store as Opensea.saveToStore() does; after syncEvents() only the
+        events the sync added are appended, as the parsed DataFrame then holds every event synced for the query
+
+        :param store:                   DataStore object, defaults to the shared data store
+        :return:                        Path of the written file, or None if there was nothing to store
+        """
+
+        if self.new_frame is None:
+            return super().saveToStore(store)
+        store = store if store is not None else getDataStore()
+        return store.append(self.new_frame, self.marketplace, type(self).__name__.lower())
+
+    def resetAll(self):
+        """
+        Function to quickly reset all the relevant class attributes in the deinit or reset process
+        """
+
+        super().resetAll()
+        self.new_events = 0
+        self.new_frame = None
+        self.truncated_windows = []
+        self.failed_pages = []
+
+    def sliceOlderEvents(self, spill_rows=None):
+        """
+        Fetches the events of the query older than the oldest one in self.response_frame, which paging by offset
+        stopped short of at the offset cap, by slicing their window as loadAndSlice() does, and adds them to the frame
+
+        :param spill_rows:              Number of buffered rows after which the chunks are written to disk, None to
+                                        keep every chunk in memory
+        :return:                        True if the older events were fetched, False if the frame has no readable
+                                        timestamp to slice from
+        """
+
+        if 'created_date' not in self.response_frame.columns:
+            return False
+        oldest = pd.to_datetime(self.response_frame['created_date'], errors='coerce', utc=True).min()
+        if pd.isna(oldest):
+            return False
+
+        newest, failed_pages, query = self.response_frame, self.failed_pages, self.URLs
+        self.URLs = [setQueryParameter(url, 'occurred_before', int(oldest.timestamp()) + 1) for url in query]
+        try:
+            self.loadAndSlice(spill_rows=spill_rows, use_cache=False)
+        finally:
+            self.URLs = query
+        self.response_frame = pd.concat([newest, self.response_frame], ignore_index=True)
+        self.failed_pages = failed_pages + self.failed_pages
+        return True
 
 
 class Collections(Opensea):
     def __init__(self):
         super().__init__()
         self.endpoint = 'https://api.opensea.io/api/v1/collections'
+        self.pagination = OffsetPagination(record_key='collections', max_offset=10000)
+        self.schema = config.SCHEMA_COLLECTIONS
 
     def setCollectionsParameters(self,
                                  asset_owner: Optional[str] = None,
@@ -395,37 +622,23 @@ class Collections(Opensea):
 
         self.URLs.append(f'{self.endpoint}{temp}')
 
-    def parseResponse(self):
+    def parseResponse(self, columns=None):
         """
         This parses the response object obtained from loadAndSendPayload()
 
+        :param columns:                 Columns to keep, None or empty to keep all columns
         :return:                        Complete Pandas DataFrame
         """
 
-        base_filepath = os.path.join(os.getcwd(), 'data_dumps.json')
-        url_filepath = os.path.join(os.getcwd(), 'url_dumps.pkl')
-
-        if os.path.exists(base_filepath):
-            main_list = []
-            with open(f'{base_filepath}', 'rb') as f:
-                data = json.load(f)
-
-                if data is not None:
-                    for dat in data:
-                        if dat is None:
-                            pass
-                        elif 'collections' in dat:
-                            main_list.extend(dat['collections'])
-
-            self.response_frame = pd.DataFrame(data=main_list).astype(str)
-            os.remove(base_filepath)
-            os.remove(url_filepath)
+        self.response_frame = self.buildFrame(record_key='collections', columns=columns)
 
 
 class Bundles(Opensea):
     def __init__(self):
         super().__init__()
         self.endpoint = 'https://api.opensea.io/api/v1/bundles'
+        self.pagination = OffsetPagination(record_key='bundles', max_offset=10000)
+        self.schema = config.SCHEMA_BUNDLES
 
     def setBundlesParameter(self,
                             on_sale: Optional[bool] = None,
@@ -508,28 +721,12 @@ class Bundles(Opensea):
 
         self.URLs.append(f'{self.endpoint}{temp}')
 
-    def parseResponse(self):
+    def parseResponse(self, columns=None):
         """
         This parses the response object obtained from loadAndSendPayload()
 
+        :param columns:                 Columns to keep, None or empty to keep all columns
         :return:                        Complete Pandas DataFrame
         """
 
-        base_filepath = os.path.join(os.getcwd(), 'data_dumps.json')
-        url_filepath = os.path.join(os.getcwd(), 'url_dumps.pkl')
-
-        if os.path.exists(base_filepath):
-            main_list = []
-            with open(f'{base_filepath}', 'rb') as f:
-                data = json.load(f)
-
-                if data is not None:
-                    for dat in data:
-                        if 'bundles' in dat:
-                            main_list.extend(dat['bundles'])
-                        if 'detail' in dat:
-                            pass
-
-            self.response_frame = pd.DataFrame(data=main_list).astype(str)
-            os.remove(base_filepath)
-            os.remove(url_filepath)
+        self.response_frame = self.buildFrame(record_key='bundles', columns=columns)
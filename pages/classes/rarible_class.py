@@ -1,10 +1,11 @@
-import os
-import pickle
 import pandas as pd
-import json
 
 from typing import Optional
-from utils.utils import assertType
+from utils.validation import assertType
+from utils.frame_builder import FrameBuilder, applySchema
+from utils.async_requests import fetchAll, fetchAllFromSubprocess, loadDumps, discardDumps
+from utils.pagination import TokenPagination, fetchAllPages
+from utils.data_store import getDataStore
 
 
 class Rarible:
@@ -30,6 +31,118 @@ class Rarible:
         self.user_type = str
 
         self.URLs = []
+        self.responses = []
+        self.workspace = None
+        self.response_frame = pd.DataFrame()
+        self.pagination = TokenPagination(token_key='continuation')
+        self.schema = {}
+        self.marketplace = 'rarible'
+        self.timeout = 1200
+
+    def loadAndSendPayload(self, use_subprocess=False, use_cache=False):
+        """
+        Sends the requests loaded into self.URLs on the shared event loop and stores the parsed payloads in
+        self.responses
+
+        :param use_subprocess:          Fall back to handing the URLs over to a separate interpreter through temporary
+                                        files in a workspace of its own instead of fetching them in-process
+        :param use_cache:               Serve and store the responses through the shared on-disk response cache
+        """
+
+        if use_subprocess:
+            # serialize urls for passing it on to the async component
+            self.workspace = fetchAllFromSubprocess(self.URLs)
+        else:
+            self.responses = fetchAll(self.URLs, timeout=self.timeout, use_cache=use_cache)
+
+    def loadAndPaginate(self, max_pages=None, use_cache=False):
+        """
+        Follows the API's own pagination from every URL loaded into self.URLs until the data runs out, and stores the
+        pages in self.responses
+
+        :param max_pages:               Maximum number of pages to request per URL, None to follow until the data runs
+                                        out
+        :param use_cache:               Serve and store the responses through the shared on-disk response cache
+        """
+
+        self.responses = fetchAllPages(self.URLs, self.pagination, max_pages=max_pages, timeout=self.timeout,
+                                       use_cache=use_cache)
+
+    def loadResponses(self):
+        """
+        Returns the payloads obtained from loadAndSendPayload() or loadAndPaginate(), reading them back from the
+        subprocess fallback's temporary files if they were not fetched in-process
+
+        :return:                        List of responses in the JSON format, or None if nothing was fetched
+        """
+
+        if self.responses:
+            return self.responses
+        if self.workspace is not None:
+            data = loadDumps(self.workspace)
+            self.workspace = None
+            return data
+        return None
+
+    def buildFrame(self, record_key=None, columns=None):
+        """
+        Builds a DataFrame page by page from the pages obtained from loadAndSendPayload() or loadAndPaginate(),
+        releasing each page as soon as it has been converted
+
+        :param record_key:              Key of the list of records in each page, None to treat each page as one record
+        :param columns:                 Columns to keep, None or empty to keep all columns
+        :return:                        Complete Pandas DataFrame
+        """
+
+        builder = FrameBuilder(record_key=record_key, columns=columns, schema=self.schema)
+        data = self.loadResponses()
+
+        if data is not None:
+            for index in range(len(data)):
+                builder.addPage(data[index])
+                data[index] = None
+
+        self.responses = []
+        return builder.build()
+
+    def saveToStore(self, store=None):
+        """
+        Appends the parsed DataFrame to the local data store, partitioned by marketplace, endpoint and scrape date
+
+        :param store:                   DataStore object, defaults to the shared data store
+        :return:                        Path of the written file, or None if there was nothing to store
+        """
+
+        store = store if store is not None else getDataStore()
+        return store.append(self.response_frame, self.marketplace, type(self).__name__.lower())
+
+    def loadFromStore(self, columns=None, filters=None, since=None, until=None, store=None):
+        """
+        Reads the scrapes of this endpoint back from the local data store instead of sending any request
+
+        :param columns:                 Columns to read, None or empty to read all columns
+        :param filters:                 List of (column, operator, value) tuples pushed down to the scan
+        :param since:                   Earliest scrape date as YYYY-MM-DD, None for no lower bound
+        :param until:                   Latest scrape date as YYYY-MM-DD, None for no upper bound
+        :param store:                   DataStore object, defaults to the shared data store
+        :return:                        Pandas DataFrame
+        """
+
+        store = store if store is not None else getDataStore()
+        self.response_frame = applySchema(store.read(self.marketplace, type(self).__name__.lower(), columns=columns,
+                                                     filters=filters, since=since, until=until), self.schema)
+        return self.response_frame
+
+    def resetAll(self):
+        """
+        Resets all relevant class attributes
+        """
+
+        self.URLs = []
+        self.response_frame = pd.DataFrame()
+        self.responses = []
+        discardDumps(self.workspace)
+        self.workspace = None
 
 
 class Ownership(Rarible):
@@ -121,14 +234,14 @@ class Ownership(Rarible):
 
         self.URLs.append(f'{self.endpoint}{temp}')
 
-    def parseNFTByIDParameter(self):
-        pass
+    def parseNFTByIDParameter(self, columns=None):
+        self.response_frame = self.buildFrame(columns=columns)
 
-    def parseNFTByItemParameter(self):
-        pass
+    def parseNFTByItemParameter(self, columns=None):
+        self.response_frame = self.buildFrame(record_key='ownerships', columns=columns)
 
-    def parseNFTAllParameter(self):
-        pass
+    def parseNFTAllParameter(self, columns=None):
+        self.response_frame = self.buildFrame(record_key='ownerships', columns=columns)
 
 
 class Item(Rarible):
@@ -368,26 +481,26 @@ class Item(Rarible):
 
         self.URLs.append(f'{self.endpoint}{temp}')
 
-    def parseNFTMetaByID(self):
-        pass
+    def parseNFTMetaByID(self, columns=None):
+        self.response_frame = self.buildFrame(columns=columns)
 
-    def parseNFTLazyItemByID(self):
-        pass
+    def parseNFTLazyItemByID(self, columns=None):
+        self.response_frame = self.buildFrame(columns=columns)
 
-    def parseNFTItemByID(self):
-        pass
+    def parseNFTItemByID(self, columns=None):
+        self.response_frame = self.buildFrame(columns=columns)
 
-    def parseNFTItemByOwner(self):
-        pass
+    def parseNFTItemByOwner(self, columns=None):
+        self.response_frame = self.buildFrame(record_key='items', columns=columns)
 
-    def parseNFTItemByCreator(self):
-        pass
+    def parseNFTItemByCreator(self, columns=None):
+        self.response_frame = self.buildFrame(record_key='items', columns=columns)
 
-    def parseNFTItemByCollection(self):
-        pass
+    def parseNFTItemByCollection(self, columns=None):
+        self.response_frame = self.buildFrame(record_key='items', columns=columns)
 
-    def parseNFTAllItems(self):
-        pass
+    def parseNFTAllItems(self, columns=None):
+        self.response_frame = self.buildFrame(record_key='items', columns=columns)
 
 
 class Collection(Rarible):
@@ -497,17 +610,17 @@ class Collection(Rarible):
 
         self.URLs.append(f'{self.endpoint}{temp}')
 
-    def parseGenerateNFTID(self):
-        pass
+    def parseGenerateNFTID(self, columns=None):
+        self.response_frame = self.buildFrame(columns=columns)
 
-    def parseNFTCollectionByID(self):
-        pass
+    def parseNFTCollectionByID(self, columns=None):
+        self.response_frame = self.buildFrame(columns=columns)
 
-    def parseQueryCollectionsByOwner(self):
-        pass
+    def parseQueryCollectionsByOwner(self, columns=None):
+        self.response_frame = self.buildFrame(record_key='collections', columns=columns)
 
-    def parseQueryAllCollections(self):
-        pass
+    def parseQueryAllCollections(self, columns=None):
+        self.response_frame = self.buildFrame(record_key='collections', columns=columns)
 
 
 class OrderOwnership(Rarible):
@@ -602,14 +715,14 @@ class OrderOwnership(Rarible):
 
         self.URLs.append(f'{self.endpoint}{temp}')
 
-    def parseGetNFTOrderByOwnershipID(self):
-        pass
+    def parseGetNFTOrderByOwnershipID(self, columns=None):
+        self.response_frame = self.buildFrame(columns=columns)
 
-    def parseGetNFTOwnershipByItem(self):
-        pass
+    def parseGetNFTOwnershipByItem(self, columns=None):
+        self.response_frame = self.buildFrame(record_key='ownerships', columns=columns)
 
-    def parseGetAllNFTOwnership(self):
-        pass
+    def parseGetAllNFTOwnership(self, columns=None):
+        self.response_frame = self.buildFrame(record_key='ownerships', columns=columns)
 
 
 class OrderItem(Rarible):
@@ -849,26 +962,26 @@ class OrderItem(Rarible):
 
         self.URLs.append(f'{self.endpoint}{temp}')
 
-    def parseNFTOrderItemByID(self):
-        pass
+    def parseNFTOrderItemByID(self, columns=None):
+        self.response_frame = self.buildFrame(columns=columns)
 
-    def parseNFTOrderItemMetaByID(self):
-        pass
+    def parseNFTOrderItemMetaByID(self, columns=None):
+        self.response_frame = self.buildFrame(columns=columns)
 
-    def parseNFTLazyItemByID(self):
-        pass
+    def parseNFTLazyItemByID(self, columns=None):
+        self.response_frame = self.buildFrame(columns=columns)
 
-    def parseNFTOrderItemByOwner(self):
-        pass
+    def parseNFTOrderItemByOwner(self, columns=None):
+        self.response_frame = self.buildFrame(record_key='items', columns=columns)
 
-    def parseNFTOrderItemByCreator(self):
-        pass
+    def parseNFTOrderItemByCreator(self, columns=None):
+        self.response_frame = self.buildFrame(record_key='items', columns=columns)
 
-    def parseNFTItemByCollection(self):
-        pass
+    def parseNFTItemByCollection(self, columns=None):
+        self.response_frame = self.buildFrame(record_key='items', columns=columns)
 
-    def parseNFTAllItems(self):
-        pass
+    def parseNFTAllItems(self, columns=None):
+        self.response_frame = self.buildFrame(record_key='items', columns=columns)
 
 
 class OrderActivity(Rarible):
@@ -1044,17 +1157,17 @@ class OrderActivity(Rarible):
 
         self.URLs.append(f'{self.endpoint}{temp}')
 
-    def parseNFTOrderActivityByUser(self):
-        pass
+    def parseNFTOrderActivityByUser(self, columns=None):
+        self.response_frame = self.buildFrame(record_key='items', columns=columns)
 
-    def parseNFTOrderActivityByItem(self):
-        pass
+    def parseNFTOrderActivityByItem(self, columns=None):
+        self.response_frame = self.buildFrame(record_key='items', columns=columns)
 
-    def parseNFTOrderActivityByCollection(self):
-        pass
+    def parseNFTOrderActivityByCollection(self, columns=None):
+        self.response_frame = self.buildFrame(record_key='items', columns=columns)
 
-    def parseAllNFTOrderActivity(self):
-        pass
+    def parseAllNFTOrderActivity(self, columns=None):
+        self.response_frame = self.buildFrame(record_key='items', columns=columns)
 
 
 class OrderCollection(Rarible):
@@ -1164,14 +1277,14 @@ class OrderCollection(Rarible):
 
         self.URLs.append(f'{self.endpoint}{temp}')
 
-    def parseGenerateNFTOrderTokenID(self):
-        pass
+    def parseGenerateNFTOrderTokenID(self, columns=None):
+        self.response_frame = self.buildFrame(columns=columns)
 
-    def parseNFTOrderCollectionByID(self):
-        pass
+    def parseNFTOrderCollectionByID(self, columns=None):
+        self.response_frame = self.buildFrame(columns=columns)
 
-    def parseQueryNFTOrderCollectionsByOwner(self):
-        pass
+    def parseQueryNFTOrderCollectionsByOwner(self, columns=None):
+        self.response_frame = self.buildFrame(record_key='collections', columns=columns)
 
-    def parseQueryAllNFTOrderCollections(self):
-        pass
+    def parseQueryAllNFTOrderCollections(self, columns=None):
+        self.response_frame = self.buildFrame(record_key='collections', columns=columns)
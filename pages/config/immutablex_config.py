@@ -27,6 +27,23 @@ VERBOSE = True
 SAVE = True
 VERBOSITY = 20
 ADVANCED = False
+PROFILE_MODE = 'Sample'
+PROFILE_ROWS = 10000
+EXPORT_FORMAT = 'CSV'
 QUERY_MODE = ''
 QUERY_PARAMS = None
 ASSERT_INPUTS = False
+USE_CACHE = True
+STORE = True
+FOLLOW_PAGINATION = False
+
+# column kinds of each endpoint, see utils.frame_builder.applySchema
+SCHEMA_ASSETS = {'token_address': 'category', 'token_id': 'string', 'id': 'string', 'user': 'string',
+                 'status': 'category', 'uri': 'string', 'name': 'string', 'description': 'string',
+                 'image_url': 'string', 'metadata': 'json', 'collection': 'json', 'fees': 'json', 'orders': 'json',
+                 'created_at': 'datetime', 'updated_at': 'datetime'}
+SCHEMA_COLLECTIONS = {'address': 'string', 'name': 'string', 'description': 'string', 'icon_url': 'string',
+                      'collection_image_url': 'string', 'project_id': 'numeric', 'project_owner_address': 'string',
+                      'metadata_api_url': 'string', 'created_at': 'datetime', 'updated_at': 'datetime'}
+SCHEMA_TOKENS = {'name': 'string', 'image_url': 'string', 'token_address': 'string', 'symbol': 'category',
+                 'decimals': 'numeric', 'quantum': 'numeric', 'minimum_quantum': 'numeric'}
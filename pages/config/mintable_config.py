@@ -14,8 +14,19 @@ API_KEY = None
 RETRIEVAL_METHOD = 'Assets'
 DATA_MODE = False
 ADVANCED = False
+PROFILE_MODE = 'Sample'
+PROFILE_ROWS = 10000
+EXPORT_FORMAT = 'CSV'
 SAVE = True
 VERBOSE = True
 VERBOSITY = 20
 QUERY_PARAMS = None
 ASSERT_INPUTS = False
+USE_CACHE = True
+STORE = True
+FOLLOW_PAGINATION = False
+
+# column kinds of each endpoint, see utils.frame_builder.applySchema
+SCHEMA_NFTS = {'id': 'string', 'tokenId': 'string', 'name': 'string', 'description': 'string', 'price': 'numeric',
+               'auction': 'bool', 'category': 'category', 'network': 'category', 'contractAddress': 'string',
+               'attributes': 'json', 'metadata': 'json', 'createdAt': 'datetime', 'updatedAt': 'datetime'}
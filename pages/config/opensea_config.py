@@ -24,11 +24,26 @@ TOKEN_IDS = None
 RETRIEVAL_METHOD = 'Assets'
 GET_ALL = False
 ADVANCED = False
+PROFILE_MODE = 'Sample'
+PROFILE_ROWS = 10000
+EXPORT_FORMAT = 'CSV'
+RARITY = False
+SALES_SERIES = False
+SERIES_FREQ = '1D'
+SERIES_CURRENCY = 'eth'
 SAVE = True
 VERBOSE = True
 VERBOSITY = 20
 QUERY_PARAMS = None
 ASSERT_INPUTS = False
+INCREMENTAL = False
+USE_CACHE = True
+STORE = True
+SPILL_ROWS = 20000
+TIME_SLICED = False
+SHARDS = 8
+# start of the window of an Events query split by time which sets no occurred_after, the month Opensea launched
+EARLIEST_EVENT = 1512086400
 SAVED_OUTPUTS_ASSETS = ['name', 'description', 'external_link', 'asset_contract', 'permalink', 'collection', 'decimals',
                         'token_metadata', 'owner', 'sell_orders', 'creator', 'traits', 'last_sale', 'top_bid',
                         'listing_date', 'is_presale', 'transfer_fee_payment_token', 'transfer_fee']
@@ -45,3 +60,26 @@ SAVED_OUTPUTS_COLLECTIONS = ['primary_asset_contracts', 'traits', 'stats', 'bann
 SAVED_OUTPUTS_BUNDLES = ['maker', 'slug', 'assets', 'name', 'description', 'external_link', 'asset_contract',
                          'permalink', 'sell_orders']
 SAVED_OUTPUTS_ACTUAL = []
+
+# column kinds of each endpoint, see utils.frame_builder.applySchema
+SCHEMA_ASSETS = {'id': 'numeric', 'token_id': 'string', 'num_sales': 'numeric', 'name': 'string',
+                 'description': 'string', 'external_link': 'string', 'permalink': 'string', 'decimals': 'numeric',
+                 'token_metadata': 'string', 'asset_contract': 'json', 'collection': 'json', 'owner': 'json',
+                 'sell_orders': 'json', 'creator': 'json', 'traits': 'json', 'last_sale': 'json', 'top_bid': 'json',
+                 'listing_date': 'datetime', 'is_presale': 'bool', 'transfer_fee_payment_token': 'json',
+                 'transfer_fee': 'numeric'}
+SCHEMA_EVENTS = {'id': 'numeric', 'event_type': 'category', 'auction_type': 'category', 'asset': 'json',
+                 'asset_bundle': 'json', 'created_date': 'datetime', 'from_account': 'json', 'to_account': 'json',
+                 'seller': 'json', 'winner_account': 'json', 'transaction': 'json', 'is_private': 'bool',
+                 'payment_token': 'json', 'quantity': 'numeric', 'total_price': 'numeric', 'bid_amount': 'numeric',
+                 'starting_price': 'numeric', 'ending_price': 'numeric', 'duration': 'numeric',
+                 'collection_slug': 'category', 'contract_address': 'category'}
+SCHEMA_COLLECTIONS = {'primary_asset_contracts': 'json', 'traits': 'json', 'stats': 'json', 'display_data': 'json',
+                      'created_date': 'datetime', 'default_to_fiat': 'bool', 'dev_buyer_fee_basis_points': 'numeric',
+                      'dev_seller_fee_basis_points': 'numeric', 'featured': 'bool', 'hidden': 'bool',
+                      'safelist_request_status': 'category', 'is_subject_to_whitelist': 'bool',
+                      'only_proxied_transfers': 'bool', 'opensea_buyer_fee_basis_points': 'numeric',
+                      'opensea_seller_fee_basis_points': 'numeric', 'require_email': 'bool', 'name': 'string',
+                      'slug': 'string', 'description': 'string', 'short_description': 'string'}
+SCHEMA_BUNDLES = {'maker': 'json', 'slug': 'string', 'assets': 'json', 'name': 'string', 'description': 'string',
+                  'external_link': 'string', 'asset_contract': 'json', 'permalink': 'string', 'sell_orders': 'json'}
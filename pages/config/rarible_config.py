@@ -20,6 +20,9 @@ USER = None
 RETRIEVAL_METHOD = 'Assets'
 GET_ALL = False
 ADVANCED = False
+PROFILE_MODE = 'Sample'
+PROFILE_ROWS = 10000
+EXPORT_FORMAT = 'CSV'
 SAVE = True
 VERBOSE = True
 VERBOSITY = 20
@@ -1,8 +1,9 @@
 import streamlit as st
 
-from utils.utils import printDataFrame
+from utils.utils import printDataFrame, getSessionConfig, startJob, showJob, showResult, downloadResult
+from utils.exporter import EXPORT_FORMATS
 from pages.classes.immutablex_class import Assets, Collections, Tokens
-import pages.config.immutablex_config as default
+import pages.config.immutablex_config as config
 
 
 def app():
@@ -10,6 +11,9 @@ def app():
     This is the function that runs when ImmutableX page is activated
     """
 
+    # every browser session works on its own copy of the config
+    default = getSessionConfig(config)
+
     st.title('ImmutableX Scraper')
     st.markdown('This module allows you to pull data from ImmutableX regarding Assets, Collections and Tokens listed '
                 'the Marketplace.')
@@ -26,6 +30,9 @@ def app():
                                                                               'Get Details of Single Asset'))
         if default.QUERY_MODE == 'Get List of Assets':
             st.info('**Get List of Assets** Mode Selected!')
+            default.FOLLOW_PAGINATION = st.checkbox('Follow Cursor to the Last Page?', value=False,
+                                                    help='Requests the next page as soon as the current one '
+                                                         'arrives, until the API returns no more data.')
             default.QUERY_PARAMS = st.multiselect('Select Parameters to Define',
                                                   ('page_size', 'cursor', 'order_by', 'direction', 'user', 'status',
                                                    'name', 'metadata', 'sell_orders', 'buy_orders', 'includes_fee',
@@ -82,6 +89,12 @@ def app():
 
         st.markdown('### App Behaviour')
         default.SAVE = st.checkbox('Save Outputs?', value=True)
+        default.USE_CACHE = st.checkbox('Use Cached Responses?', value=True,
+                                        help='Serves repeated queries from the local response cache. '
+                                             'Untick to fetch everything from the API again.')
+        default.STORE = st.checkbox('Keep Outputs in the Local Data Store?', value=True,
+                                    help='Appends every scrape to a local Parquet store partitioned by '
+                                         'marketplace, endpoint and date for later analysis.')
         default.VERBOSE = st.checkbox('Display Outputs?', value=False)
         if default.VERBOSE:
             default.VERBOSITY = st.number_input('Number of Datapoints to Display?',
@@ -89,6 +102,17 @@ def app():
                                                 max_value=10000,
                                                 value=20)
             default.ADVANCED = st.checkbox('Show Advanced DataFrame Statistics', value=False)
+            if default.ADVANCED:
+                default.PROFILE_MODE = st.selectbox('Profiling Mode', ('Sample', 'Chunked', 'Full'),
+                                                    help='Sample profiles a random sample of the rows, '
+                                                         'Chunked streams summary statistics over every '
+                                                         'row and Full profiles every row, which is slow '
+                                                         'on large extractions.')
+                if default.PROFILE_MODE == 'Sample':
+                    default.PROFILE_ROWS = st.number_input('Number of Rows to Profile',
+                                                           min_value=100,
+                                                           max_value=1000000,
+                                                           value=10000)
 
         st.markdown('## Query Assets')
         # check if required params are inputted
@@ -115,24 +139,11 @@ def app():
                                                 collection=default.COLLECTION,
                                                 updated_min_timestamp=default.UPDATED_MIN_TIMESTAMP,
                                                 updated_max_timestamp=default.UPDATED_MAX_TIMESTAMP)
-                    asset.loadAndSendPayload()
-                    asset.parseAllAssets()
+                    startJob('immutablex_asset', asset, asset.loadAndParse, asset.parseAllAssets,
+                             paginate=default.FOLLOW_PAGINATION,
+                             use_cache=default.USE_CACHE)
                 except Exception as ex:
                     st.error(ex)
-                else:
-                    if default.SAVE:
-                        st.markdown('### Save Data')
-                        st.download_button('Download CSV',
-                                           data=asset.response_frame.to_csv().encode('utf-8'),
-                                           file_name='data.csv',
-                                           mime='text/csv')
-                    if default.VERBOSE:
-                        st.markdown('### Display Data')
-                        printDataFrame(data=asset.response_frame,
-                                       verbose_level=default.VERBOSITY,
-                                       advanced=default.ADVANCED)
-
-                    asset.resetAll()
 
             elif default.QUERY_MODE == 'Get Details of Single Asset':
                 if default.QUERY_MODE == 'Get Details of Single Asset':
@@ -146,24 +157,32 @@ def app():
                             asset.setSingleAssetParameter(token_address=default.TOKEN_ADDRESS,
                                                           token_id=default.TOKEN_ID,
                                                           include_fees=default.INCLUDE_FEES)
-                            asset.loadAndSendPayload()
-                            asset.parseSingleAsset()
+                            startJob('immutablex_asset', asset, asset.loadAndParse, asset.parseSingleAsset,
+                                     use_cache=default.USE_CACHE)
                         except Exception as ex:
                             st.error(ex)
-                        else:
-                            if default.SAVE:
-                                st.markdown('### Save Data')
-                                st.download_button('Download CSV',
-                                                   data=asset.response_frame.to_csv().encode('utf-8'),
-                                                   file_name='data.csv',
-                                                   mime='text/csv')
-                            if default.VERBOSE:
-                                st.markdown('### Display Data')
-                                printDataFrame(data=asset.response_frame,
-                                               verbose_level=default.VERBOSITY,
-                                               advanced=default.ADVANCED)
-
-                            asset.resetAll()
+
+        asset = showJob('immutablex_asset')
+        if asset is not None:
+            if default.STORE:
+                asset.saveToStore()
+            asset.resetAll()
+
+        frame = showResult('immutablex_asset')
+        if frame is not None:
+            if default.SAVE:
+                st.markdown('### Save Data')
+                default.EXPORT_FORMAT = st.selectbox('Export Format', tuple(EXPORT_FORMATS),
+                                                      index=tuple(EXPORT_FORMATS).index(default.EXPORT_FORMAT),
+                                                      key='format_immutablex_asset')
+                downloadResult('immutablex_asset', default.EXPORT_FORMAT)
+            if default.VERBOSE:
+                st.markdown('### Display Data')
+                printDataFrame(data=frame,
+                               verbose_level=default.VERBOSITY,
+                               advanced=default.ADVANCED,
+                               profile_mode=default.PROFILE_MODE,
+                               profile_rows=default.PROFILE_ROWS)
 
     # ------------------------------------------------------------------------------------------------------------ #
     #                                                  Collections                                                 #
@@ -176,6 +195,9 @@ def app():
                                            'Get Collection Filters'))
         if default.QUERY_MODE == 'Get List of Collections':
             st.info('**Get List of Collections** Mode Selected!')
+            default.FOLLOW_PAGINATION = st.checkbox('Follow Cursor to the Last Page?', value=False,
+                                                    help='Requests the next page as soon as the current one '
+                                                         'arrives, until the API returns no more data.')
             default.QUERY_PARAMS = st.multiselect('Select Parameters to Define',
                                                   ('page_size', 'cursor', 'order_by', 'direction', 'blacklist'))
 
@@ -226,6 +248,12 @@ def app():
 
         st.markdown('### App Behaviour')
         default.SAVE = st.checkbox('Save Outputs?', value=True)
+        default.USE_CACHE = st.checkbox('Use Cached Responses?', value=True,
+                                        help='Serves repeated queries from the local response cache. '
+                                             'Untick to fetch everything from the API again.')
+        default.STORE = st.checkbox('Keep Outputs in the Local Data Store?', value=True,
+                                    help='Appends every scrape to a local Parquet store partitioned by '
+                                         'marketplace, endpoint and date for later analysis.')
         default.VERBOSE = st.checkbox('Display Outputs?', value=False)
         if default.VERBOSE:
             default.VERBOSITY = st.number_input('Number of Datapoints to Display?',
@@ -233,6 +261,17 @@ def app():
                                                 max_value=10000,
                                                 value=20)
             default.ADVANCED = st.checkbox('Show Advanced DataFrame Statistics', value=False)
+            if default.ADVANCED:
+                default.PROFILE_MODE = st.selectbox('Profiling Mode', ('Sample', 'Chunked', 'Full'),
+                                                    help='Sample profiles a random sample of the rows, '
+                                                         'Chunked streams summary statistics over every '
+                                                         'row and Full profiles every row, which is slow '
+                                                         'on large extractions.')
+                if default.PROFILE_MODE == 'Sample':
+                    default.PROFILE_ROWS = st.number_input('Number of Rows to Profile',
+                                                           min_value=100,
+                                                           max_value=1000000,
+                                                           value=10000)
 
         st.markdown('## Collections Query')
         if default.QUERY_MODE == 'Get Details of Single Collection' or default.QUERY_MODE == 'Get Collection Filters':
@@ -249,24 +288,12 @@ def app():
                                                            order_by=default.ORDER_BY,
                                                            direction=default.DIRECTION,
                                                            blacklist=default.BLACKLIST)
-                    collection.loadAndSendPayload()
-                    collection.parseAllCollections()
+                    startJob('immutablex_collection', collection, collection.loadAndParse,
+                             collection.parseAllCollections,
+                             paginate=default.FOLLOW_PAGINATION,
+                             use_cache=default.USE_CACHE)
                 except Exception as ex:
                     st.error(ex)
-                else:
-                    if default.SAVE:
-                        st.markdown('### Save Data')
-                        st.download_button('Download CSV',
-                                           data=collection.response_frame.to_csv().encode('utf-8'),
-                                           file_name='data.csv',
-                                           mime='text/csv')
-                    if default.VERBOSE:
-                        st.markdown('### Display Data')
-                        printDataFrame(data=collection.response_frame,
-                                       verbose_level=default.VERBOSITY,
-                                       advanced=default.ADVANCED)
-
-                    collection.resetAll()
 
             elif default.QUERY_MODE == 'Get Details of Single Collection':
                 if not default.ASSERT_INPUTS:
@@ -275,24 +302,11 @@ def app():
                     try:
                         collection = Collections()
                         collection.setSingleCollectionParameters(address=default.ADDRESS)
-                        collection.loadAndSendPayload()
-                        collection.parseSingleCollection()
+                        startJob('immutablex_collection', collection, collection.loadAndParse,
+                                 collection.parseSingleCollection,
+                                 use_cache=default.USE_CACHE)
                     except Exception as ex:
                         st.error(ex)
-                    else:
-                        if default.SAVE:
-                            st.markdown('### Save Data')
-                            st.download_button('Download CSV',
-                                               data=collection.response_frame.to_csv().encode('utf-8'),
-                                               file_name='data.csv',
-                                               mime='text/csv')
-                        if default.VERBOSE:
-                            st.markdown('### Display Data')
-                            printDataFrame(data=collection.response_frame,
-                                           verbose_level=default.VERBOSITY,
-                                           advanced=default.ADVANCED)
-
-                        collection.resetAll()
 
             elif default.QUERY_MODE == 'Get Collection Filters':
                 if not default.ASSERT_INPUTS:
@@ -303,24 +317,33 @@ def app():
                         collection.setCollectionFilter(address=default.ADDRESS,
                                                        page_size=default.PAGE_SIZE,
                                                        next_page_token=default.NEXT_PAGE_TOKEN)
-                        collection.loadAndSendPayload()
-                        collection.parseSingleCollection()
+                        startJob('immutablex_collection', collection, collection.loadAndParse,
+                                 collection.parseSingleCollection,
+                                 use_cache=default.USE_CACHE)
                     except Exception as ex:
                         st.error(ex)
-                    else:
-                        if default.SAVE:
-                            st.markdown('### Save Data')
-                            st.download_button('Download CSV',
-                                               data=collection.response_frame.to_csv().encode('utf-8'),
-                                               file_name='data.csv',
-                                               mime='text/csv')
-                        if default.VERBOSE:
-                            st.markdown('### Display Data')
-                            printDataFrame(data=collection.response_frame,
-                                           verbose_level=default.VERBOSITY,
-                                           advanced=default.ADVANCED)
-
-                        collection.resetAll()
+
+        collection = showJob('immutablex_collection')
+        if collection is not None:
+            if default.STORE:
+                collection.saveToStore()
+            collection.resetAll()
+
+        frame = showResult('immutablex_collection')
+        if frame is not None:
+            if default.SAVE:
+                st.markdown('### Save Data')
+                default.EXPORT_FORMAT = st.selectbox('Export Format', tuple(EXPORT_FORMATS),
+                                                      index=tuple(EXPORT_FORMATS).index(default.EXPORT_FORMAT),
+                                                      key='format_immutablex_collection')
+                downloadResult('immutablex_collection', default.EXPORT_FORMAT)
+            if default.VERBOSE:
+                st.markdown('### Display Data')
+                printDataFrame(data=frame,
+                               verbose_level=default.VERBOSITY,
+                               advanced=default.ADVANCED,
+                               profile_mode=default.PROFILE_MODE,
+                               profile_rows=default.PROFILE_ROWS)
 
     # ------------------------------------------------------------------------------------------------------------ #
     #                                                     Tokens                                                   #
@@ -333,6 +356,9 @@ def app():
 
         if default.QUERY_MODE == 'Get List of Tokens':
             st.info('**Get List of Tokens** Mode Selected!')
+            default.FOLLOW_PAGINATION = st.checkbox('Follow Cursor to the Last Page?', value=False,
+                                                    help='Requests the next page as soon as the current one '
+                                                         'arrives, until the API returns no more data.')
             default.QUERY_PARAMS = st.multiselect('Select Parameters to Define',
                                                   ('page_size', 'next_page_token'))
 
@@ -355,6 +381,12 @@ def app():
 
         st.markdown('### App Behaviour')
         default.SAVE = st.checkbox('Save Outputs?', value=True)
+        default.USE_CACHE = st.checkbox('Use Cached Responses?', value=True,
+                                        help='Serves repeated queries from the local response cache. '
+                                             'Untick to fetch everything from the API again.')
+        default.STORE = st.checkbox('Keep Outputs in the Local Data Store?', value=True,
+                                    help='Appends every scrape to a local Parquet store partitioned by '
+                                         'marketplace, endpoint and date for later analysis.')
         default.VERBOSE = st.checkbox('Display Outputs?', value=False)
         if default.VERBOSE:
             default.VERBOSITY = st.number_input('Number of Datapoints to Display?',
@@ -362,6 +394,17 @@ def app():
                                                 max_value=10000,
                                                 value=20)
             default.ADVANCED = st.checkbox('Show Advanced DataFrame Statistics', value=False)
+            if default.ADVANCED:
+                default.PROFILE_MODE = st.selectbox('Profiling Mode', ('Sample', 'Chunked', 'Full'),
+                                                    help='Sample profiles a random sample of the rows, '
+                                                         'Chunked streams summary statistics over every '
+                                                         'row and Full profiles every row, which is slow '
+                                                         'on large extractions.')
+                if default.PROFILE_MODE == 'Sample':
+                    default.PROFILE_ROWS = st.number_input('Number of Rows to Profile',
+                                                           min_value=100,
+                                                           max_value=1000000,
+                                                           value=10000)
 
         st.markdown('## Token Query')
         if default.QUERY_MODE == 'Get Details of Single Token':
@@ -375,24 +418,11 @@ def app():
                     token = Tokens()
                     token.setTokenListParameters(address=default.ADDRESS,
                                                  symbol=default.SYMBOL)
-                    token.loadAndSendPayload()
-                    token.parseAllTokens()
+                    startJob('immutablex_token', token, token.loadAndParse, token.parseAllTokens,
+                             paginate=default.FOLLOW_PAGINATION,
+                             use_cache=default.USE_CACHE)
                 except Exception as ex:
                     st.error(ex)
-                else:
-                    if default.SAVE:
-                        st.markdown('### Save Data')
-                        st.download_button('Download CSV',
-                                           data=token.response_frame.to_csv().encode('utf-8'),
-                                           file_name='data.csv',
-                                           mime='text/csv')
-                    if default.VERBOSE:
-                        st.markdown('### Display Data')
-                        printDataFrame(data=token.response_frame,
-                                       verbose_level=default.VERBOSITY,
-                                       advanced=default.ADVANCED)
-
-                    token.resetAll()
 
             elif default.QUERY_MODE == 'Get Details of Single Token':
                 if not default.ASSERT_INPUTS:
@@ -401,19 +431,29 @@ def app():
                     try:
                         token = Tokens()
                         token.setSingleTokenParameters(address=default.ADDRESS)
-                        token.loadAndSendPayload()
-                        token.parseSingleToken()
+                        startJob('immutablex_token', token, token.loadAndParse, token.parseSingleToken,
+                                 use_cache=default.USE_CACHE)
                     except Exception as ex:
                         st.error(ex)
-                    else:
-                        if default.SAVE:
-                            st.markdown('### Save Data')
-                            st.download_button('Download CSV',
-                                               data=token.response_frame.to_csv().encode('utf-8'),
-                                               file_name='data.csv',
-                                               mime='text/csv')
-                        if default.VERBOSE:
-                            st.markdown('### Display Data')
-                            printDataFrame(data=token.response_frame,
-                                           verbose_level=default.VERBOSITY,
-                                           advanced=default.ADVANCED)
+
+        token = showJob('immutablex_token')
+        if token is not None:
+            if default.STORE:
+                token.saveToStore()
+            token.resetAll()
+
+        frame = showResult('immutablex_token')
+        if frame is not None:
+            if default.SAVE:
+                st.markdown('### Save Data')
+                default.EXPORT_FORMAT = st.selectbox('Export Format', tuple(EXPORT_FORMATS),
+                                                      index=tuple(EXPORT_FORMATS).index(default.EXPORT_FORMAT),
+                                                      key='format_immutablex_token')
+                downloadResult('immutablex_token', default.EXPORT_FORMAT)
+            if default.VERBOSE:
+                st.markdown('### Display Data')
+                printDataFrame(data=frame,
+                               verbose_level=default.VERBOSITY,
+                               advanced=default.ADVANCED,
+                               profile_mode=default.PROFILE_MODE,
+                               profile_rows=default.PROFILE_ROWS)
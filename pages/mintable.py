@@ -1,8 +1,9 @@
 import streamlit as st
 import pandas as pd
-import pages.config.mintable_config as default
+import pages.config.mintable_config as config
 
-from utils.utils import printDataFrame
+from utils.utils import printDataFrame, getSessionConfig, startJob, showJob, showResult, downloadResult
+from utils.exporter import EXPORT_FORMATS
 from pages.classes.mintable_class import NFT, Auction
 
 
@@ -11,6 +12,9 @@ def app():
     This is the function that runs when Mintable page is activated
     """
 
+    # every browser session works on its own copy of the config
+    default = getSessionConfig(config)
+
     st.title('Mintable Scraper')
     st.markdown('This app allows you to pull data from Opensea.io regarding the Assets, Events, Collections and '
                 'Bundles listed on Mintable.')
@@ -42,6 +46,9 @@ def app():
                                                min_value=1,
                                                max_value=999999,
                                                value=1)
+            default.FOLLOW_PAGINATION = st.checkbox('Follow Last Key to the Last Page?', value=False,
+                                                    help='Requests the next page as soon as the current one '
+                                                         'arrives, until the API returns no more data.')
             default.NETWORK = st.number_input('Define Network',
                                               min_value=1,
                                               max_value=999999,
@@ -56,6 +63,12 @@ def app():
 
     st.markdown('### App Behaviour')
     default.SAVE = st.checkbox('Save Outputs?', value=True)
+    default.USE_CACHE = st.checkbox('Use Cached Responses?', value=True,
+                                    help='Serves repeated queries from the local response cache. '
+                                         'Untick to fetch everything from the API again.')
+    default.STORE = st.checkbox('Keep Outputs in the Local Data Store?', value=True,
+                                help='Appends every scrape to a local Parquet store partitioned by '
+                                     'marketplace, endpoint and date for later analysis.')
     default.VERBOSE = st.checkbox('Display Outputs?', value=False)
     if default.VERBOSE:
         default.VERBOSITY = st.number_input('Number of Datapoints to Display?',
@@ -63,6 +76,17 @@ def app():
                                             max_value=10000,
                                             value=20)
         default.ADVANCED = st.checkbox('Show Advanced DataFrame Statistics', value=False)
+        if default.ADVANCED:
+            default.PROFILE_MODE = st.selectbox('Profiling Mode', ('Sample', 'Chunked', 'Full'),
+                                                help='Sample profiles a random sample of the rows, '
+                                                     'Chunked streams summary statistics over every '
+                                                     'row and Full profiles every row, which is slow '
+                                                     'on large extractions.')
+            if default.PROFILE_MODE == 'Sample':
+                default.PROFILE_ROWS = st.number_input('Number of Rows to Profile',
+                                                       min_value=100,
+                                                       max_value=1000000,
+                                                       value=10000)
 
     st.markdown('## Data Retrieval\n'
                 'Ensure that the parameters you wish to pass into the class is loaded successfully.')
@@ -73,24 +97,10 @@ def app():
                 try:
                     nft = NFT()
                     nft.setGaslessNFTParameters(user_address=default.USER_ADDRESS)
-                    nft.loadAndSendPayload()
-                    nft.parseSingleNFT()
+                    startJob('mintable_nft', nft, nft.loadAndParse, nft.parseSingleNFT,
+                             use_cache=default.USE_CACHE)
                 except Exception as ex:
                     st.error(ex)
-                else:
-                    if default.SAVE:
-                        st.markdown('### Save Data')
-                        st.download_button('Download CSV',
-                                           data=nft.response_frame.to_csv().encode('utf-8'),
-                                           file_name='data.csv',
-                                           mime='text/csv')
-                    if default.VERBOSE:
-                        st.markdown('### Display Data')
-                        printDataFrame(data=nft.response_frame,
-                                       verbose_level=default.VERBOSITY,
-                                       advanced=default.ADVANCED)
-
-                    nft.resetAll()
 
             elif default.DATA_MODE == 'Query All NFTs':
                 try:
@@ -102,92 +112,81 @@ def app():
                                            size=default.SIZE,
                                            lastkey=default.LAST_KEY,
                                            network=default.NETWORK)
-                    nft.loadAndSendPayload()
-                    nft.parseAllNFTs()
+                    startJob('mintable_nft', nft, nft.loadAndParse, nft.parseAllNFTs,
+                             paginate=default.FOLLOW_PAGINATION,
+                             use_cache=default.USE_CACHE)
                 except Exception as ex:
                     st.error(ex)
-                else:
-                    if default.SAVE:
-                        st.markdown('### Save Data')
-                        st.download_button('Download CSV',
-                                           data=nft.response_frame.to_csv().encode('utf-8'),
-                                           file_name='data.csv',
-                                           mime='text/csv')
-                    if default.VERBOSE:
-                        st.markdown('### Display Data')
-                        printDataFrame(data=nft.response_frame,
-                                       verbose_level=default.VERBOSITY,
-                                       advanced=default.ADVANCED)
-
-                    nft.resetAll()
 
             elif default.DATA_MODE == 'Query Single NFT':
                 try:
                     nft = NFT()
                     nft.setSingleNFTParameter(id=default.ID,
                                               api_key=default.API_KEY)
-                    nft.loadAndSendPayload()
-                    nft.parseSingleNFT()
+                    startJob('mintable_nft', nft, nft.loadAndParse, nft.parseSingleNFT,
+                             use_cache=default.USE_CACHE)
                 except Exception as ex:
                     st.error(ex)
-                else:
-                    if default.SAVE:
-                        st.markdown('### Save Data')
-                        st.download_button('Download CSV',
-                                           data=nft.response_frame.to_csv().encode('utf-8'),
-                                           file_name='data.csv',
-                                           mime='text/csv')
-                    if default.VERBOSE:
-                        st.markdown('### Display Data')
-                        printDataFrame(data=nft.response_frame,
-                                       verbose_level=default.VERBOSITY,
-                                       advanced=default.ADVANCED)
-
-                    nft.resetAll()
 
         elif default.DATA_MODE == 'Auction':
             if default.DATA_MODE == 'Ending Soon Auctions':
                 try:
                     auction = Auction()
                     auction.setEndingSoonAuctions()
-                    auction.loadAndSendPayload()
-                    auction.parseEndingSoonAndHotAuctions()
+                    startJob('mintable_auction', auction, auction.loadAndParse, auction.parseEndingSoonAndHotAuctions,
+                             use_cache=default.USE_CACHE)
                 except Exception as ex:
                     st.error(ex)
-                else:
-                    if default.SAVE:
-                        st.markdown('### Save Data')
-                        st.download_button('Download CSV',
-                                           data=auction.response_frame.to_csv().encode('utf-8'),
-                                           file_name='data.csv',
-                                           mime='text/csv')
-                    if default.VERBOSE:
-                        st.markdown('### Display Data')
-                        printDataFrame(data=auction.response_frame,
-                                       verbose_level=default.VERBOSITY,
-                                       advanced=default.ADVANCED)
-
-                    auction.resetAll()
 
             elif default.DATA_MODE == 'Hot Auctions':
                 try:
                     auction = Auction()
                     auction.setHotAuctions()
-                    auction.loadAndSendPayload()
-                    auction.parseEndingSoonAndHotAuctions()
+                    startJob('mintable_auction', auction, auction.loadAndParse, auction.parseEndingSoonAndHotAuctions,
+                             use_cache=default.USE_CACHE)
                 except Exception as ex:
                     st.error(ex)
-                else:
-                    if default.SAVE:
-                        st.markdown('### Save Data')
-                        st.download_button('Download CSV',
-                                           data=auction.response_frame.to_csv().encode('utf-8'),
-                                           file_name='data.csv',
-                                           mime='text/csv')
-                    if default.VERBOSE:
-                        st.markdown('### Display Data')
-                        printDataFrame(data=auction.response_frame,
-                                       verbose_level=default.VERBOSITY,
-                                       advanced=default.ADVANCED)
-
-                    auction.resetAll()
+
+    nft = showJob('mintable_nft')
+    if nft is not None:
+        if default.STORE:
+            nft.saveToStore()
+        nft.resetAll()
+
+    frame = showResult('mintable_nft')
+    if frame is not None:
+        if default.SAVE:
+            st.markdown('### Save Data')
+            default.EXPORT_FORMAT = st.selectbox('Export Format', tuple(EXPORT_FORMATS),
+                                                  index=tuple(EXPORT_FORMATS).index(default.EXPORT_FORMAT),
+                                                  key='format_mintable_nft')
+            downloadResult('mintable_nft', default.EXPORT_FORMAT)
+        if default.VERBOSE:
+            st.markdown('### Display Data')
+            printDataFrame(data=frame,
+                           verbose_level=default.VERBOSITY,
+                           advanced=default.ADVANCED,
+                           profile_mode=default.PROFILE_MODE,
+                           profile_rows=default.PROFILE_ROWS)
+
+    auction = showJob('mintable_auction')
+    if auction is not None:
+        if default.STORE:
+            auction.saveToStore()
+        auction.resetAll()
+
+    frame = showResult('mintable_auction')
+    if frame is not None:
+        if default.SAVE:
+            st.markdown('### Save Data')
+            default.EXPORT_FORMAT = st.selectbox('Export Format', tuple(EXPORT_FORMATS),
+                                                  index=tuple(EXPORT_FORMATS).index(default.EXPORT_FORMAT),
+                                                  key='format_mintable_auction')
+            downloadResult('mintable_auction', default.EXPORT_FORMAT)
+        if default.VERBOSE:
+            st.markdown('### Display Data')
+            printDataFrame(data=frame,
+                           verbose_level=default.VERBOSITY,
+                           advanced=default.ADVANCED,
+                           profile_mode=default.PROFILE_MODE,
+                           profile_rows=default.PROFILE_ROWS)
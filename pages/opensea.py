@@ -1,8 +1,10 @@
 import streamlit as st
 import pandas as pd
-import pages.config.opensea_config as default
+import pages.config.opensea_config as config
 
-from utils.utils import printDataFrame
+from utils.utils import printDataFrame, getSessionConfig, startJob, showJob, showResult, downloadResult, \
+    showRarity, showSalesSeries
+from utils.exporter import EXPORT_FORMATS
 from pages.classes.opensea_class import Assets, Events, Collections, Bundles
 
 
@@ -11,6 +13,9 @@ def app():
     This is the function that runs when Opensea page is activated
     """
 
+    # every browser session works on its own copy of the config
+    default = getSessionConfig(config)
+
     st.title('Opensea Scraper')
     st.markdown('This app allows you to pull data from Opensea.io regarding the Assets, Events, Collections and '
                 'Bundles listed on Opensea.io\'s ')
@@ -79,6 +84,12 @@ def app():
 
         st.markdown('### App Behaviour')
         default.SAVE = st.checkbox('Save Outputs?', value=True)
+        default.USE_CACHE = st.checkbox('Use Cached Responses?', value=True,
+                                        help='Serves repeated queries from the local response cache. '
+                                             'Untick to fetch everything from the API again.')
+        default.STORE = st.checkbox('Keep Outputs in the Local Data Store?', value=True,
+                                    help='Appends every scrape to a local Parquet store partitioned by '
+                                         'marketplace, endpoint and date for later analysis.')
         if default.SAVE:
             # allow user to do a multiselect
             default.SAVED_OUTPUTS_ACTUAL = st.multiselect('Select the data fields to output',
@@ -93,6 +104,21 @@ def app():
                                                 max_value=10000,
                                                 value=20)
             default.ADVANCED = st.checkbox('Show Advanced DataFrame Statistics', value=False)
+            if default.ADVANCED:
+                default.PROFILE_MODE = st.selectbox('Profiling Mode', ('Sample', 'Chunked', 'Full'),
+                                                    help='Sample profiles a random sample of the rows, '
+                                                         'Chunked streams summary statistics over every '
+                                                         'row and Full profiles every row, which is slow '
+                                                         'on large extractions.')
+                if default.PROFILE_MODE == 'Sample':
+                    default.PROFILE_ROWS = st.number_input('Number of Rows to Profile',
+                                                           min_value=100,
+                                                           max_value=1000000,
+                                                           value=10000)
+
+        default.RARITY = st.checkbox('Rank Tokens by Trait Rarity?', value=False,
+                                     help='Scores every token of the extraction by the rarity of its traits; '
+                                          'extract one collection at a time for meaningful ranks.')
 
         # begin the extraction process here
         st.markdown('## Asset Retrieval\n'
@@ -111,20 +137,21 @@ def app():
                     default.LIMIT = 50
                     asset = Assets()
 
-                    # this loads up all the urls
-                    for i in range(200):
-                        asset.setAssetParameters(owner=default.OWNER,
-                                                 token_ids=default.TOKEN_IDS,
-                                                 asset_contract_addresses=default.ASSET_CONTRACT_ADDRESSES,
-                                                 order_by=default.ORDER_BY,
-                                                 order_direction=default.ORDER_DIRECTION,
-                                                 offset=default.OFFSET,
-                                                 limit=default.LIMIT,
-                                                 collection=default.COLLECTION,
-                                                 api_key=default.API_KEY)
-                        default.OFFSET += default.LIMIT
-                    asset.loadAndSendPayload()
-                    asset.parseResponse()
+                    # follow the offsets from the first page until the API runs out of data
+                    asset.setAssetParameters(owner=default.OWNER,
+                                             token_ids=default.TOKEN_IDS,
+                                             asset_contract_addresses=default.ASSET_CONTRACT_ADDRESSES,
+                                             order_by=default.ORDER_BY,
+                                             order_direction=default.ORDER_DIRECTION,
+                                             offset=default.OFFSET,
+                                             limit=default.LIMIT,
+                                             collection=default.COLLECTION,
+                                             api_key=default.API_KEY)
+                    startJob('opensea_asset', asset, asset.loadAndBuild,
+                             columns=default.SAVED_OUTPUTS_ACTUAL,
+                             paginate=True,
+                             spill_rows=default.SPILL_ROWS,
+                             use_cache=default.USE_CACHE)
                 else:
                     asset = Assets()
                     asset.setAssetParameters(owner=default.OWNER,
@@ -136,27 +163,37 @@ def app():
                                              limit=default.LIMIT,
                                              collection=default.COLLECTION,
                                              api_key=default.API_KEY)
-                    asset.loadAndSendPayload()
-                    asset.parseResponse()
+                    startJob('opensea_asset', asset, asset.loadAndBuild,
+                             columns=default.SAVED_OUTPUTS_ACTUAL,
+                             spill_rows=default.SPILL_ROWS,
+                             use_cache=default.USE_CACHE)
             except Exception as ex:
                 raise ex
-            else:
-                # modify the dataframe according to user input
-                asset.response_frame = asset.response_frame[default.SAVED_OUTPUTS_ACTUAL]
-
-                if default.SAVE:
-                    st.markdown('### Save Data')
-                    st.download_button('Download CSV',
-                                       data=asset.response_frame.to_csv().encode('utf-8'),
-                                       file_name='data.csv',
-                                       mime='text/csv')
-                if default.VERBOSE:
-                    st.markdown('### Display Data')
-                    printDataFrame(data=asset.response_frame,
-                                   verbose_level=default.VERBOSITY,
-                                   advanced=default.ADVANCED)
-
-                asset.resetAll()
+
+        asset = showJob('opensea_asset')
+        if asset is not None:
+            if default.STORE:
+                asset.saveToStore()
+            asset.resetAll()
+
+        frame = showResult('opensea_asset', default.SAVED_OUTPUTS_ACTUAL)
+        if frame is not None:
+            if default.SAVE:
+                st.markdown('### Save Data')
+                default.EXPORT_FORMAT = st.selectbox('Export Format', tuple(EXPORT_FORMATS),
+                                                      index=tuple(EXPORT_FORMATS).index(default.EXPORT_FORMAT),
+                                                      key='format_opensea_asset')
+                downloadResult('opensea_asset', default.EXPORT_FORMAT, default.SAVED_OUTPUTS_ACTUAL)
+            if default.VERBOSE:
+                st.markdown('### Display Data')
+                printDataFrame(data=frame,
+                               verbose_level=default.VERBOSITY,
+                               advanced=default.ADVANCED,
+                               profile_mode=default.PROFILE_MODE,
+                               profile_rows=default.PROFILE_ROWS)
+            if default.RARITY:
+                st.markdown('### Trait Rarity')
+                showRarity('opensea_asset', verbose_level=default.VERBOSITY)
 
     # ------------------------------------------------------------------------------------------------------------ #
     #                                                   Events                                                     #
@@ -168,6 +205,26 @@ def app():
                    'Cloudflare.')
         st.markdown('## Flags\n'
                     '### Scraper Behaviour')
+        default.INCREMENTAL = st.checkbox('Only Fetch Events Since the Last Sync?', value=False,
+                                          help='Keeps every event fetched for this query in a local store and only '
+                                               'requests the events which occurred after the newest stored event.')
+        default.SALES_SERIES = st.checkbox('Show Sales and Floor Time Series?', value=False,
+                                           help='Aggregates the sales of the extraction into OHLC, volume and floor '
+                                                'series per collection, priced in ETH or USD; the series are kept on '
+                                                'disk and only new events are added on every refresh.')
+        if default.SALES_SERIES:
+            default.SERIES_FREQ = st.selectbox('Time Bucket', ('1H', '4H', '1D', '7D'), index=2)
+            default.SERIES_CURRENCY = st.selectbox('Currency', ('eth', 'usd'))
+        default.TIME_SLICED = st.checkbox('Split the Query into Time Windows?', value=False,
+                                          help='Splits the occurred after/before window of the query into time '
+                                               'windows fetched in parallel, each under the API\'s cap of 10000 '
+                                               'events per query; windows which come back full are split again, so '
+                                               'that complete event histories can be scraped.')
+        if default.TIME_SLICED:
+            default.SHARDS = st.number_input('Number of Time Windows to Start With',
+                                             min_value=1,
+                                             max_value=64,
+                                             value=8)
         default.GET_ALL = st.checkbox('Scrape Maximum API Returns?', value=True)
         if not default.GET_ALL:
             default.QUERY_PARAMS = st.multiselect('Select Additional Parameters to Define',
@@ -225,6 +282,12 @@ def app():
 
         st.markdown('### App Behaviour')
         default.SAVE = st.checkbox('Save Outputs?', value=True)
+        default.USE_CACHE = st.checkbox('Use Cached Responses?', value=True,
+                                        help='Serves repeated queries from the local response cache. '
+                                             'Untick to fetch everything from the API again.')
+        default.STORE = st.checkbox('Keep Outputs in the Local Data Store?', value=True,
+                                    help='Appends every scrape to a local Parquet store partitioned by '
+                                         'marketplace, endpoint and date for later analysis.')
         if default.SAVE:
             # allow user to do a multiselect
             default.SAVED_OUTPUTS_ACTUAL = st.multiselect('Select the data fields to output',
@@ -237,6 +300,17 @@ def app():
                                                 max_value=10000,
                                                 value=20)
             default.ADVANCED = st.checkbox('Show Advanced DataFrame Statistics', value=False)
+            if default.ADVANCED:
+                default.PROFILE_MODE = st.selectbox('Profiling Mode', ('Sample', 'Chunked', 'Full'),
+                                                    help='Sample profiles a random sample of the rows, '
+                                                         'Chunked streams summary statistics over every '
+                                                         'row and Full profiles every row, which is slow '
+                                                         'on large extractions.')
+                if default.PROFILE_MODE == 'Sample':
+                    default.PROFILE_ROWS = st.number_input('Number of Rows to Profile',
+                                                           min_value=100,
+                                                           max_value=1000000,
+                                                           value=10000)
 
         # begin the extraction process here
         st.markdown('## Events Retrieval\n'
@@ -244,28 +318,73 @@ def app():
 
         if st.button('Proceed with Data Extraction'):
             try:
-                if default.GET_ALL:
+                if default.INCREMENTAL:
+                    default.OFFSET = 0
+                    default.LIMIT = 50
+                    events = Events()
+
+                    # only ask for the events newer than the last sync and merge them into the local store
+                    events.setEventsParameters(asset_contract_address=default.ASSET_CONTRACT_ADDRESS,
+                                               collection_slug=default.COLLECTION_SLUG,
+                                               token_id=default.TOKEN_ID,
+                                               account_address=default.ACCOUNT_ADDRESS,
+                                               event_type=default.EVENT_TYPE,
+                                               only_opensea=default.ONLY_OPENSEA,
+                                               auction_type=default.AUCTION_TYPE,
+                                               offset=default.OFFSET,
+                                               limit=default.LIMIT,
+                                               occurred_before=default.OCCURRED_BEFORE,
+                                               occurred_after=default.OCCURRED_AFTER,
+                                               api_key=default.API_KEY)
+                    startJob('opensea_events', events, events.syncEvents, spill_rows=default.SPILL_ROWS,
+                             shards=default.SHARDS if default.TIME_SLICED else None,
+                             reuse_result=False)
+                elif default.TIME_SLICED:
                     default.OFFSET = 0
                     default.LIMIT = 50
                     events = Events()
 
-                    # this loads up all the urls
-                    for i in range(200):
-                        events.setEventsParameters(asset_contract_address=default.ASSET_CONTRACT_ADDRESS,
-                                                   collection_slug=default.COLLECTION_SLUG,
-                                                   token_id=default.TOKEN_ID,
-                                                   account_address=default.ACCOUNT_ADDRESS,
-                                                   event_type=default.EVENT_TYPE,
-                                                   only_opensea=default.ONLY_OPENSEA,
-                                                   auction_type=default.AUCTION_TYPE,
-                                                   offset=default.OFFSET,
-                                                   limit=default.LIMIT,
-                                                   occurred_before=default.OCCURRED_BEFORE,
-                                                   occurred_after=default.OCCURRED_AFTER,
-                                                   api_key=default.API_KEY)
-                        default.OFFSET += default.LIMIT
-                    events.loadAndSendPayload()
-                    events.parseResponse()
+                    # page every time window of the query in parallel, each under the offset cap
+                    events.setEventsParameters(asset_contract_address=default.ASSET_CONTRACT_ADDRESS,
+                                               collection_slug=default.COLLECTION_SLUG,
+                                               token_id=default.TOKEN_ID,
+                                               account_address=default.ACCOUNT_ADDRESS,
+                                               event_type=default.EVENT_TYPE,
+                                               only_opensea=default.ONLY_OPENSEA,
+                                               auction_type=default.AUCTION_TYPE,
+                                               offset=default.OFFSET,
+                                               limit=default.LIMIT,
+                                               occurred_before=default.OCCURRED_BEFORE,
+                                               occurred_after=default.OCCURRED_AFTER,
+                                               api_key=default.API_KEY)
+                    startJob('opensea_events', events, events.loadAndSlice,
+                             columns=default.SAVED_OUTPUTS_ACTUAL,
+                             shards=default.SHARDS,
+                             spill_rows=default.SPILL_ROWS,
+                             use_cache=default.USE_CACHE)
+                elif default.GET_ALL:
+                    default.OFFSET = 0
+                    default.LIMIT = 50
+                    events = Events()
+
+                    # follow the offsets from the first page until the API runs out of data
+                    events.setEventsParameters(asset_contract_address=default.ASSET_CONTRACT_ADDRESS,
+                                               collection_slug=default.COLLECTION_SLUG,
+                                               token_id=default.TOKEN_ID,
+                                               account_address=default.ACCOUNT_ADDRESS,
+                                               event_type=default.EVENT_TYPE,
+                                               only_opensea=default.ONLY_OPENSEA,
+                                               auction_type=default.AUCTION_TYPE,
+                                               offset=default.OFFSET,
+                                               limit=default.LIMIT,
+                                               occurred_before=default.OCCURRED_BEFORE,
+                                               occurred_after=default.OCCURRED_AFTER,
+                                               api_key=default.API_KEY)
+                    startJob('opensea_events', events, events.loadAndBuild,
+                             columns=default.SAVED_OUTPUTS_ACTUAL,
+                             paginate=True,
+                             spill_rows=default.SPILL_ROWS,
+                             use_cache=default.USE_CACHE)
                 else:
                     events = Events()
                     events.setEventsParameters(asset_contract_address=default.ASSET_CONTRACT_ADDRESS,
@@ -280,27 +399,47 @@ def app():
                                                occurred_before=default.OCCURRED_BEFORE,
                                                occurred_after=default.OCCURRED_AFTER,
                                                api_key=default.API_KEY)
-                    events.loadAndSendPayload()
-                    events.parseResponse()
+                    startJob('opensea_events', events, events.loadAndBuild,
+                             columns=default.SAVED_OUTPUTS_ACTUAL,
+                             spill_rows=default.SPILL_ROWS,
+                             use_cache=default.USE_CACHE)
             except Exception as ex:
                 raise ex
-            else:
-                # modify the dataframe according to user input
-                events.response_frame = events.response_frame[default.SAVED_OUTPUTS_ACTUAL]
-
-                if default.SAVE:
-                    st.markdown('### Save Data')
-                    st.download_button('Download CSV',
-                                       data=events.response_frame.to_csv().encode('utf-8'),
-                                       file_name='data.csv',
-                                       mime='text/csv')
-                if default.VERBOSE:
-                    st.markdown('### Display Data')
-                    printDataFrame(data=events.response_frame,
-                                   verbose_level=default.VERBOSITY,
-                                   advanced=default.ADVANCED)
-
-                events.resetAll()
+
+        events = showJob('opensea_events')
+        if events is not None:
+            if default.INCREMENTAL:
+                st.info(f'Fetched {events.new_events} events since the last sync, '
+                        f'{len(events.response_frame)} events stored in total.')
+                if events.failed_pages:
+                    st.warning(f'{len(events.failed_pages)} pages could not be fetched, so the next sync asks for the '
+                               f'same window again.')
+            if events.truncated_windows:
+                st.warning(f'{len(events.truncated_windows)} seconds held more than 10000 events each, so only the '
+                           f'newest 10000 events of each of these seconds were fetched.')
+
+            if default.STORE:
+                events.saveToStore()
+            events.resetAll()
+
+        frame = showResult('opensea_events', default.SAVED_OUTPUTS_ACTUAL)
+        if frame is not None:
+            if default.SAVE:
+                st.markdown('### Save Data')
+                default.EXPORT_FORMAT = st.selectbox('Export Format', tuple(EXPORT_FORMATS),
+                                                      index=tuple(EXPORT_FORMATS).index(default.EXPORT_FORMAT),
+                                                      key='format_opensea_events')
+                downloadResult('opensea_events', default.EXPORT_FORMAT, default.SAVED_OUTPUTS_ACTUAL)
+            if default.VERBOSE:
+                st.markdown('### Display Data')
+                printDataFrame(data=frame,
+                               verbose_level=default.VERBOSITY,
+                               advanced=default.ADVANCED,
+                               profile_mode=default.PROFILE_MODE,
+                               profile_rows=default.PROFILE_ROWS)
+            if default.SALES_SERIES:
+                st.markdown('### Sales and Floor Time Series')
+                showSalesSeries('opensea_events', freq=default.SERIES_FREQ, currency=default.SERIES_CURRENCY)
 
     # ------------------------------------------------------------------------------------------------------------ #
     #                                                Collections                                                   #
@@ -331,6 +470,12 @@ def app():
 
         st.markdown('### App Behaviour')
         default.SAVE = st.checkbox('Save Outputs?', value=True)
+        default.USE_CACHE = st.checkbox('Use Cached Responses?', value=True,
+                                        help='Serves repeated queries from the local response cache. '
+                                             'Untick to fetch everything from the API again.')
+        default.STORE = st.checkbox('Keep Outputs in the Local Data Store?', value=True,
+                                    help='Appends every scrape to a local Parquet store partitioned by '
+                                         'marketplace, endpoint and date for later analysis.')
         if default.SAVE:
             # allow user to do a multiselect
             default.SAVED_OUTPUTS_ACTUAL = st.multiselect('Select the data fields to output',
@@ -343,6 +488,17 @@ def app():
                                                 max_value=10000,
                                                 value=20)
             default.ADVANCED = st.checkbox('Show Advanced DataFrame Statistics', value=False)
+            if default.ADVANCED:
+                default.PROFILE_MODE = st.selectbox('Profiling Mode', ('Sample', 'Chunked', 'Full'),
+                                                    help='Sample profiles a random sample of the rows, '
+                                                         'Chunked streams summary statistics over every '
+                                                         'row and Full profiles every row, which is slow '
+                                                         'on large extractions.')
+                if default.PROFILE_MODE == 'Sample':
+                    default.PROFILE_ROWS = st.number_input('Number of Rows to Profile',
+                                                           min_value=100,
+                                                           max_value=1000000,
+                                                           value=10000)
 
         # begin the extraction process here
         st.markdown('## Collections Retrieval\n'
@@ -355,42 +511,50 @@ def app():
                     default.LIMIT = 50
                     collections = Collections()
 
-                    # this loads up all the urls
-                    for i in range(200):
-                        collections.setCollectionsParameters(asset_owner=default.ASSET_OWNER,
-                                                             offset=default.OFFSET,
-                                                             limit=default.LIMIT,
-                                                             api_key=default.API_KEY)
-                        default.OFFSET += default.LIMIT
-                    collections.loadAndSendPayload()
-                    collections.parseResponse()
+                    # follow the offsets from the first page until the API runs out of data
+                    collections.setCollectionsParameters(asset_owner=default.ASSET_OWNER,
+                                                         offset=default.OFFSET,
+                                                         limit=default.LIMIT,
+                                                         api_key=default.API_KEY)
+                    startJob('opensea_collections', collections, collections.loadAndBuild,
+                             columns=default.SAVED_OUTPUTS_ACTUAL,
+                             paginate=True,
+                             spill_rows=default.SPILL_ROWS,
+                             use_cache=default.USE_CACHE)
                 else:
                     collections = Collections()
                     collections.setCollectionsParameters(asset_owner=default.ASSET_OWNER,
                                                          offset=default.OFFSET,
                                                          limit=default.LIMIT,
                                                          api_key=default.API_KEY)
-                    collections.loadAndSendPayload()
-                    collections.parseResponse()
+                    startJob('opensea_collections', collections, collections.loadAndBuild,
+                             columns=default.SAVED_OUTPUTS_ACTUAL,
+                             spill_rows=default.SPILL_ROWS,
+                             use_cache=default.USE_CACHE)
             except Exception as ex:
                 raise ex
-            else:
-                # modify the dataframe according to user input
-                collections.response_frame = collections.response_frame[default.SAVED_OUTPUTS_ACTUAL]
-
-                if default.SAVE:
-                    st.markdown('### Save Data')
-                    st.download_button('Download CSV',
-                                       data=collections.response_frame.to_csv().encode('utf-8'),
-                                       file_name='data.csv',
-                                       mime='text/csv')
-                if default.VERBOSE:
-                    st.markdown('### Display Data')
-                    printDataFrame(data=collections.response_frame,
-                                   verbose_level=default.VERBOSITY,
-                                   advanced=default.ADVANCED)
-
-                collections.resetAll()
+
+        collections = showJob('opensea_collections')
+        if collections is not None:
+            if default.STORE:
+                collections.saveToStore()
+            collections.resetAll()
+
+        frame = showResult('opensea_collections', default.SAVED_OUTPUTS_ACTUAL)
+        if frame is not None:
+            if default.SAVE:
+                st.markdown('### Save Data')
+                default.EXPORT_FORMAT = st.selectbox('Export Format', tuple(EXPORT_FORMATS),
+                                                      index=tuple(EXPORT_FORMATS).index(default.EXPORT_FORMAT),
+                                                      key='format_opensea_collections')
+                downloadResult('opensea_collections', default.EXPORT_FORMAT, default.SAVED_OUTPUTS_ACTUAL)
+            if default.VERBOSE:
+                st.markdown('### Display Data')
+                printDataFrame(data=frame,
+                               verbose_level=default.VERBOSITY,
+                               advanced=default.ADVANCED,
+                               profile_mode=default.PROFILE_MODE,
+                               profile_rows=default.PROFILE_ROWS)
 
     # ------------------------------------------------------------------------------------------------------------ #
     #                                                  Bundles                                                     #
@@ -448,6 +612,12 @@ def app():
 
         st.markdown('### App Behaviour')
         default.SAVE = st.checkbox('Save Outputs?', value=True)
+        default.USE_CACHE = st.checkbox('Use Cached Responses?', value=True,
+                                        help='Serves repeated queries from the local response cache. '
+                                             'Untick to fetch everything from the API again.')
+        default.STORE = st.checkbox('Keep Outputs in the Local Data Store?', value=True,
+                                    help='Appends every scrape to a local Parquet store partitioned by '
+                                         'marketplace, endpoint and date for later analysis.')
         if default.SAVE:
             # allow user to do a multiselect
             default.SAVED_OUTPUTS_ACTUAL = st.multiselect('Select the data fields to output',
@@ -460,6 +630,17 @@ def app():
                                                 max_value=10000,
                                                 value=20)
             default.ADVANCED = st.checkbox('Show Advanced DataFrame Statistics', value=False)
+            if default.ADVANCED:
+                default.PROFILE_MODE = st.selectbox('Profiling Mode', ('Sample', 'Chunked', 'Full'),
+                                                    help='Sample profiles a random sample of the rows, '
+                                                         'Chunked streams summary statistics over every '
+                                                         'row and Full profiles every row, which is slow '
+                                                         'on large extractions.')
+                if default.PROFILE_MODE == 'Sample':
+                    default.PROFILE_ROWS = st.number_input('Number of Rows to Profile',
+                                                           min_value=100,
+                                                           max_value=1000000,
+                                                           value=10000)
 
         # begin the extraction process here
         st.markdown('## Bundles Retrieval\n'
@@ -478,19 +659,20 @@ def app():
                     default.LIMIT = 50
                     bundles = Bundles()
 
-                    # this loads up all the urls
-                    for i in range(200):
-                        bundles.setBundlesParameter(on_sale=default.ON_SALE,
-                                                    owner=default.OWNER,
-                                                    asset_contract_address=default.ASSET_CONTRACT_ADDRESS,
-                                                    asset_contract_addresses=default.ASSET_CONTRACT_ADDRESSES,
-                                                    token_ids=default.TOKEN_IDS,
-                                                    offset=default.OFFSET,
-                                                    limit=default.LIMIT,
-                                                    api_key=default.API_KEY)
-                        default.OFFSET += default.LIMIT
-                    bundles.loadAndSendPayload()
-                    bundles.parseResponse()
+                    # follow the offsets from the first page until the API runs out of data
+                    bundles.setBundlesParameter(on_sale=default.ON_SALE,
+                                                owner=default.OWNER,
+                                                asset_contract_address=default.ASSET_CONTRACT_ADDRESS,
+                                                asset_contract_addresses=default.ASSET_CONTRACT_ADDRESSES,
+                                                token_ids=default.TOKEN_IDS,
+                                                offset=default.OFFSET,
+                                                limit=default.LIMIT,
+                                                api_key=default.API_KEY)
+                    startJob('opensea_bundles', bundles, bundles.loadAndBuild,
+                             columns=default.SAVED_OUTPUTS_ACTUAL,
+                             paginate=True,
+                             spill_rows=default.SPILL_ROWS,
+                             use_cache=default.USE_CACHE)
                 else:
                     bundles = Bundles()
                     bundles.setBundlesParameter(on_sale=default.ON_SALE,
@@ -501,24 +683,31 @@ def app():
                                                 offset=default.OFFSET,
                                                 limit=default.LIMIT,
                                                 api_key=default.API_KEY)
-                    bundles.loadAndSendPayload()
-                    bundles.parseResponse()
+                    startJob('opensea_bundles', bundles, bundles.loadAndBuild,
+                             columns=default.SAVED_OUTPUTS_ACTUAL,
+                             spill_rows=default.SPILL_ROWS,
+                             use_cache=default.USE_CACHE)
             except Exception as ex:
                 raise ex
-            else:
-                # modify the dataframe according to user input
-                bundles.response_frame = bundles.response_frame[default.SAVED_OUTPUTS_ACTUAL]
-
-                if default.SAVE:
-                    st.markdown('### Save Data')
-                    st.download_button('Download CSV',
-                                       data=bundles.response_frame.to_csv().encode('utf-8'),
-                                       file_name='data.csv',
-                                       mime='text/csv')
-                if default.VERBOSE:
-                    st.markdown('### Display Data')
-                    printDataFrame(data=bundles.response_frame,
-                                   verbose_level=default.VERBOSITY,
-                                   advanced=default.ADVANCED)
-
-                bundles.resetAll()
+
+        bundles = showJob('opensea_bundles')
+        if bundles is not None:
+            if default.STORE:
+                bundles.saveToStore()
+            bundles.resetAll()
+
+        frame = showResult('opensea_bundles', default.SAVED_OUTPUTS_ACTUAL)
+        if frame is not None:
+            if default.SAVE:
+                st.markdown('### Save Data')
+                default.EXPORT_FORMAT = st.selectbox('Export Format', tuple(EXPORT_FORMATS),
+                                                      index=tuple(EXPORT_FORMATS).index(default.EXPORT_FORMAT),
+                                                      key='format_opensea_bundles')
+                downloadResult('opensea_bundles', default.EXPORT_FORMAT, default.SAVED_OUTPUTS_ACTUAL)
+            if default.VERBOSE:
+                st.markdown('### Display Data')
+                printDataFrame(data=frame,
+                               verbose_level=default.VERBOSITY,
+                               advanced=default.ADVANCED,
+                               profile_mode=default.PROFILE_MODE,
+                               profile_rows=default.PROFILE_ROWS)
@@ -1,8 +1,8 @@
 import streamlit as st
 import pandas as pd
-import pages.config.rarible_config as default
+import pages.config.rarible_config as config
 
-from utils.utils import printDataFrame
+from utils.utils import printDataFrame, getSessionConfig
 from pages.classes.rarible_class import Collection, Item, Ownership, OrderActivity, OrderCollection, OrderItem, \
     OrderOwnership
 
@@ -12,6 +12,9 @@ def app():
     This is the function that runs when Rarible page is activated
     """
 
+    # every browser session works on its own copy of the config
+    default = getSessionConfig(config)
+
     st.title('Rarible Scraper')
     st.markdown('This app allows you to pull data from Rarible regarding the Collections, Items, Ownership, '
                 'Order Activity, Order Collections, Order Items and Order Ownership of NFT assets found on Rarible.')
@@ -39,6 +42,17 @@ def app():
                                                 max_value=10000,
                                                 value=20)
             default.ADVANCED = st.checkbox('Show Advanced DataFrame Statistics', value=False)
+            if default.ADVANCED:
+                default.PROFILE_MODE = st.selectbox('Profiling Mode', ('Sample', 'Chunked', 'Full'),
+                                                    help='Sample profiles a random sample of the rows, '
+                                                         'Chunked streams summary statistics over every '
+                                                         'row and Full profiles every row, which is slow '
+                                                         'on large extractions.')
+                if default.PROFILE_MODE == 'Sample':
+                    default.PROFILE_ROWS = st.number_input('Number of Rows to Profile',
+                                                           min_value=100,
+                                                           max_value=1000000,
+                                                           value=10000)
 
         st.markdown('## Collections Retrieval\n'
                     'Ensure that the parameters you wish to pass into the class is loaded successfully.')
@@ -66,6 +80,17 @@ def app():
                                                 max_value=10000,
                                                 value=20)
             default.ADVANCED = st.checkbox('Show Advanced DataFrame Statistics', value=False)
+            if default.ADVANCED:
+                default.PROFILE_MODE = st.selectbox('Profiling Mode', ('Sample', 'Chunked', 'Full'),
+                                                    help='Sample profiles a random sample of the rows, '
+                                                         'Chunked streams summary statistics over every '
+                                                         'row and Full profiles every row, which is slow '
+                                                         'on large extractions.')
+                if default.PROFILE_MODE == 'Sample':
+                    default.PROFILE_ROWS = st.number_input('Number of Rows to Profile',
+                                                           min_value=100,
+                                                           max_value=1000000,
+                                                           value=10000)
 
         st.markdown('## Items Retrieval\n'
                     'Ensure that the parameters you wish to pass into the class is loaded successfully.')
@@ -91,6 +116,17 @@ def app():
                                                 max_value=10000,
                                                 value=20)
             default.ADVANCED = st.checkbox('Show Advanced DataFrame Statistics', value=False)
+            if default.ADVANCED:
+                default.PROFILE_MODE = st.selectbox('Profiling Mode', ('Sample', 'Chunked', 'Full'),
+                                                    help='Sample profiles a random sample of the rows, '
+                                                         'Chunked streams summary statistics over every '
+                                                         'row and Full profiles every row, which is slow '
+                                                         'on large extractions.')
+                if default.PROFILE_MODE == 'Sample':
+                    default.PROFILE_ROWS = st.number_input('Number of Rows to Profile',
+                                                           min_value=100,
+                                                           max_value=1000000,
+                                                           value=10000)
 
         st.markdown('## Ownership Retrieval\n'
                     'Ensure that the parameters you wish to pass into the class is loaded successfully.')
@@ -118,6 +154,17 @@ def app():
                                                 max_value=10000,
                                                 value=20)
             default.ADVANCED = st.checkbox('Show Advanced DataFrame Statistics', value=False)
+            if default.ADVANCED:
+                default.PROFILE_MODE = st.selectbox('Profiling Mode', ('Sample', 'Chunked', 'Full'),
+                                                    help='Sample profiles a random sample of the rows, '
+                                                         'Chunked streams summary statistics over every '
+                                                         'row and Full profiles every row, which is slow '
+                                                         'on large extractions.')
+                if default.PROFILE_MODE == 'Sample':
+                    default.PROFILE_ROWS = st.number_input('Number of Rows to Profile',
+                                                           min_value=100,
+                                                           max_value=1000000,
+                                                           value=10000)
 
         st.markdown('## Order Activity Retrieval\n'
                     'Ensure that the parameters you wish to pass into the class is loaded successfully.')
@@ -145,6 +192,17 @@ def app():
                                                 max_value=10000,
                                                 value=20)
             default.ADVANCED = st.checkbox('Show Advanced DataFrame Statistics', value=False)
+            if default.ADVANCED:
+                default.PROFILE_MODE = st.selectbox('Profiling Mode', ('Sample', 'Chunked', 'Full'),
+                                                    help='Sample profiles a random sample of the rows, '
+                                                         'Chunked streams summary statistics over every '
+                                                         'row and Full profiles every row, which is slow '
+                                                         'on large extractions.')
+                if default.PROFILE_MODE == 'Sample':
+                    default.PROFILE_ROWS = st.number_input('Number of Rows to Profile',
+                                                           min_value=100,
+                                                           max_value=1000000,
+                                                           value=10000)
 
         st.markdown('## Order Collections Retrieval\n'
                     'Ensure that the parameters you wish to pass into the class is loaded successfully.')
@@ -175,6 +233,17 @@ def app():
                                                 max_value=10000,
                                                 value=20)
             default.ADVANCED = st.checkbox('Show Advanced DataFrame Statistics', value=False)
+            if default.ADVANCED:
+                default.PROFILE_MODE = st.selectbox('Profiling Mode', ('Sample', 'Chunked', 'Full'),
+                                                    help='Sample profiles a random sample of the rows, '
+                                                         'Chunked streams summary statistics over every '
+                                                         'row and Full profiles every row, which is slow '
+                                                         'on large extractions.')
+                if default.PROFILE_MODE == 'Sample':
+                    default.PROFILE_ROWS = st.number_input('Number of Rows to Profile',
+                                                           min_value=100,
+                                                           max_value=1000000,
+                                                           value=10000)
 
         st.markdown('## Order Items Retrieval\n'
                     'Ensure that the parameters you wish to pass into the class is loaded successfully.')
@@ -201,6 +270,17 @@ def app():
                                                 max_value=10000,
                                                 value=20)
             default.ADVANCED = st.checkbox('Show Advanced DataFrame Statistics', value=False)
+            if default.ADVANCED:
+                default.PROFILE_MODE = st.selectbox('Profiling Mode', ('Sample', 'Chunked', 'Full'),
+                                                    help='Sample profiles a random sample of the rows, '
+                                                         'Chunked streams summary statistics over every '
+                                                         'row and Full profiles every row, which is slow '
+                                                         'on large extractions.')
+                if default.PROFILE_MODE == 'Sample':
+                    default.PROFILE_ROWS = st.number_input('Number of Rows to Profile',
+                                                           min_value=100,
+                                                           max_value=1000000,
+                                                           value=10000)
 
         st.markdown('## Order Ownership Retrieval\n'
                     'Ensure that the parameters you wish to pass into the class is loaded successfully.')
@@ -0,0 +1,85 @@
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+from aiohttp import web
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.rate_limiter import getRateLimiter
+
+
+class Server:
+    """
+    Serves whatever the handler of a test returns, on an event loop of its own in a daemon thread
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+        self.loop = asyncio.new_event_loop()
+        self.runner = None
+        self.base_url = None
+
+    async def handle(self, request):
+        self.requests.append(str(request.rel_url))
+        return await self.handler(request)
+
+    def start(self):
+        started = threading.Event()
+
+        def serve():
+            asyncio.set_event_loop(self.loop)
+            app = web.Application()
+            app.router.add_route('GET', '/{tail:.*}', self.handle)
+            # handlers still running at the end of a test are dropped rather than waited for
+            self.runner = web.AppRunner(app, shutdown_timeout=0.5)
+            self.loop.run_until_complete(self.runner.setup())
+            site = web.TCPSite(self.runner, '127.0.0.1', 0)
+            self.loop.run_until_complete(site.start())
+            port = site._server.sockets[0].getsockname()[1]
+            self.base_url = f'http://127.0.0.1:{port}'
+            started.set()
+            self.loop.run_forever()
+
+        threading.Thread(target=serve, daemon=True).start()
+        started.wait(5)
+        return self
+
+    async def shutdown(self):
+        await self.runner.cleanup()
+        # handlers the runner gave up on are cancelled here, rather than destroyed pending along with the loop
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    """
+    Starts a local server for the handler of a test, unpaced by the rate limiter and without backoff between retries
+    """
+
+    servers = []
+    limiter = getRateLimiter()
+    monkeypatch.setattr(limiter, 'host_limits', dict(limiter.host_limits))
+    monkeypatch.setattr('utils.async_requests.backoff', lambda attempt: 0)
+
+    def start(handler):
+        server = Server(handler).start()
+        limiter.host_limits[urlsplit(server.base_url).netloc] = (1000, 1000, 64)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
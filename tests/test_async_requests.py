@@ -0,0 +1,123 @@
+import aiohttp
+import asyncio
+
+from aiohttp import web
+
+from utils.async_requests import fetch, iterFetch, submit, waitFor
+from utils.single_flight import requestKey
+
+
+async def fetchOnce(url):
+    async with aiohttp.ClientSession() as session:
+        return await fetch(session, url, coalesce=False)
+
+
+def test_client_error_with_an_html_body_is_not_retried(serve):
+    async def handler(request):
+        return web.Response(status=404, text='<html><body>Not Found</body></html>', content_type='text/html')
+
+    server = serve(handler)
+
+    result = waitFor(submit(fetchOnce(f'{server.base_url}/assets/missing')), 30)
+
+    assert result.error == 'HTTPError'
+    assert result.status == 404
+    assert result.attempts == 1
+    assert result.payload == '<html><body>Not Found</body></html>'
+    assert len(server.requests) == 1
+
+
+def test_client_error_with_a_json_body_keeps_the_payload(serve):
+    async def handler(request):
+        return web.json_response({'detail': 'Invalid contract address'}, status=400)
+
+    server = serve(handler)
+
+    result = waitFor(submit(fetchOnce(f'{server.base_url}/assets?asset_contract_address=0x')), 30)
+
+    assert result.error == 'HTTPError'
+    assert result.payload == {'detail': 'Invalid contract address'}
+    assert len(server.requests) == 1
+
+
+def test_server_error_is_retried(serve):
+    async def handler(request):
+        return web.Response(status=502, text='Bad Gateway')
+
+    server = serve(handler)
+
+    result = waitFor(submit(fetchOnce(f'{server.base_url}/assets')), 30)
+
+    assert result.error == 'ServerError'
+    assert result.attempts > 1
+    assert len(server.requests) == result.attempts
+
+
+async def pendingTasks():
+    return [task for task in asyncio.all_tasks() if task is not asyncio.current_task() and not task.done()]
+
+
+def test_iter_fetch_cancels_the_requests_in_flight_when_the_caller_stops(serve):
+    async def handler(request):
+        if request.query['page'] != '0':
+            await asyncio.sleep(30)
+        return web.json_response({'page': request.query['page']})
+
+    server = serve(handler)
+    before = len(waitFor(submit(pendingTasks()), 5))
+
+    results = iterFetch(f'{server.base_url}/assets?page={page}' for page in range(20))
+    assert next(results).payload == {'page': '0'}
+    results.close()
+
+    assert len(waitFor(submit(pendingTasks()), 5)) == before
+
+
+def test_identical_requests_in_flight_share_one_upstream_call(serve):
+    async def handler(request):
+        await asyncio.sleep(0.2)
+        return web.json_response({'assets': [{'id': 1}]})
+
+    server = serve(handler)
+
+    async def fetchTwice():
+        async with aiohttp.ClientSession() as session:
+            # the same page, asked for with its query parameters in another order
+            return await asyncio.gather(fetch(session, f'{server.base_url}/assets?limit=10&offset=0'),
+                                        fetch(session, f'{server.base_url}/assets?offset=0&limit=10'))
+
+    first, second = waitFor(submit(fetchTwice()), 30)
+
+    assert first.payload == second.payload == {'assets': [{'id': 1}]}
+    assert len(server.requests) == 1
+
+
+def test_cancelled_caller_leaves_the_shared_call_to_the_others(serve):
+    async def handler(request):
+        await asyncio.sleep(0.2)
+        return web.json_response({'assets': [{'id': 1}]})
+
+    server = serve(handler)
+    url = f'{server.base_url}/assets?offset=0&limit=10'
+
+    async def cancelOne():
+        async with aiohttp.ClientSession() as session:
+            first = asyncio.ensure_future(fetch(session, url))
+            second = asyncio.ensure_future(fetch(session, url))
+            while not server.requests:
+                await asyncio.sleep(0.01)
+            first.cancel()
+            await asyncio.gather(first, return_exceptions=True)
+            return first.cancelled(), await second
+
+    cancelled, result = waitFor(submit(cancelOne()), 30)
+
+    assert cancelled
+    assert result.payload == {'assets': [{'id': 1}]}
+    assert len(server.requests) == 1
+
+
+def test_request_keys_ignore_the_spelling_of_a_url():
+    assert requestKey('HTTPS://API.Opensea.io?b=2&a=1#top') == requestKey('https://api.opensea.io/?a=1&b=2')
+    assert requestKey('https://api.opensea.io/', {'X-API-KEY': 'a'}) != requestKey('https://api.opensea.io/',
+                                                                                   {'X-API-KEY': 'b'})
@@ -0,0 +1,21 @@
+import importlib
+
+from batch import ENDPOINTS, BatchJob
+
+
+def test_every_endpoint_resolves_to_methods_of_its_class():
+    for marketplace, endpoints in ENDPOINTS.items():
+        for endpoint, (module, name, setter, parser) in endpoints.items():
+            scraper = getattr(importlib.import_module(module), name)()
+            for method in (setter, parser, 'loadAndSendPayload', 'loadAndPaginate', 'saveToStore', 'resetAll'):
+                assert callable(getattr(scraper, method, None)), f'{marketplace}/{endpoint} lacks {method}'
+
+
+def test_rarible_job_loads_its_urls():
+    job = BatchJob({'marketplace': 'rarible', 'endpoint': 'collections', 'paginate': True,
+                    'params': {'continuation': None, 'size': '50'}, 'output': 'collections.csv'})
+
+    scraper = job.build()
+
+    assert scraper.URLs == ['https://api-staging.rarible.com/protocol/v0.1/ethereum/nft/collections/all?size=50']
+    assert scraper.timeout is not None
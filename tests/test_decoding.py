@@ -0,0 +1,35 @@
+import json
+
+from utils.decoding import PageParser, StreamParser, loads, project
+
+
+PAGES = [
+    [{'id': 1, 'name': 'a', 'traits': [{'trait_type': 'hat', 'value': 'cap'}]}, {'id': 2, 'name': 'b'}],
+    [1, 'two', None, [3.5]],
+    {'assets': [{'id': 1, 'name': 'a', 'price': '10'}, {'id': 2, 'name': 'b'}], 'next': 'abc', 'count': 2},
+    {'result': {'id': 1}, 'assets': 'none'},
+    'Too Many Requests',
+]
+
+
+def parse(parser, data, chunk=7):
+    for start in range(0, len(data), chunk):
+        parser.feed(data[start:start + chunk])
+    return parser.close()
+
+
+def test_stream_parser_matches_buffered_decoding():
+    for page in PAGES:
+        data = json.dumps(page).encode('utf-8')
+
+        assert parse(StreamParser('assets'), data) == loads(data)
+        assert parse(StreamParser('assets', frozenset({'id'})), data) == project(loads(data), 'assets', {'id'})
+
+
+def test_page_parser_streams_an_array_page_past_the_threshold():
+    page = [{'id': index, 'name': f'token {index}'} for index in range(200)]
+    data = json.dumps(page).encode('utf-8')
+
+    parser = PageParser('assets', frozenset({'id'}), threshold=64)
+    assert parse(parser, data, chunk=256) == page
+    assert parser.stream is not None
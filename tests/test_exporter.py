@@ -0,0 +1,33 @@
+import json
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from utils.exporter import exportFrame
+
+
+def frame():
+    return pd.DataFrame({'id': range(5),
+                         'traits': [None, None, [{'value': 'gold'}], None, [{'value': 'silver'}]],
+                         'name': [None, None, None, 'a', 'b']})
+
+
+def test_json_lines_export_has_one_line_per_row(tmp_path):
+    path = exportFrame(frame(), str(tmp_path / 'data.jsonl'), chunk_rows=2)
+
+    with open(path, encoding='utf-8') as f:
+        lines = f.read().split('\n')
+
+    assert lines[-1] == ''
+    assert [json.loads(line)['id'] for line in lines[:-1]] == list(range(5))
+
+
+def test_parquet_export_writes_a_row_group_per_chunk(tmp_path):
+    path = exportFrame(frame(), str(tmp_path / 'data.parquet'), chunk_rows=2)
+
+    # the columns which are empty in the first chunk still take the type of the later chunks
+    assert pq.ParquetFile(path).num_row_groups == 3
+    exported = pq.read_table(path).to_pandas()
+    assert list(exported['id']) == list(range(5))
+    assert list(exported['name'].iloc[3:]) == ['a', 'b']
+    assert list(exported['traits'].iloc[2]) == [{'value': 'gold'}]
@@ -0,0 +1,168 @@
+import time
+
+import pytest
+
+from aiohttp import web
+
+from pages.classes.opensea_class import Events
+from utils.jobs import Job, JobManager
+from utils.pagination import OffsetPagination, TimeSlicedPagination, TokenPagination, fetchAllPages, getQueryParameter
+
+
+def offsetHandler(total, failing_offset):
+    async def handler(request):
+        offset = int(request.query['offset'])
+        limit = int(request.query['limit'])
+        if offset == failing_offset:
+            return web.json_response({'detail': 'Internal Server Error'}, status=500)
+        return web.json_response({'assets': [{'id': index} for index in range(offset, min(offset + limit, total))]})
+
+    return handler
+
+
+def tokenHandler(total, failing_cursor):
+    async def handler(request):
+        cursor = int(request.query.get('cursor', 0))
+        if cursor == failing_cursor:
+            return web.json_response({'detail': 'Internal Server Error'}, status=500)
+        records = [{'id': index} for index in range(cursor, min(cursor + 10, total))]
+        return web.json_response({'result': records, 'cursor': str(cursor + len(records)),
+                                  'remaining': int(cursor + len(records) < total)})
+
+    return handler
+
+
+def test_offset_pagination_fetches_past_a_failed_page(serve):
+    server = serve(offsetHandler(total=55, failing_offset=20))
+    pagination = OffsetPagination(record_key='assets', window=2)
+
+    pages = fetchAllPages([f'{server.base_url}/assets?offset=0&limit=10'], pagination, timeout=30)
+
+    ids = [record['id'] for page in pages for record in page['assets']]
+    assert ids == [index for index in range(55) if not 20 <= index < 30]
+    assert [getQueryParameter(failure['url'], 'offset') for failure in pagination.failures] == ['20']
+    assert pagination.failures[0]['error'] == 'ServerError'
+
+
+def test_offset_pagination_stops_once_a_window_of_pages_failed(serve):
+    async def handler(request):
+        return web.json_response({'detail': 'Service Unavailable'}, status=503)
+
+    server = serve(handler)
+    pagination = OffsetPagination(record_key='assets', window=3)
+
+    pages = fetchAllPages([f'{server.base_url}/assets?offset=0&limit=10'], pagination, timeout=30)
+
+    # the pages already in flight when the third failure in a row comes back are the only ones requested after it
+    assert pages == []
+    assert 3 <= len(pagination.failures) < 2 * 3
+
+
+def test_token_pagination_reports_a_failed_page(serve):
+    server = serve(tokenHandler(total=50, failing_cursor=20))
+    pagination = TokenPagination(token_key='cursor', record_key='result', more_key='remaining')
+
+    pages = fetchAllPages([f'{server.base_url}/assets?page_size=10'], pagination, timeout=30)
+
+    assert [record['id'] for page in pages for record in page['result']] == list(range(20))
+    assert [getQueryParameter(failure['url'], 'cursor') for failure in pagination.failures] == ['20']
+
+
+def test_failed_page_is_kept_for_retry_by_the_job(serve):
+    server = serve(offsetHandler(total=55, failing_offset=20))
+    pagination = OffsetPagination(record_key='assets', window=2)
+
+    job = JobManager(max_workers=1).submit('pages', fetchAllPages, [f'{server.base_url}/assets?offset=0&limit=10'],
+                                           pagination, timeout=30)
+    deadline = time.monotonic() + 30
+    while not job.isFinished() and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert job.status == 'done'
+    assert [getQueryParameter(url, 'offset') for url in job.failedURLs()] == ['20']
+    assert job.error_kinds['ServerError'] == 1
+
+
+def waitFor(job):
+    deadline = time.monotonic() + 30
+    while not job.isFinished() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return job
+
+
+def test_retry_fetches_only_the_failed_pages(serve):
+    failing = {20}
+
+    async def handler(request):
+        offset = int(request.query['offset'])
+        if offset in failing:
+            return web.json_response({'detail': 'Internal Server Error'}, status=500)
+        return web.json_response({'asset_events': [{'id': index} for index in range(offset, min(offset + 10, 55))]})
+
+    server = serve(handler)
+    events = Events()
+    events.pagination = OffsetPagination(record_key='asset_events', window=2)
+    events.URLs = [f'{server.base_url}/events?offset=0&limit=10']
+    events.timeout = 30
+    manager = JobManager(max_workers=1)
+
+    job = waitFor(manager.submit('events', events.loadAndBuild, paginate=True, result=events))
+    assert [getQueryParameter(url, 'offset') for url in job.failedURLs()] == ['20']
+
+    failing.clear()
+    del server.requests[:]
+    retry = waitFor(manager.retryFailed(job))
+
+    assert retry.status == 'done'
+    assert [getQueryParameter(url, 'offset') for url in server.requests] == ['20']
+    assert sorted(retry.result.response_frame['id']) == list(range(20, 30))
+
+
+def test_error_bodies_are_not_built_into_rows(serve):
+    async def handler(request):
+        if request.query['limit'] == '500':
+            # validation errors are keyed by the field they are about, which can be the record key itself
+            return web.json_response({'asset_events': [{'detail': 'Ensure this value is at most 300.'}]}, status=400)
+        return web.json_response({'asset_events': [{'id': 0}]})
+
+    server = serve(handler)
+    events = Events()
+    events.pagination = OffsetPagination(record_key='asset_events')
+    events.URLs = [f'{server.base_url}/events?offset=0&limit={limit}' for limit in (10, 500)]
+    events.timeout = 30
+
+    job = waitFor(JobManager(max_workers=1).submit('events', events.loadAndBuild, result=events))
+
+    assert list(events.response_frame['id']) == [0]
+    assert 'detail' not in events.response_frame.columns
+    assert [getQueryParameter(url, 'limit') for url in job.failedURLs()] == ['500']
+
+
+def test_incremental_sync_is_not_retried_page_by_page():
+    job = Job('events')
+    job.target = Events().syncEvents
+    job.failures = [{'url': 'https://api.opensea.io/api/v1/events?offset=20&limit=10'}]
+
+    with pytest.raises(ValueError):
+        JobManager(max_workers=1).retryFailed(job)
+
+
+def test_time_sliced_window_with_a_failed_page_is_still_split(serve):
+    async def handler(request):
+        after, before = int(request.query['occurred_after']), int(request.query['occurred_before'])
+        offset, limit = int(request.query['offset']), int(request.query['limit'])
+        if (after, before, offset) == (0, 300, 50):
+            return web.json_response({'detail': 'Internal Server Error'}, status=500)
+        seconds = [second for second in range(299, -1, -1) if after <= second <= before]
+        return web.json_response({'asset_events': [{'id': second, 'created_date': second}
+                                                   for second in seconds[offset:offset + limit]]})
+
+    server = serve(handler)
+    pagination = TimeSlicedPagination(record_key='asset_events', max_offset=100, shards=1)
+
+    pages = fetchAllPages([f'{server.base_url}/events?occurred_after=0&occurred_before=300&offset=0&limit=10'],
+                          pagination, timeout=30)
+
+    ids = sorted(record['id'] for page in pages for record in page['asset_events'])
+    assert ids == [second for second in range(300) if not 240 <= second < 250]
+    assert [getQueryParameter(failure['url'], 'offset') for failure in pagination.failures] == ['50']
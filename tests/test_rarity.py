@@ -0,0 +1,30 @@
+import pandas as pd
+
+from analytics.rarity import rankRarity
+
+
+def test_empty_collection_ranks_to_an_empty_frame():
+    ranking = rankRarity(pd.DataFrame({'token_id': [], 'traits': []}))
+
+    assert len(ranking) == 0
+    assert 'rarity_score' in ranking.columns
+
+
+def test_traitless_collection_ranks_every_token_alike():
+    frame = pd.DataFrame({'token_id': ['1', '2', '3'], 'traits': ['[]', None, '']})
+
+    for include_missing in (True, False):
+        ranking = rankRarity(frame, include_missing=include_missing)
+
+        assert ranking['trait_count'].tolist() == [0, 0, 0]
+        assert ranking['rarity_score'].tolist() == [1.0, 1.0, 1.0]
+        assert ranking['rank'].tolist() == [1, 1, 1]
+
+
+def test_rarer_traits_rank_first():
+    frame = pd.DataFrame({'token_id': ['1', '2', '3'],
+                          'traits': ['[{"trait_type": "hat", "value": "cap"}]',
+                                     '[{"trait_type": "hat", "value": "cap"}]',
+                                     '[{"trait_type": "hat", "value": "crown"}]']})
+
+    assert rankRarity(frame)['token_id'].tolist()[0] == '3'
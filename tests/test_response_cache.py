@@ -0,0 +1,85 @@
+import os
+
+import aiohttp
+
+from aiohttp import web
+from urllib.parse import urlsplit
+
+from utils.async_requests import fetch, submit, waitFor
+from utils.response_cache import ResponseCache
+
+
+class VersionedAPI:
+    """
+    Serves a payload under an ETag, answering a request which already holds that ETag with 304 Not Modified
+    """
+
+    def __init__(self):
+        self.version = 1
+        self.conditional = []
+
+    async def handler(self, request):
+        etag = f'"v{self.version}"'
+        self.conditional.append(request.headers.get('If-None-Match'))
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.json_response({'assets': [{'id': self.version}]}, headers={'ETag': etag})
+
+
+def cacheFor(server, tmp_path, ttl):
+    return ResponseCache(cache_dir=str(tmp_path), ttls=[(urlsplit(server.base_url).netloc, ttl)])
+
+
+def fetchThrough(cache, url):
+    async def fetchOnce():
+        async with aiohttp.ClientSession() as session:
+            return await fetch(session, url, cache=cache, coalesce=False)
+
+    return waitFor(submit(fetchOnce()), 30)
+
+
+def test_fresh_response_is_served_without_a_request(serve, tmp_path):
+    api = VersionedAPI()
+    server = serve(api.handler)
+    cache = cacheFor(server, tmp_path, ttl=3600)
+    url = f'{server.base_url}/assets?limit=10'
+
+    first = fetchThrough(cache, url)
+    api.version = 2
+    second = fetchThrough(cache, url)
+
+    assert not first.cached
+    assert second.cached
+    assert second.payload == {'assets': [{'id': 1}]}
+    assert len(server.requests) == 1
+
+
+def test_stale_response_is_revalidated_with_its_etag(serve, tmp_path):
+    api = VersionedAPI()
+    server = serve(api.handler)
+    cache = cacheFor(server, tmp_path, ttl=0)
+    url = f'{server.base_url}/assets?limit=10'
+
+    fetchThrough(cache, url)
+    unchanged = fetchThrough(cache, url)
+    api.version = 2
+    changed = fetchThrough(cache, url)
+
+    assert api.conditional == [None, '"v1"', '"v1"']
+    assert unchanged.cached and unchanged.status == 304
+    assert unchanged.payload == {'assets': [{'id': 1}]}
+    assert not changed.cached
+    assert changed.payload == {'assets': [{'id': 2}]}
+    assert cache.get(url)['etag'] == '"v2"'
+
+
+def test_api_key_is_not_written_to_disk(serve, tmp_path):
+    server = serve(VersionedAPI().handler)
+    cache = cacheFor(server, tmp_path, ttl=3600)
+
+    fetchThrough(cache, f'{server.base_url}/assets?limit=10&X-API-KEY=secret')
+
+    names = os.listdir(str(tmp_path))
+    assert len(names) == 1
+    with open(os.path.join(str(tmp_path), names[0]), 'rb') as f:
+        assert b'secret' not in f.read()
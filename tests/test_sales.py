@@ -0,0 +1,67 @@
+import json
+
+import pandas as pd
+import pytest
+
+from analytics.sales import SalesSeries, getSalesSeries
+
+
+TOKEN = json.dumps({'decimals': 18, 'eth_price': '1.0', 'usd_price': '2000.0'})
+
+
+def events(rows):
+    return pd.DataFrame([{'id': event_id, 'collection_slug': slug, 'event_type': 'successful',
+                          'created_date': created, 'total_price': str(int(price * 10 ** 18)), 'quantity': '1',
+                          'payment_token': TOKEN} for event_id, slug, created, price in rows])
+
+
+FIRST = events([(1, 'apes', '2022-01-01T01:00:00', 1.0), (2, 'apes', '2022-01-01T05:00:00', 3.0),
+                (3, 'cats', '2022-01-02T01:00:00', 0.5)])
+# overlaps the first batch by one event and adds to a bucket it already holds
+SECOND = events([(2, 'apes', '2022-01-01T05:00:00', 3.0), (4, 'apes', '2022-01-01T09:00:00', 2.0),
+                 (5, 'apes', '2022-01-03T01:00:00', 4.0)])
+
+
+def test_incremental_merges_match_one_aggregation_of_every_event():
+    incremental = SalesSeries('1D')
+    assert incremental.update(FIRST) == 3
+    assert incremental.update(SECOND) == 2
+    assert incremental.update(SECOND) == 0
+
+    whole = SalesSeries('1D')
+    whole.update(pd.concat([FIRST, SECOND]))
+
+    merged = incremental.series(fill=False)
+    pd.testing.assert_frame_equal(merged, whole.series(fill=False))
+    apes = merged[merged['collection'] == 'apes'].set_index('bucket')
+    first_day = apes.loc[pd.Timestamp('2022-01-01', tz='UTC')]
+    assert (first_day['open'], first_day['high'], first_day['low'], first_day['close']) == (1.0, 3.0, 1.0, 2.0)
+    assert first_day['sales'] == 3
+    assert first_day['volume_eth'] == pytest.approx(6.0)
+
+
+def test_saved_series_carries_on_in_the_next_process(tmp_path):
+    series = SalesSeries('1D', scope='query-a')
+    series.update(FIRST)
+    series.save(str(tmp_path))
+
+    loaded = SalesSeries.load(str(tmp_path), '1D', scope='query-a')
+    assert loaded.update(SECOND) == 2
+    assert SalesSeries.load(str(tmp_path), '1D', scope='query-b').series().empty
+
+
+def test_series_are_kept_per_query(tmp_path):
+    first = getSalesSeries('1D', directory=str(tmp_path), scope='query-a')
+    first.update(FIRST)
+
+    assert getSalesSeries('1D', directory=str(tmp_path), scope='query-a') is first
+    assert getSalesSeries('1D', directory=str(tmp_path), scope='query-b').series().empty
+
+
+def test_weekly_buckets_are_fixed_width():
+    with pytest.raises(ValueError):
+        SalesSeries('1W')
+
+    series = SalesSeries('7D')
+    series.update(pd.concat([FIRST, SECOND]))
+    assert series.series(fill=False)['sales'].sum() == 5
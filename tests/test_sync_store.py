@@ -0,0 +1,122 @@
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from aiohttp import web
+
+from pages.classes.opensea_class import Events
+from utils.data_store import DataStore
+from utils.pagination import OffsetPagination, parseTimestamp
+from utils.sync_store import SyncStore
+
+
+START = 1640995200
+
+
+def event(event_id, second):
+    return {'id': event_id,
+            'created_date': datetime.fromtimestamp(START + second, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+class EventsAPI:
+    """
+    Serves events newest first, filtered on occurred_after/occurred_before as exclusive bounds, optionally failing
+    the pages at some offsets
+    """
+
+    def __init__(self, events):
+        self.events = events
+        self.failing = set()
+
+    async def handler(self, request):
+        offset, limit = int(request.query['offset']), int(request.query['limit'])
+        if offset in self.failing:
+            return web.json_response({'detail': 'Internal Server Error'}, status=500)
+
+        after = parseTimestamp(request.query.get('occurred_after'))
+        before = parseTimestamp(request.query.get('occurred_before'))
+        events = [record for record in sorted(self.events, key=lambda record: record['created_date'], reverse=True)
+                  if (after is None or parseTimestamp(record['created_date']) > after)
+                  and (before is None or parseTimestamp(record['created_date']) < before)]
+        return web.json_response({'asset_events': events[offset:offset + limit]})
+
+
+def sync(server, store_dir, max_offset=10000):
+    events = Events()
+    events.pagination = OffsetPagination(record_key='asset_events', max_offset=max_offset)
+    events.URLs = [f'{server.base_url}/events?event_type=successful&offset=0&limit=10']
+    events.timeout = 30
+    events.syncEvents(store_dir=store_dir)
+    return events
+
+
+def test_watermark_holds_until_every_page_came_back(serve, tmp_path):
+    api = EventsAPI([event(index, index) for index in range(45)])
+    api.failing.add(20)
+    server = serve(api.handler)
+
+    events = sync(server, str(tmp_path))
+    store = SyncStore(events.URLs[0], store_dir=str(tmp_path))
+    assert events.new_events == 35
+    assert len(events.failed_pages) == 1
+    assert store.loadWatermark() is None
+
+    api.failing.clear()
+    events = sync(server, str(tmp_path))
+    assert events.failed_pages == []
+    assert sorted(events.response_frame['id']) == list(range(45))
+    assert store.loadWatermark() == START + 44
+
+
+def test_events_past_the_offset_cap_are_sliced_before_the_watermark_moves(serve, tmp_path):
+    api = EventsAPI([event(index, index) for index in range(45)])
+    server = serve(api.handler)
+
+    events = sync(server, str(tmp_path), max_offset=20)
+
+    assert sorted(events.response_frame['id']) == list(range(45))
+    assert SyncStore(events.URLs[0], store_dir=str(tmp_path)).loadWatermark() == START + 44
+
+
+def test_events_sharing_the_watermark_second_are_fetched_by_the_next_sync(serve, tmp_path):
+    api = EventsAPI([event(index, index) for index in range(10)])
+    server = serve(api.handler)
+    sync(server, str(tmp_path))
+
+    # arrived after the first sync, in the second of the newest event stored
+    api.events.append(event(100, 9))
+    events = sync(server, str(tmp_path))
+
+    assert events.new_events == 1
+    assert sorted(events.response_frame['id']) == list(range(10)) + [100]
+
+
+def test_only_the_events_a_sync_added_are_archived(serve, tmp_path):
+    api = EventsAPI([event(index, index) for index in range(10)])
+    server = serve(api.handler)
+    archive = DataStore(str(tmp_path / 'archive'))
+    sync(server, str(tmp_path)).saveToStore(archive)
+
+    api.events.extend(event(index, index) for index in range(10, 15))
+    sync(server, str(tmp_path)).saveToStore(archive)
+
+    assert sorted(archive.read('opensea', 'events')['id']) == list(range(15))
+
+
+def test_reading_only_columns_never_stored_projects_every_column_away(tmp_path):
+    archive = DataStore(str(tmp_path))
+    archive.append(pd.DataFrame([event(index, index) for index in range(3)]), 'opensea', 'events')
+
+    frame = archive.read('opensea', 'events', columns=['price'])
+
+    assert len(frame) == 3
+    assert list(frame.columns) == []
+
+
+def test_watermark_stays_below_a_truncated_second(tmp_path):
+    store = SyncStore('https://api.opensea.io/api/v1/events?event_type=successful', store_dir=str(tmp_path))
+    frame = pd.DataFrame([event(index, index) for index in range(10)])
+
+    store.merge(frame, ceiling=START + 4)
+
+    assert store.loadWatermark() == START + 4
@@ -3,84 +3,537 @@ This is a helper script to asynchronously send requests
 """
 
 import asyncio
-import json
+import atexit
+import threading
 import time
-import aiohttp
 import os
 import pickle
+import shutil
+import subprocess
+import sys
+import tempfile
 
 from asyncio import SelectorEventLoop
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from utils.decoding import loads, dumps, project, STREAM_CHUNK_BYTES
+from utils.response_cache import getResponseCache
+from utils.rate_limiter import getRateLimiter, isThrottled, parseRetryAfter, backoff
+from utils.session_pool import getSessionPool
+from utils.single_flight import getSingleFlight, requestKey
+from utils.jobs import CURRENT_JOB
 
 
-async def fetch(session, url):
+# the long-lived event loop owned by the app, started on a daemon thread on first use
+_LOOP = None
+_LOOP_THREAD = None
+_LOOP_LOCK = threading.Lock()
+
+MAX_RETRIES = 4
+REQUEST_TIMEOUT = 1000
+# seconds iterFetch waits for the requests still in flight to be cancelled once its caller stops
+CLOSE_TIMEOUT = 10
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FetchResult:
+    """
+    Outcome of one request: the URL, the final HTTP status, how long it took over how many attempts, the size of the
+    body, the class of the error it failed with, if any, and the payload
+    """
+
+    __slots__ = ('url', 'status', 'latency', 'bytes', 'attempts', 'error', 'message', 'payload', 'cached')
+
+    def __init__(self, url):
+        self.url = url
+        self.status = None
+        self.latency = 0.0
+        self.bytes = 0
+        self.attempts = 0
+        self.error = None
+        self.message = None
+        self.payload = None
+        self.cached = False
+
+    @property
+    def ok(self):
+        return self.error is None and self.payload is not None
+
+    def fail(self, error, message=None):
+        self.error = error
+        self.message = message
+        return self
+
+    def record(self):
+        """
+        Returns the result without its payload, as reported in job summaries
+
+        :return:                        Dict of the url, status, latency, bytes, attempts, error and message
+        """
+
+        return {'url': self.url, 'status': self.status, 'latency': self.latency, 'bytes': self.bytes,
+                'attempts': self.attempts, 'error': self.error, 'message': self.message, 'cached': self.cached}
+
+    def __repr__(self):
+        return f'FetchResult({self.url!r}, status={self.status}, error={self.error}, attempts={self.attempts})'
+
+
+async def fetch(session, url, cache=None, limiter=None, retries=MAX_RETRIES, headers=None, coalesce=True,
+                record_stream=None):
     """
-    Async sends a GET request to the URL of interest
+    Async sends a GET request to the URL of interest, sharing the upstream call with every identical request already
+    in flight in this process, and counts the result towards the background job it was sent for
 
     :param session:                 aiohttp ClientSession object
     :param url:                     URL to send GET requests to
-    :return:                        JSON object or None
+    :param cache:                   Optional ResponseCache object
+    :param limiter:                 RateLimiter object, defaults to the one shared by the process
+    :param retries:                 Number of times a failed request is retried
+    :param headers:                 Optional dict of headers sent with the request
+    :param coalesce:                Share the upstream call with identical requests in flight, keyed by the normalized
+                                    URL and the credentials sent; the result is shared too, so its payload must be
+                                    treated as read-only
+    :param record_stream:           Optional RecordStream object to pull only the records and fields of interest out
+                                    of the body
+    :return:                        FetchResult object
     """
 
-    try:
-        async with session.get(url) as resp:
-            return await resp.json()
-    except Exception as e:
-        return None
+    if coalesce:
+        key = requestKey(url, headers)
+        if record_stream is not None:
+            key += record_stream.key()
+        result = await getSingleFlight().do(key, lambda: request(session, url, cache, limiter, retries, headers,
+                                                                 record_stream))
+    else:
+        result = await request(session, url, cache, limiter, retries, headers, record_stream)
+    return reportResponse(result)
 
 
-async def bound_fetch(sem, session, url):
+async def request(session, url, cache=None, limiter=None, retries=MAX_RETRIES, headers=None, record_stream=None):
     """
-    Async fetches the URL, uses the Semaphore class to asynchronously get all requests in parallel
-    :param sem:                     Semaphore object
-    :param session:                 aiohttp ClientResponse objecct
+    Async sends a GET request to the URL of interest, paced by the limiter of the URL's host and retried with jittered
+    exponential backoff on throttling, Cloudflare challenges, server errors and connection errors
+
+    The error class of a failed result is Throttled if the host kept throttling, ServerError if it kept answering with
+    5xx, HTTPError for any other error status, which is not retried and whose error payload or text is kept, or the
+    class of the exception raised by the last attempt, such as TimeoutError, ClientConnectorError or JSONDecodeError
+
+    :param session:                 aiohttp ClientSession object
     :param url:                     URL to send GET requests to
-    :return:                        awaitable coroutine
+    :param cache:                   Optional ResponseCache object; fresh responses are served from it and stale ones
+                                    are revalidated with their ETag/Last-Modified validators
+    :param limiter:                 RateLimiter object, defaults to the one shared by the process
+    :param retries:                 Number of times a failed request is retried
+    :param headers:                 Optional dict of headers sent with the request
+    :param record_stream:           Optional RecordStream object; the body is then cut down to the records and fields
+                                    of interest, huge pages being parsed as they stream in so that only those are
+                                    ever built, unless a cache is given, in which case the whole page is decoded to be
+                                    stored and cut down afterwards
+    :return:                        FetchResult object
     """
 
-    async with sem:
-        return await fetch(session, url)
+    start = time.perf_counter()
+    result = FetchResult(url)
+
+    entry = None
+    request_headers = dict(headers or {})
+    if cache is not None:
+        # the cache reads and writes files, which would stall every request in flight on the shared loop
+        entry = await asyncio.to_thread(cache.get, url, headers)
+        if entry is not None:
+            if cache.isFresh(entry):
+                result.status, result.payload, result.cached = 200, entry['payload'], True
+                return finish(projected(result, record_stream), start)
+            request_headers.update(cache.validators(entry))
+
+    if limiter is None:
+        limiter = getRateLimiter()
+    host_limiter = limiter.forURL(url)
+
+    for attempt in range(retries + 1):
+        result.attempts = attempt + 1
+        await host_limiter.acquire()
+        try:
+            async with session.get(url, headers=request_headers or None) as resp:
+                result.status = resp.status
+                if isThrottled(resp.status, resp.headers):
+                    host_limiter.onThrottle(parseRetryAfter(resp.headers.get('Retry-After')))
+                    result.fail('Throttled', resp.headers.get('Retry-After'))
+                elif resp.status < 500:
+                    host_limiter.onSuccess()
+                    if resp.status == 304 and entry is not None:
+                        await asyncio.to_thread(cache.refresh, url, headers, entry)
+                        result.payload, result.cached = entry['payload'], True
+                        return finish(projected(result.fail(None), record_stream), start)
+
+                    if record_stream is not None and cache is None and resp.status < 400:
+                        result.bytes = 0
+                        parser = record_stream.parser()
+                        async for chunk in resp.content.iter_chunked(STREAM_CHUNK_BYTES):
+                            result.bytes += len(chunk)
+                            parser.feed(chunk)
+                        result.payload = parser.close()
+                        return finish(result.fail(None), start)
+
+                    body = await resp.read()
+                    result.bytes = len(body)
+                    if resp.status >= 400:
+                        # a client error is final whatever its body, which is not retried even if it is not JSON
+                        result.payload = decodeErrorBody(body)
+                        return finish(result.fail('HTTPError', resp.reason), start)
+                    result.payload = loads(body)
 
+                    if cache is not None and resp.status == 200:
+                        await asyncio.to_thread(cache.put, url, headers, result.payload,
+                                                etag=resp.headers.get('ETag'),
+                                                last_modified=resp.headers.get('Last-Modified'))
+                    return finish(projected(result.fail(None), record_stream), start)
+                else:
+                    result.fail('ServerError', resp.reason)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            result.fail(type(e).__name__, str(e))
+        finally:
+            host_limiter.release()
 
-async def run(urls, sem_count=200):
+        if attempt < retries:
+            await asyncio.sleep(backoff(attempt))
+
+    return finish(result, start)
+
+
+def decodeErrorBody(body):
     """
-    Async main function to start the request sending
-    :param urls:                    Literal representation of URLs, parsed into a list
-    :param sem_count:               Number of Semaphore threads to init
-    :return:                        List of responses in the JSON format
+    Decodes the body of an error response, keeping its text if it is not JSON, such as the HTML error page of a proxy
+
+    :param body:                    Bytes of the body
+    :return:                        Decoded JSON object, or the text of the body
     """
-    timeout = 1000
-    tasks = []
 
-    sem = asyncio.Semaphore(sem_count)
-    conn = aiohttp.TCPConnector()
+    try:
+        return loads(body)
+    except ValueError:
+        return body.decode('utf-8', errors='replace')
+
 
-    async with aiohttp.ClientSession(connector=conn) as session:
-        for url in urls:
-            task = asyncio.wait_for(bound_fetch(sem, session, url), timeout)
-            tasks.append(task)
+def finish(result, start):
+    result.latency = time.perf_counter() - start
+    return result
 
-        responses = await asyncio.gather(*tasks)
+
+def projected(result, record_stream):
+    """
+    Cuts the payload of a result decoded whole, such as one served from the cache, down to what the record stream
+    would have kept
+    """
+
+    if record_stream is not None:
+        result.payload = project(result.payload, record_stream.record_key, record_stream.fields)
+    return result
+
+
+def reportResponse(result):
+    """
+    Counts a response towards the progress of the background job the request was sent for, if any
+
+    :param result:                  FetchResult object
+    :return:                        The result
+    """
+
+    job = CURRENT_JOB.get()
+    if job is not None:
+        job.onResponse(result)
+    return result
+
+
+async def iterate(urls, workers=200, headers=None, cache=None, timeout=REQUEST_TIMEOUT, record_stream=None):
+    """
+    Async generator sending GET requests to URLs pulled lazily from any iterable, including generators, with at most a
+    fixed number of requests in flight, and yielding each result as soon as it completes; neither the URLs nor the
+    responses are ever all held at once, whatever the number of URLs
+
+    :param urls:                    Iterable of URLs to send GET requests to
+    :param workers:                 Maximum number of requests in flight at once
+    :param headers:                 Optional dict of headers sent with every request
+    :param cache:                   Optional ResponseCache object
+    :param timeout:                 Seconds one request may take, retries included, before it fails with TimeoutError
+    :param record_stream:           Optional RecordStream object to pull only the records and fields of interest out
+                                    of each body
+    :return:                        Async iterator of (position of the URL, FetchResult) in the order they complete
+    """
+
+    session = getSessionPool().session()
+    pending = enumerate(urls)
+    in_flight = {}
+    exhausted = False
+
+    try:
+        while True:
+            # top up the pool from the iterable, so that URLs are only built once a worker is free for them
+            while not exhausted and len(in_flight) < workers:
+                item = next(pending, None)
+                if item is None:
+                    exhausted = True
+                    break
+                index, url = item
+                task = asyncio.ensure_future(asyncio.wait_for(fetch(session, url, cache, headers=headers,
+                                                                    record_stream=record_stream), timeout))
+                in_flight[task] = (index, url)
+
+            if not in_flight:
+                return
+
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index, url = in_flight.pop(task)
+                error = task.exception()
+                if error is None:
+                    yield index, task.result()
+                else:
+                    yield index, reportResponse(FetchResult(url).fail(type(error).__name__, str(error)))
+    finally:
+        # the consumer stopped early or was cancelled, so the requests still in flight are no longer wanted
+        for task in in_flight:
+            task.cancel()
+        if in_flight:
+            await asyncio.wait(in_flight)
+
+
+async def run(urls, sem_count=200, headers=None, callback=None, cache=None):
+    """
+    Async main function to start the request sending over the session shared by the running event loop
+    :param urls:                    Iterable of URLs to send GET requests to
+    :param sem_count:               Maximum number of requests in flight at once
+    :param headers:                 Optional dict of headers sent with every request
+    :param callback:                Optional function which consumes each response in the order they arrive
+    :param cache:                   Optional ResponseCache object
+    :return:                        List of responses in the JSON format in the order of the URLs, empty if a callback
+                                    consumed them
+    """
+
+    responses = []
+    async for index, result in iterate(urls, workers=sem_count, headers=headers, cache=cache):
+        if callback is not None:
+            callback(result.payload)
+            continue
+        if index >= len(responses):
+            responses.extend([None] * (index + 1 - len(responses)))
+        responses[index] = result.payload
     return responses
 
+
+def getEventLoop():
+    """
+    Returns the event loop shared by every scrape in this process, starting it on a background thread if it is not
+    running yet
+
+    :return:                        Running asyncio event loop
+    """
+
+    global _LOOP, _LOOP_THREAD
+
+    with _LOOP_LOCK:
+        if _LOOP is None or _LOOP.is_closed():
+            _LOOP = SelectorEventLoop()
+            _LOOP_THREAD = threading.Thread(target=_LOOP.run_forever, name='async-requests', daemon=True)
+            _LOOP_THREAD.start()
+            atexit.register(closeEventLoop, _LOOP)
+    return _LOOP
+
+
+def closeEventLoop(loop):
+    """
+    Closes the pooled session of the shared event loop and stops the loop when the process exits
+
+    :param loop:                    Event loop returned by getEventLoop()
+    """
+
+    if loop.is_running():
+        try:
+            asyncio.run_coroutine_threadsafe(getSessionPool().close(), loop).result(5)
+        except Exception:
+            pass
+        loop.call_soon_threadsafe(loop.stop)
+
+
+def submit(coro):
+    """
+    Schedules a coroutine on the shared event loop from any thread
+
+    :param coro:                    Coroutine to run
+    :return:                        concurrent.futures.Future wrapping the result of the coroutine
+    """
+
+    return asyncio.run_coroutine_threadsafe(coro, getEventLoop())
+
+
+def waitFor(future, timeout=None):
+    """
+    Blocks until a future returned by submit() is done; inside a background job, cancelling the job cancels the
+    future and with it every request still in flight
+
+    :param future:                  concurrent.futures.Future object
+    :param timeout:                 Seconds to wait before giving up, None to wait forever
+    :return:                        Result of the future
+    """
+
+    job = CURRENT_JOB.get()
+    if job is None:
+        return future.result(timeout)
+    return job.wait(future, timeout)
+
+
+def fetchAll(urls, sem_count=200, headers=None, timeout=None, callback=None, use_cache=False):
+    """
+    Sends GET requests to all URLs on the shared event loop and blocks until every response is back
+
+    :param urls:                    Iterable of URLs to send GET requests to
+    :param sem_count:               Maximum number of requests in flight at once
+    :param headers:                 Optional dict of headers sent with every request
+    :param timeout:                 Seconds to wait for the whole batch before giving up, None to wait forever
+    :param callback:                Optional function which consumes each response on the event loop as it arrives
+    :param use_cache:               Serve and store the responses through the shared on-disk response cache
+    :return:                        List of responses in the JSON format, in the same order as urls
+    """
+
+    cache = getResponseCache() if use_cache else None
+    expectPages(urls)
+    return waitFor(submit(run(urls, sem_count=sem_count, headers=headers, callback=callback, cache=cache)), timeout)
+
+
+def iterFetch(urls, workers=200, headers=None, timeout=None, use_cache=False, record_stream=None):
+    """
+    Sends GET requests to URLs pulled lazily from any iterable on the shared event loop and yields each result to the
+    calling thread as soon as it completes; the next result is only taken off the loop once the caller asks for it, so
+    a slow consumer holds at most one pool of finished requests
+
+    :param urls:                    Iterable of URLs to send GET requests to, such as a generator of page URLs
+    :param workers:                 Maximum number of requests in flight at once
+    :param headers:                 Optional dict of headers sent with every request
+    :param timeout:                 Seconds to wait for the whole stream before giving up, None to wait forever
+    :param use_cache:               Serve and store the responses through the shared on-disk response cache
+    :param record_stream:           Optional RecordStream object to pull only the records and fields of interest out
+                                    of each body
+    :return:                        Iterator of FetchResult objects in the order they complete
+    """
+
+    cache = getResponseCache() if use_cache else None
+    expectPages(urls)
+    stream = iterate(urls, workers=workers, headers=headers, cache=cache, record_stream=record_stream)
+    # held by each step of the stream, so that it is only closed once a step cancelled along with the caller unwound
+    lock = waitFor(submit(createLock()))
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    try:
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            item = waitFor(submit(nextResult(stream, lock)), remaining)
+            if item is None:
+                return
+            yield item[1]
+    finally:
+        # not through waitFor, as a cancelled job would cancel the close too and leave the requests running
+        try:
+            submit(closeStream(stream, lock)).result(CLOSE_TIMEOUT)
+        except FutureTimeoutError:
+            pass
+
+
+async def createLock():
+    # made on the shared loop, as a lock made on another thread binds to the wrong loop before Python 3.10
+    return asyncio.Lock()
+
+
+async def nextResult(stream, lock):
+    async with lock:
+        try:
+            return await stream.__anext__()
+        except StopAsyncIteration:
+            return None
+
+
+async def closeStream(stream, lock):
+    async with lock:
+        await stream.aclose()
+
+
+def expectPages(urls):
+    """
+    Tells the background job the requests are sent for how many pages to expect, if the URLs are counted up front
+    """
+
+    job = CURRENT_JOB.get()
+    if job is not None and hasattr(urls, '__len__'):
+        job.addExpectedPages(len(urls))
+
+
+def fetchAllFromSubprocess(urls, headers=None):
+    """
+    Fallback path which hands the URLs over to a fresh interpreter through temporary files in a workspace of its own,
+    so that concurrent scrapes never read or remove each other's files
+
+    :param urls:                    List of URLs to send GET requests to
+    :param headers:                 Optional dict of headers sent with every request
+    :return:                        Path of the workspace to pass to loadDumps()
+    """
+
+    workspace = tempfile.mkdtemp(prefix='nftscraper-job-')
+    with open(os.path.join(workspace, 'url_dumps.pkl'), 'wb') as output:
+        pickle.dump({'urls': urls, 'headers': headers}, output)
+    subprocess.run([sys.executable, '-m', 'utils.async_requests', workspace], cwd=PROJECT_DIR)
+    return workspace
+
+
+def loadDumps(workspace):
+    """
+    Reads back the responses written by the subprocess fallback and removes its workspace
+
+    :param workspace:               Path returned by fetchAllFromSubprocess()
+    :return:                        List of responses in the JSON format, or None if no dump exists
+    """
+
+    base_filepath = os.path.join(workspace, 'data_dumps.json')
+
+    try:
+        if not os.path.exists(base_filepath):
+            return None
+        with open(base_filepath, 'rb') as f:
+            return loads(f.read())
+    finally:
+        discardDumps(workspace)
+
+
+def discardDumps(workspace):
+    """
+    Removes the workspace of the subprocess fallback without reading it
+
+    :param workspace:               Path returned by fetchAllFromSubprocess(), or None
+    """
+
+    if workspace is not None:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
 if __name__ == '__main__':
     """
-    This will run when this file is invoked with the python command on the CLI or through the app
+    This will run when this file is invoked with the python command on the CLI or through the app, with the path of
+    the workspace as the only argument
     """
 
-    url_filepath = os.path.join(os.getcwd(), 'url_dumps.pkl')
-    base_filepath = os.path.join(os.getcwd(), 'data_dumps.json')
+    workspace = sys.argv[1] if len(sys.argv) > 1 else os.getcwd()
+    url_filepath = os.path.join(workspace, 'url_dumps.pkl')
+    base_filepath = os.path.join(workspace, 'data_dumps.json')
 
     # load from pickle
     if os.path.exists(url_filepath):
-        with open(f'{url_filepath}', 'rb') as pickle_dump:
-            urls = pickle.load(pickle_dump)
+        with open(url_filepath, 'rb') as pickle_dump:
+            job = pickle.load(pickle_dump)
 
         # start async parallel loop
         loop = SelectorEventLoop()
-        data = loop.run_until_complete(run(urls))
-        data = json.dumps(data)
+        data = loop.run_until_complete(run(job['urls'], headers=job['headers']))
+        loop.run_until_complete(getSessionPool().close())
 
-        # dump json object into a temporary json file, removed after runtime
-        with open(f'{base_filepath}', 'w') as f:
-            for d in data:
-                f.write(d)
+        # dump json object into a temporary json file, removed by loadDumps()
+        with open(base_filepath, 'wb') as f:
+            f.write(dumps(data))
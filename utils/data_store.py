@@ -0,0 +1,226 @@
+"""
+This is a helper script to keep every scrape in a local Parquet store partitioned by marketplace, endpoint and scrape
+date, so that analysis can read the data back without scraping it again
+"""
+
+import os
+import threading
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from datetime import datetime, timezone
+from utils.frame_builder import serializeNested
+
+
+DEFAULT_DATA_DIR = os.path.join(os.environ.get('NFTSCRAPER_DATA_DIR', os.path.join(os.getcwd(), 'data')), 'store')
+PARTITIONS = ('marketplace', 'endpoint', 'date')
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+
+def toTable(frame):
+    """
+    Converts a DataFrame into an Arrow table, falling back to strings for object columns holding mixed types
+
+    :param frame:                   Pandas DataFrame to convert
+    :return:                        Arrow Table
+    """
+
+    # categories differ from scrape to scrape, parquet dictionary-encodes the strings on its own anyway
+    frame = frame.copy()
+    for column in frame.columns:
+        if isinstance(frame[column].dtype, pd.CategoricalDtype):
+            frame[column] = frame[column].astype('string')
+
+    try:
+        return pa.Table.from_pandas(frame, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        for column in frame.columns:
+            if frame[column].dtype == object:
+                frame[column] = frame[column].map(serializeNested).astype('string')
+        return pa.Table.from_pandas(frame, preserve_index=False)
+
+
+def unifySchemas(schemas):
+    """
+    Merges the schemas of files written by different scrapes; a column typed differently across the files is widened
+    to a float if every type is numeric and to a string otherwise
+
+    :param schemas:                 List of Arrow Schemas
+    :return:                        Arrow Schema covering every column
+    """
+
+    types = {}
+    for schema in schemas:
+        for field in schema:
+            types.setdefault(field.name, []).append(field.type)
+
+    fields = []
+    for name, candidates in types.items():
+        candidates = [t for t in candidates if not pa.types.is_null(t)]
+        if len(candidates) == 0:
+            fields.append(pa.field(name, pa.null()))
+        elif all(t == candidates[0] for t in candidates):
+            fields.append(pa.field(name, candidates[0]))
+        elif all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in candidates):
+            fields.append(pa.field(name, pa.float64()))
+        else:
+            fields.append(pa.field(name, pa.string()))
+    return pa.schema(fields)
+
+
+def toExpression(filters):
+    """
+    Converts a list of (column, operator, value) filters into an Arrow expression which is pushed down to the scan
+
+    :param filters:                 List of (column, operator, value) tuples, all of which must hold; the operator is
+                                    one of ==, !=, <, <=, >, >=, in, not in
+    :return:                        Arrow Expression, or None if there are no filters
+    """
+
+    expression = None
+    for column, op, value in filters or []:
+        field = ds.field(column)
+        if op in ('=', '=='):
+            condition = field == value
+        elif op == '!=':
+            condition = field != value
+        elif op == '<':
+            condition = field < value
+        elif op == '<=':
+            condition = field <= value
+        elif op == '>':
+            condition = field > value
+        elif op == '>=':
+            condition = field >= value
+        elif op == 'in':
+            condition = field.isin(list(value))
+        elif op == 'not in':
+            condition = ~field.isin(list(value))
+        else:
+            raise ValueError(f'Error: Unknown filter operator {op}. Try again.')
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+class DataStore:
+    """
+    Parquet store laid out as <root>/marketplace=<name>/endpoint=<name>/date=<YYYY-MM-DD>/part-*.parquet; every scrape
+    appends a new file, and reads only open the partitions and columns they ask for
+    """
+
+    def __init__(self, root=DEFAULT_DATA_DIR):
+        """
+        :param root:                    Directory of the store
+        """
+
+        self.root = root
+
+    def partitionPath(self, marketplace, endpoint, date):
+        return os.path.join(self.root, f'marketplace={marketplace}', f'endpoint={endpoint}', f'date={date}')
+
+    def append(self, frame, marketplace, endpoint, scraped_at=None):
+        """
+        Writes a scrape into the partition of its marketplace, endpoint and scrape date
+
+        :param frame:                   Pandas DataFrame to store
+        :param marketplace:             Name of the marketplace, such as opensea
+        :param endpoint:                Name of the endpoint, such as events
+        :param scraped_at:              Time of the scrape, defaults to now
+        :return:                        Path of the written file, or None if the DataFrame is empty
+        """
+
+        if frame is None or len(frame) == 0:
+            return None
+
+        scraped_at = scraped_at if scraped_at is not None else datetime.now(timezone.utc)
+        directory = self.partitionPath(marketplace, endpoint, scraped_at.strftime('%Y-%m-%d'))
+        os.makedirs(directory, exist_ok=True)
+
+        path = os.path.join(directory, f'part-{scraped_at.strftime("%H%M%S")}-{uuid.uuid4().hex[:8]}.parquet')
+        pq.write_table(toTable(frame), f'{path}.tmp', compression='zstd')
+        os.replace(f'{path}.tmp', path)
+        return path
+
+    def partitions(self, marketplace=None, endpoint=None, since=None, until=None):
+        """
+        Lists the partitions matching the arguments without opening any file
+
+        :param marketplace:             Name of the marketplace, None for every marketplace
+        :param endpoint:                Name of the endpoint, None for every endpoint
+        :param since:                   Earliest scrape date as YYYY-MM-DD, None for no lower bound
+        :param until:                   Latest scrape date as YYYY-MM-DD, None for no upper bound
+        :return:                        List of (marketplace, endpoint, date, directory) tuples
+        """
+
+        def listPartition(directory, name):
+            if not os.path.isdir(directory):
+                return []
+            prefix = f'{name}='
+            return sorted(entry[len(prefix):] for entry in os.listdir(directory) if entry.startswith(prefix))
+
+        found = []
+        for market in listPartition(self.root, 'marketplace'):
+            if marketplace is not None and market != marketplace:
+                continue
+            for end in listPartition(os.path.join(self.root, f'marketplace={market}'), 'endpoint'):
+                if endpoint is not None and end != endpoint:
+                    continue
+                for date in listPartition(os.path.join(self.root, f'marketplace={market}', f'endpoint={end}'), 'date'):
+                    if (since is not None and date < since) or (until is not None and date > until):
+                        continue
+                    found.append((market, end, date, self.partitionPath(market, end, date)))
+        return found
+
+    def read(self, marketplace=None, endpoint=None, columns=None, filters=None, since=None, until=None):
+        """
+        Reads the stored scrapes back, pruning partitions by path and pushing the column projection and the filters
+        down to the Parquet scan
+
+        :param marketplace:             Name of the marketplace, None for every marketplace
+        :param endpoint:                Name of the endpoint, None for every endpoint
+        :param columns:                 Columns to read, None or empty to read all columns; the partition columns
+                                        marketplace, endpoint and date can be requested as well
+        :param filters:                 List of (column, operator, value) tuples, see toExpression()
+        :param since:                   Earliest scrape date as YYYY-MM-DD, None for no lower bound
+        :param until:                   Latest scrape date as YYYY-MM-DD, None for no upper bound
+        :return:                        Pandas DataFrame
+        """
+
+        files = []
+        for _, _, _, directory in self.partitions(marketplace, endpoint, since, until):
+            files.extend(os.path.join(directory, name) for name in sorted(os.listdir(directory))
+                         if name.endswith('.parquet'))
+
+        if len(files) == 0:
+            return pd.DataFrame(columns=columns)
+
+        partitioning = ds.partitioning(pa.schema([(name, pa.string()) for name in PARTITIONS]), flavor='hive')
+        schema = unifySchemas([pq.read_schema(path) for path in files]
+                              + [pa.schema([(name, pa.string()) for name in PARTITIONS])])
+        dataset = ds.dataset(files, schema=schema, format='parquet', partitioning=partitioning,
+                             partition_base_dir=self.root)
+
+        # requested columns which were never stored leave an empty projection rather than every column
+        projection = [column for column in columns if column in schema.names] if columns else None
+        table = dataset.to_table(columns=projection, filter=toExpression(filters))
+        return table.to_pandas()
+
+
+def getDataStore():
+    """
+    Returns the data store shared by every scrape in this process
+
+    :return:                        DataStore object
+    """
+
+    global _STORE
+
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = DataStore()
+    return _STORE
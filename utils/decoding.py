@@ -0,0 +1,289 @@
+"""
+This is a helper script to decode and encode JSON as fast as the installed libraries allow: orjson if it is installed,
+the standard library otherwise, and ijson to pull only the records and fields of interest out of a page while its bytes
+stream in, so that the rest of the page is never built into Python objects
+
+orjson reads integers wider than 64 bits as floats; the marketplaces send prices and token ids as strings, but set
+NFTSCRAPER_JSON_DECODER=json to decode with the standard library if a source sends them as bare numbers.
+"""
+
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+    from ijson.common import ObjectBuilder
+except ImportError:
+    ijson = None
+
+
+DECODER = os.environ.get('NFTSCRAPER_JSON_DECODER', 'orjson' if orjson is not None else 'json')
+STREAM_CHUNK_BYTES = 64 * 1024
+# pages up to this size are decoded in one go, which is several times faster than parsing them event by event; larger
+# pages are parsed as they stream in, which holds far less memory than the whole decoded page
+STREAM_THRESHOLD_BYTES = 8 * 1024 * 1024
+SCALAR_EVENTS = ('null', 'boolean', 'integer', 'double', 'number', 'string')
+
+
+def loads(data):
+    """
+    Decodes a JSON document
+
+    :param data:                    Bytes or string of the document
+    :return:                        Decoded JSON object
+    """
+
+    if DECODER == 'orjson' and orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value):
+    """
+    Encodes a JSON object into bytes, falling back to the standard library for values orjson refuses, such as
+    integers wider than 64 bits
+
+    :param value:                   JSON object
+    :return:                        UTF-8 bytes of the document
+    """
+
+    if DECODER == 'orjson' and orjson is not None:
+        try:
+            return orjson.dumps(value)
+        except TypeError:
+            pass
+    return json.dumps(value).encode('utf-8')
+
+
+def project(page, record_key, fields=None):
+    """
+    Cuts a decoded page down to what a RecordStream would have kept: every top-level value, such as next-page tokens,
+    and the records under the record key, restricted to the fields of interest
+
+    :param page:                    Decoded page
+    :param record_key:              Key of the list of records in the page
+    :param fields:                  Fields of the records to keep, None or empty to keep every field
+    :return:                        Projected page
+    """
+
+    if not fields or not isinstance(page, dict) or not isinstance(page.get(record_key), list):
+        return page
+
+    projected = dict(page)
+    projected[record_key] = [{field: record[field] for field in fields if field in record}
+                             if isinstance(record, dict) else record for record in page[record_key]]
+    return projected
+
+
+class RecordStream:
+    """
+    Describes what to pull out of each page while it streams in: the records under one key, each cut down to the
+    fields of interest, and every other top-level value untouched, as the paginators read their next-page tokens there
+    """
+
+    def __init__(self, record_key, fields=None, threshold=STREAM_THRESHOLD_BYTES):
+        """
+        :param record_key:              Key of the list of records in each page
+        :param fields:                  Fields of the records to keep, None or empty to keep every field
+        :param threshold:               Size in bytes past which a page is parsed as it streams in
+        """
+
+        self.record_key = record_key
+        self.fields = frozenset(fields) if fields else None
+        self.threshold = threshold
+
+    def key(self):
+        """
+        Returns a hashable description of the stream, so that requests decoded differently are never coalesced
+        """
+
+        return self.record_key, tuple(sorted(self.fields)) if self.fields else None
+
+    def parser(self):
+        """
+        Returns a new parser for one page
+
+        :return:                        PageParser object
+        """
+
+        return PageParser(self.record_key, self.fields, self.threshold)
+
+
+class PageParser:
+    """
+    Buffers the bytes of a page to decode them in one go, until the page grows past the threshold; from there on, if
+    ijson is installed, the page is parsed as the rest of it streams in
+    """
+
+    def __init__(self, record_key, fields=None, threshold=STREAM_THRESHOLD_BYTES):
+        self.record_key = record_key
+        self.fields = fields
+        self.threshold = threshold
+        self.buffered = BufferedParser(record_key, fields)
+        self.stream = None
+
+    def feed(self, chunk):
+        if self.stream is not None:
+            self.stream.feed(chunk)
+            return
+
+        self.buffered.feed(chunk)
+        if ijson is not None and len(self.buffered.buffer) >= self.threshold:
+            self.stream = StreamParser(self.record_key, self.fields, fallback=self.buffered)
+            self.stream.parse(bytes(self.buffered.buffer))
+
+    def close(self):
+        if self.stream is not None:
+            return self.stream.close()
+        return self.buffered.close()
+
+
+class BufferedParser:
+    """
+    Collects the bytes of a page and decodes them in one go once they are all in, then projects the page
+    """
+
+    def __init__(self, record_key, fields=None):
+        self.record_key = record_key
+        self.fields = fields
+        self.buffer = bytearray()
+
+    def feed(self, chunk):
+        self.buffer.extend(chunk)
+
+    def close(self):
+        page = loads(self.buffer)
+        self.buffer = bytearray()
+        return project(page, self.record_key, self.fields)
+
+
+class StreamParser:
+    """
+    Builds a page from the parse events of ijson as its bytes come in, skipping the events of the record fields which
+    are not wanted, so that only the kept fields of the records are ever built into Python objects
+
+    The raw bytes are kept alongside, as they are far smaller than the objects they decode to, so that a page the
+    ijson backend rejects, such as one holding integers wider than 64 bits under the C backend, is decoded in one go
+    instead
+    """
+
+    def __init__(self, record_key, fields=None, fallback=None):
+        self.record_key = record_key
+        self.fields = fields
+        self.fallback = fallback if fallback is not None else BufferedParser(record_key, fields)
+        self.failed = False
+        self.item_prefix = f'{record_key}.item'
+        self.events = ijson.sendable_list()
+        self.coroutine = ijson.parse_coro(self.events, use_float=True)
+        self.page = {}
+        # builder of a page which is not an object at its top level, built whole as project() leaves it
+        self.whole = None
+        self.top_key = None
+        # builder of the top-level value being read, other than the records
+        self.value = None
+        self.records = None
+        # builder of the record being read, and whether the events of its current field are dropped
+        self.record = None
+        self.skipping = False
+
+    def feed(self, chunk):
+        self.fallback.feed(chunk)
+        self.parse(chunk)
+
+    def parse(self, chunk):
+        if self.failed:
+            return
+        try:
+            self.coroutine.send(chunk)
+            self.process()
+        except ijson.JSONError:
+            self.failed = True
+
+    def close(self):
+        if not self.failed:
+            try:
+                self.coroutine.close()
+                self.process()
+                return self.whole.value if self.whole is not None else self.page
+            except ijson.JSONError:
+                pass
+        return self.fallback.close()
+
+    def process(self):
+        for prefix, event, value in self.events:
+            if self.whole is not None:
+                self.whole.event(event, value)
+            elif prefix == '':
+                if event == 'start_array':
+                    # a page which is a list at its top level has no record key to cut down
+                    self.whole = ObjectBuilder()
+                    self.whole.event(event, value)
+                elif event == 'map_key':
+                    self.top_key = value
+                elif event in SCALAR_EVENTS:
+                    # a page which is a bare scalar, such as an error string
+                    self.page = value
+            elif self.top_key == self.record_key and (self.records is not None
+                                                      or (prefix == self.record_key and event == 'start_array')):
+                # only a list under the record key is cut down; any other value is kept whole, as project() does
+                self.onRecordsEvent(prefix, event, value)
+            else:
+                self.onValueEvent(prefix, event, value)
+        del self.events[:]
+
+    def onValueEvent(self, prefix, event, value):
+        """
+        Builds a top-level value other than the records, whole
+        """
+
+        if self.value is None:
+            if event in SCALAR_EVENTS:
+                self.page[self.top_key] = value
+                return
+            self.value = ObjectBuilder()
+
+        self.value.event(event, value)
+        # the container closing at the level of the key is the value itself
+        if prefix == self.top_key and event in ('end_map', 'end_array'):
+            self.page[self.top_key] = self.value.value
+            self.value = None
+
+    def onRecordsEvent(self, prefix, event, value):
+        """
+        Builds the list of records, one record at a time, deciding at each field of a record whether the events of
+        its value are built or dropped
+        """
+
+        if prefix == self.record_key:
+            if event == 'start_array':
+                self.records = []
+            elif event == 'end_array':
+                self.page[self.record_key] = self.records
+            return
+
+        if prefix == self.item_prefix and self.record is None:
+            if event in ('start_map', 'start_array'):
+                self.record = ObjectBuilder()
+                self.record.event(event, value)
+            elif event in SCALAR_EVENTS:
+                # records which are not objects are kept as they are
+                self.records.append(value)
+            return
+
+        if prefix == self.item_prefix:
+            if event in ('end_map', 'end_array'):
+                self.record.event(event, value)
+                self.records.append(self.record.value)
+                self.record = None
+                self.skipping = False
+                return
+            if event == 'map_key':
+                self.skipping = self.fields is not None and value not in self.fields
+
+        if not self.skipping:
+            self.record.event(event, value)
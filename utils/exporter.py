@@ -0,0 +1,182 @@
+"""
+This is a helper script to export DataFrames to CSV, Parquet or JSON Lines files chunk by chunk, so that an export never
+holds a second full copy of the data in memory as one large string
+"""
+
+import gzip
+import os
+import shutil
+import tempfile
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.data_store import toTable, unifySchemas
+from utils.frame_builder import serializeNested
+from utils.result_cache import selectColumns
+
+
+DEFAULT_CHUNK_ROWS = 50000
+DEFAULT_EXPORT_DIR = os.path.join(os.environ.get('NFTSCRAPER_DATA_DIR', os.path.join(os.getcwd(), 'data')), 'exports')
+# largest export offered through the app's download button, which reads the whole file into memory to serve it
+MAX_DOWNLOAD_BYTES = int(os.environ.get('NFTSCRAPER_MAX_DOWNLOAD_MB', 200)) * 1024 * 1024
+
+# format name: (file extension, mime type)
+EXPORT_FORMATS = {
+    'CSV': ('.csv', 'text/csv'),
+    'CSV (gzip)': ('.csv.gz', 'application/gzip'),
+    'Parquet': ('.parquet', 'application/octet-stream'),
+    'JSON Lines': ('.jsonl', 'application/x-ndjson'),
+    'JSON Lines (gzip)': ('.jsonl.gz', 'application/gzip')
+}
+
+
+def formatOf(path):
+    """
+    Returns the export format matching the extension of a path
+
+    :param path:                    Path ending in one of the extensions of EXPORT_FORMATS, .json is read as JSON Lines
+    :return:                        Name of the format
+    """
+
+    lowered = path.lower()
+    for name, (extension, _) in sorted(EXPORT_FORMATS.items(), key=lambda item: -len(item[1][0])):
+        if lowered.endswith(extension):
+            return name
+    if lowered.endswith('.json'):
+        return 'JSON Lines'
+    raise ValueError(f'Error: Unknown output format of {path}. Use one of '
+                     f'{[extension for extension, _ in EXPORT_FORMATS.values()]}.')
+
+
+def exportFrame(frame, path, fmt=None, columns=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Writes a DataFrame to a file chunk by chunk, through a temporary file so that a half-written export is never left
+    behind
+
+    :param frame:                   Pandas DataFrame to export
+    :param path:                    Path of the file
+    :param fmt:                     Name of the format in EXPORT_FORMATS, None to pick it from the extension of the path
+    :param columns:                 Columns to export, None or empty to export all columns
+    :param chunk_rows:              Rows converted at a time; Parquet writes one row group per chunk
+    :return:                        Path of the file
+    """
+
+    fmt = fmt if fmt is not None else formatOf(path)
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'Error: Unknown export format {fmt}. Use one of {list(EXPORT_FORMATS)}.')
+
+    frame = selectColumns(frame, columns)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    temp = f'{path}.tmp'
+    try:
+        if fmt == 'Parquet':
+            writeParquet(frame, temp, chunk_rows)
+        else:
+            opener = gzip.open if fmt.endswith('(gzip)') else open
+            with opener(temp, 'wt', encoding='utf-8', newline='') as f:
+                for start in range(0, max(len(frame), 1), chunk_rows):
+                    chunk = frame.iloc[start:start + chunk_rows]
+                    if fmt.startswith('CSV'):
+                        chunk.to_csv(f, header=start == 0, index=False)
+                    elif len(chunk) > 0:
+                        # older pandas ends the lines without a newline, newer pandas with one
+                        f.write(chunk.to_json(orient='records', lines=True, date_format='iso').rstrip('\n'))
+                        f.write('\n')
+        os.replace(temp, path)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+    return path
+
+
+def writeParquet(frame, path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Writes a DataFrame to a Parquet file one row group per chunk, so that only one chunk at a time is ever held as an
+    Arrow table; the chunks are converted once beforehand to agree on the schema of the file, a column typed
+    differently across the chunks being widened as unifySchemas() does
+
+    :param frame:                   Pandas DataFrame to write
+    :param path:                    Path of the file
+    :param chunk_rows:              Rows converted at a time
+    """
+
+    starts = range(0, max(len(frame), 1), chunk_rows)
+    schema = unifySchemas([toTable(frame.iloc[start:start + chunk_rows]).schema for start in starts])
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        for start in starts:
+            writer.write_table(conformTable(toTable(frame.iloc[start:start + chunk_rows]), schema),
+                               row_group_size=chunk_rows)
+
+
+def conformTable(table, schema):
+    """
+    Casts the columns of a table to the types of a wider schema, falling back to the serialized values for a column
+    Arrow cannot cast, such as nested records widened to strings
+
+    :param table:                   Arrow Table
+    :param schema:                  Arrow Schema holding the columns of the table
+    :return:                        Arrow Table of the schema
+    """
+
+    columns = []
+    for field in schema:
+        column = table.column(field.name)
+        if column.type != field.type:
+            try:
+                column = column.cast(field.type)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                column = pa.array([None if value is None else str(serializeNested(value))
+                                   for value in column.to_pylist()], type=pa.string())
+        columns.append(column)
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+class ExportFile:
+    """
+    Export of a result written to a temporary file, which is deleted together with the result it was made from
+    """
+
+    def __init__(self, frame, fmt, columns=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """
+        :param frame:                   Pandas DataFrame to export
+        :param fmt:                     Name of the format in EXPORT_FORMATS
+        :param columns:                 Columns to export, None or empty to export all columns
+        :param chunk_rows:              Rows converted at a time
+        """
+
+        extension, self.mime = EXPORT_FORMATS[fmt]
+        self.format = fmt
+        self.file_name = f'data{extension}'
+        self.directory = tempfile.mkdtemp(prefix='nftscraper-export-')
+        self.path = exportFrame(frame, os.path.join(self.directory, self.file_name), fmt, columns, chunk_rows)
+
+    def __len__(self):
+        # counted against the memory budget of the result cache, the data itself sits on disk
+        return 0
+
+    def open(self):
+        return open(self.path, 'rb')
+
+    def size(self):
+        return os.path.getsize(self.path)
+
+    def saveTo(self, directory=DEFAULT_EXPORT_DIR, file_name=None):
+        """
+        Copies the export into a directory on disk
+
+        :param directory:               Directory to copy the file into
+        :param file_name:               Name of the copy, defaults to the export's own file name
+        :return:                        Path of the copy
+        """
+
+        os.makedirs(directory, exist_ok=True)
+        target = os.path.join(directory, file_name or self.file_name)
+        shutil.copyfile(self.path, f'{target}.tmp')
+        os.replace(f'{target}.tmp', target)
+        return target
+
+    def discard(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,201 @@
+"""
+This is a helper script to build DataFrames page by page as the responses arrive
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import pandas as pd
+
+from utils.jobs import CURRENT_JOB
+
+
+def isNested(value):
+    """
+    Checks if a value is a nested JSON object or array
+
+    :param value:                   Value to check
+    :return:                        True if the value is a dict or a list
+    """
+
+    return isinstance(value, (dict, list))
+
+
+def serializeNested(value):
+    """
+    Serializes nested JSON objects and arrays into JSON strings, leaving every other value untouched
+
+    :param value:                   Value to serialize
+    :return:                        JSON string or the original value
+    """
+
+    if isNested(value):
+        return json.dumps(value)
+    return value
+
+
+def toBoolean(value):
+    """
+    Converts the boolean representations used by the marketplace APIs into booleans
+
+    :param value:                   Value to convert
+    :return:                        True, False or None
+    """
+
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.lower() in ('true', 'false'):
+        return value.lower() == 'true'
+    return None
+
+
+def applySchema(frame, schema, categorical=True):
+    """
+    Converts the columns of a DataFrame into the dtypes defined in the schema; columns missing from the schema are only
+    touched if they hold nested JSON, which is serialized
+
+    The schema maps column names to one of the following kinds:
+        numeric                     Integers and floats, including numbers sent as strings
+        datetime                    ISO 8601 timestamps, converted to UTC
+        category                    Low-cardinality strings such as event types and symbols
+        bool                        Booleans, including booleans sent as strings
+        json                        Nested objects and arrays, serialized into JSON strings
+        string                      Free text and identifiers which must not be converted into numbers
+
+    :param frame:                   Pandas DataFrame to convert
+    :param schema:                  Dict of column name to kind
+    :param categorical:             Convert category columns; set to False for chunks which are concatenated later,
+                                    as categoricals with different categories cannot be concatenated cheaply
+    :return:                        Converted Pandas DataFrame
+    """
+
+    for column in frame.columns:
+        kind = schema.get(column)
+
+        if kind == 'numeric':
+            frame[column] = pd.to_numeric(frame[column], errors='coerce')
+        elif kind == 'datetime':
+            frame[column] = pd.to_datetime(frame[column], errors='coerce', utc=True)
+        elif kind == 'category':
+            if categorical:
+                frame[column] = frame[column].astype('category')
+        elif kind == 'bool':
+            frame[column] = frame[column].map(toBoolean).astype('boolean')
+        elif kind == 'string':
+            frame[column] = frame[column].map(serializeNested).astype('string')
+        elif frame[column].dtype == object:
+            # json columns and unknown columns holding nested objects
+            if kind == 'json' or frame[column].map(isNested).any():
+                frame[column] = frame[column].map(serializeNested)
+
+    return frame
+
+
+class FrameBuilder:
+    """
+    Turns the records of each page into a columnar chunk as soon as the page arrives, optionally spilling the chunks
+    to disk, and concatenates the chunks once at the end
+    """
+
+    def __init__(self, record_key=None, columns=None, spill_rows=None, schema=None):
+        """
+        :param record_key:              Key of the list of records in each page, None to treat each page as one record
+        :param columns:                 Columns to keep, None or empty to keep all columns
+        :param spill_rows:              Number of buffered rows after which the chunks are written to disk, None to
+                                        keep every chunk in memory
+        :param schema:                  Dict of column name to kind used to type the columns, see applySchema()
+        """
+
+        self.record_key = record_key
+        self.columns = list(columns) if columns else None
+        self.spill_rows = spill_rows
+        self.schema = schema if schema is not None else {}
+        self.spill_dir = None
+        self.spilled = []
+        self.chunks = []
+        self.buffered_rows = 0
+        self.rows = 0
+
+    def records(self, page):
+        """
+        Returns the records in a page, skipping missing pages and error responses
+
+        :param page:                    Page in the JSON format
+        :return:                        List of records
+        """
+
+        if page is None:
+            return []
+        if self.record_key is None:
+            return page if isinstance(page, list) else [page]
+        if not isinstance(page, dict):
+            return []
+        return page.get(self.record_key) or []
+
+    def addPage(self, page):
+        """
+        Converts the records of one page into a chunk, restricted to the columns of interest
+
+        :param page:                    Page in the JSON format
+        """
+
+        records = self.records(page)
+        if len(records) == 0:
+            return
+
+        job = CURRENT_JOB.get()
+        if job is not None:
+            job.checkCancelled()
+
+        chunk = applySchema(pd.DataFrame(data=records, columns=self.columns), self.schema, categorical=False)
+        self.chunks.append(chunk)
+        if job is not None:
+            job.onChunk(chunk)
+        self.buffered_rows += len(chunk)
+        self.rows += len(chunk)
+
+        if self.spill_rows is not None and self.buffered_rows >= self.spill_rows:
+            self.spill()
+
+    def spill(self):
+        """
+        Writes the buffered chunks to one file in a temporary directory and drops them from memory
+        """
+
+        if len(self.chunks) == 0:
+            return
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix='nftscraper-')
+
+        path = os.path.join(self.spill_dir, f'chunk_{len(self.spilled)}.pkl')
+        pd.concat(self.chunks, ignore_index=True).to_pickle(path)
+        self.spilled.append(path)
+        self.chunks = []
+        self.buffered_rows = 0
+
+    def build(self):
+        """
+        Concatenates every chunk, spilled or buffered, into one DataFrame and cleans up the spilled files
+
+        :return:                        Complete Pandas DataFrame
+        """
+
+        frames = [pd.read_pickle(path) for path in self.spilled] + self.chunks
+        if len(frames) == 0:
+            frame = pd.DataFrame(columns=self.columns)
+        else:
+            frame = pd.concat(frames, ignore_index=True)
+
+        # categories are only known once every chunk is in
+        for column, kind in self.schema.items():
+            if kind == 'category' and column in frame.columns:
+                frame[column] = frame[column].astype('category')
+
+        self.chunks = []
+        self.spilled = []
+        self.buffered_rows = 0
+        if self.spill_dir is not None:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+            self.spill_dir = None
+        return frame
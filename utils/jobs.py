@@ -0,0 +1,324 @@
+"""
+This is a helper script to run scrapes in background threads, report their progress and cancel them
+"""
+
+import contextvars
+import inspect
+import threading
+import time
+import uuid
+import pandas as pd
+
+from collections import Counter
+from concurrent.futures import CancelledError, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+
+MAX_WORKERS = 4
+PREVIEW_ROWS = 200
+POLL_SECONDS = 0.25
+KEEP_FINISHED = 900
+
+# load* functions which follow the pagination from their URLs, and the ones fetching exactly their URLs instead, so
+# that a retry of the failed pages does not run on to the pages which came back fine
+PAGINATING_TARGETS = {'loadAndPaginate': 'loadAndSendPayload', 'loadAndSlice': 'loadAndBuild'}
+
+# the job the current thread or task is working for, propagated to the tasks it schedules on the shared event loop
+CURRENT_JOB = contextvars.ContextVar('current_job', default=None)
+
+_MANAGER = None
+_MANAGER_LOCK = threading.Lock()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """
+    Progress, cancellation flag and result of one background scrape
+    """
+
+    def __init__(self, name):
+        """
+        :param name:                    Name of the job shown to the user
+        """
+
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.status = 'queued'
+        self.pages = 0
+        self.expected_pages = None
+        self.rows = 0
+        self.errors = 0
+        self.error_kinds = Counter()
+        self.failures = []
+        self.error = None
+        self.result = None
+        self.target = None
+        self.args = ()
+        self.kwargs = {}
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.preview_chunks = []
+        self.preview_rows = 0
+        self.lock = threading.Lock()
+
+    def addExpectedPages(self, count):
+        with self.lock:
+            self.expected_pages = (self.expected_pages or 0) + count
+
+    def onResponse(self, result):
+        """
+        Counts a response, or an error if the request failed for good, in which case its result is kept without the
+        payload so that the request can be retried on its own later
+
+        :param result:                  FetchResult object
+        """
+
+        with self.lock:
+            self.pages += 1
+            if not result.ok:
+                self.errors += 1
+                self.error_kinds[result.error or 'EmptyResponse'] += 1
+                self.failures.append(result.record())
+
+    def failedURLs(self):
+        """
+        Returns the URLs whose requests failed for good, each once, in the order they failed
+
+        :return:                        List of URLs
+        """
+
+        with self.lock:
+            return list(dict.fromkeys(failure['url'] for failure in self.failures))
+
+    def onChunk(self, chunk):
+        """
+        Counts the rows of a parsed chunk and keeps the first rows as a preview
+
+        :param chunk:                   Pandas DataFrame of the records of one page
+        """
+
+        with self.lock:
+            self.rows += len(chunk)
+            if self.preview_rows < PREVIEW_ROWS:
+                self.preview_chunks.append(chunk.head(PREVIEW_ROWS - self.preview_rows))
+                self.preview_rows += len(self.preview_chunks[-1])
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def isCancelled(self):
+        return self.cancel_event.is_set()
+
+    def isFinished(self):
+        return self.status in ('done', 'failed', 'cancelled')
+
+    def checkCancelled(self):
+        if self.isCancelled():
+            raise JobCancelled(f'Job {self.name} was cancelled.')
+
+    def wait(self, future, timeout=None):
+        """
+        Blocks until a future is done, cancelling the future if the job is cancelled in the meantime
+
+        :param future:                  concurrent.futures.Future object
+        :param timeout:                 Seconds to wait before giving up, None to wait forever
+        :return:                        Result of the future
+        """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if self.isCancelled():
+                future.cancel()
+                raise JobCancelled(f'Job {self.name} was cancelled.')
+
+            wait = POLL_SECONDS if deadline is None else min(POLL_SECONDS, max(0, deadline - time.monotonic()))
+            try:
+                return future.result(wait)
+            except FutureTimeoutError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise
+
+    def eta(self):
+        """
+        Estimates the seconds left from the pace so far
+
+        :return:                        Seconds left, or None if the number of pages is not known up front
+        """
+
+        if self.started_at is None or not self.expected_pages or self.pages == 0:
+            return None
+        elapsed = time.time() - self.started_at
+        return max(0, elapsed / self.pages * (self.expected_pages - self.pages))
+
+    def progress(self):
+        """
+        Returns a snapshot of the progress of the job
+
+        :return:                        Dict of the status, pages fetched, rows parsed, errors and their count per error
+                                        class, elapsed seconds and ETA
+        """
+
+        with self.lock:
+            end = self.finished_at if self.finished_at is not None else time.time()
+            return {'name': self.name,
+                    'status': self.status,
+                    'pages': self.pages,
+                    'expected_pages': self.expected_pages,
+                    'rows': self.rows,
+                    'errors': self.errors,
+                    'error_kinds': dict(self.error_kinds),
+                    'elapsed': end - self.started_at if self.started_at is not None else 0,
+                    'eta': self.eta()}
+
+    def preview(self):
+        """
+        Returns the first rows parsed so far
+
+        :return:                        Pandas DataFrame
+        """
+
+        with self.lock:
+            chunks = list(self.preview_chunks)
+        if len(chunks) == 0:
+            return pd.DataFrame()
+        return pd.concat(chunks, ignore_index=True)
+
+
+class JobManager:
+    """
+    Runs jobs on a bounded pool of background threads and keeps them around until their results are picked up
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, keep_finished=KEEP_FINISHED):
+        """
+        :param max_workers:             Maximum number of jobs running at once, the others wait in the queue
+        :param keep_finished:           Seconds a finished job is kept for its page to pick up its result
+        """
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scrape-job')
+        self.keep_finished = keep_finished
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def submit(self, name, target, *args, result=None, **kwargs):
+        """
+        Queues a function to run in the background
+
+        :param name:                    Name of the job shown to the user
+        :param target:                  Function to run
+        :param args:                    Positional arguments of the function
+        :param result:                  Object to hand back as the result of the job, defaults to the function's return
+        :param kwargs:                  Keyword arguments of the function
+        :return:                        Job object
+        """
+
+        self.prune()
+        job = Job(name)
+        job.target, job.args, job.kwargs = target, args, kwargs
+        with self.lock:
+            self.jobs[job.id] = job
+        self.executor.submit(self.run, job, target, args, kwargs, result)
+        return job
+
+    def run(self, job, target, args, kwargs, result):
+        if job.isCancelled():
+            job.status = 'cancelled'
+            job.finished_at = time.time()
+            return
+
+        job.status = 'running'
+        job.started_at = time.time()
+        token = CURRENT_JOB.set(job)
+        try:
+            value = target(*args, **kwargs)
+            job.result = result if result is not None else value
+            job.status = 'done'
+        except (JobCancelled, CancelledError):
+            job.status = 'cancelled'
+        except Exception as ex:
+            job.error = ex
+            job.status = 'failed'
+        finally:
+            CURRENT_JOB.reset(token)
+            job.finished_at = time.time()
+
+    def retryFailed(self, job, name=None):
+        """
+        Runs a finished job again over only the URLs whose requests failed for good; the target must be a load*
+        function of a marketplace class, which sends the requests of the URLs loaded into the class, and the new job's
+        result holds only what the retry recovered. The failed URLs are single pages, so the retry fetches only them
+        rather than paginating on from each of them
+
+        :param job:                     Finished Job object with failures
+        :param name:                    Name of the new job, defaults to the name of the job
+        :return:                        Job object, or None if no request failed
+        """
+
+        urls = job.failedURLs()
+        if not urls:
+            return None
+
+        scraper = getattr(job.target, '__self__', None)
+        if scraper is None or not hasattr(scraper, 'URLs'):
+            raise ValueError(f'Error: Job {job.name} did not run a load* function of a marketplace class, so its '
+                             f'failed requests cannot be retried on their own.')
+
+        if job.target.__name__ == 'syncEvents':
+            raise ValueError(f'Error: Job {job.name} is an incremental sync, whose watermark stays before its failed '
+                             f'pages, so the next sync fetches them again. Sync again instead of retrying.')
+
+        target = job.target
+        if target.__name__ in PAGINATING_TARGETS:
+            target = getattr(scraper, PAGINATING_TARGETS[target.__name__])
+        accepted = inspect.signature(target).parameters
+        kwargs = {key: value for key, value in job.kwargs.items() if key in accepted}
+        if 'paginate' in accepted:
+            kwargs['paginate'] = False
+
+        if hasattr(scraper, 'resetAll'):
+            scraper.resetAll()
+        scraper.URLs = urls
+        return self.submit(name or job.name, target, *job.args, result=scraper, **kwargs)
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def pop(self, job_id):
+        with self.lock:
+            return self.jobs.pop(job_id, None)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+
+    def prune(self):
+        """
+        Drops the finished jobs whose results were never picked up
+        """
+
+        now = time.time()
+        with self.lock:
+            for job_id, job in list(self.jobs.items()):
+                if job.isFinished() and now - job.finished_at > self.keep_finished:
+                    del self.jobs[job_id]
+
+
+def getJobManager():
+    """
+    Returns the job manager shared by every session in this process
+
+    :return:                        JobManager object
+    """
+
+    global _MANAGER
+
+    with _MANAGER_LOCK:
+        if _MANAGER is None:
+            _MANAGER = JobManager()
+    return _MANAGER
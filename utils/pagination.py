@@ -0,0 +1,533 @@
+"""
+This is a helper script to follow each marketplace API's own pagination until it runs out of data
+"""
+
+import asyncio
+import math
+import time
+
+from datetime import datetime, timezone
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from utils.async_requests import fetch, submit, waitFor
+from utils.decoding import RecordStream
+from utils.response_cache import getResponseCache
+from utils.session_pool import getSessionPool
+
+
+def setQueryParameter(url, key, value):
+    """
+    Returns the URL with one query parameter replaced, added or removed
+
+    :param url:                     URL to modify
+    :param key:                     Name of the query parameter
+    :param value:                   New value of the query parameter, None to remove it
+    :return:                        Modified URL
+    """
+
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != key]
+    if value is not None:
+        query.append((key, value))
+    return urlunsplit(parts._replace(query=urlencode(query, safe=',')))
+
+
+def getQueryParameter(url, key, default=None):
+    """
+    Returns the value of one query parameter in the URL
+
+    :param url:                     URL to read from
+    :param key:                     Name of the query parameter
+    :param default:                 Value returned if the parameter is not in the URL
+    :return:                        Value of the query parameter
+    """
+
+    return dict(parse_qsl(urlsplit(url).query, keep_blank_values=True)).get(key, default)
+
+
+def parseTimestamp(value):
+    """
+    Reads a timestamp given as seconds since the Unix epoch or as an ISO 8601 string, which is taken as UTC if it
+    carries no offset, such as Opensea's created_date
+
+    :param value:                   Seconds, digit string or ISO 8601 string
+    :return:                        Seconds since the Unix epoch as a float, None if the value is empty
+    """
+
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f'Error: Cannot read {value} as a timestamp. Try again.')
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def splitWindow(after, before, parts):
+    """
+    Splits a time window into equal sub-windows on whole seconds; neighbours share their boundary second, so that no
+    event on a boundary is lost whether the API treats the bounds as inclusive or exclusive
+
+    :param after:                   Start of the window in seconds since the Unix epoch
+    :param before:                  End of the window in seconds since the Unix epoch
+    :param parts:                   Number of sub-windows wanted, capped at one per second
+    :return:                        List of (after, before) tuples, oldest first
+    """
+
+    parts = max(1, min(parts, before - after))
+    bounds = [after + (before - after) * part // parts for part in range(parts + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def splitBackwards(after, before, width):
+    """
+    Splits a time window into sub-windows from its end backwards, the newest as wide as given and each older one
+    twice as wide as the one after it, down to the start of the window; neighbours share their boundary second
+
+    :param after:                   Start of the window in seconds since the Unix epoch
+    :param before:                  End of the window in seconds since the Unix epoch
+    :param width:                   Width in seconds of the newest sub-window
+    :return:                        List of (after, before) tuples, newest first
+    """
+
+    windows = []
+    width = max(1, int(width))
+    while before > after:
+        windows.append((max(after, before - width), before))
+        before -= width
+        width *= 2
+    return windows
+
+
+class Pagination:
+    """
+    The Parent Class which defines how the records of a page are found; child classes define how the next page is
+    requested
+    """
+
+    def __init__(self, record_key=None):
+        """
+        :param record_key:              Key of the list of records in each page, None if the page shape is not fixed
+        """
+
+        self.record_key = record_key
+        # records of the requests which failed for good while paging, see FetchResult.record()
+        self.failures = []
+
+    def reset(self):
+        """
+        Forgets what the last run found out, as the same Pagination object is reused across runs
+        """
+
+        self.failures = []
+
+    def records(self, page):
+        """
+        Returns the records in a page, None if the page is missing or is an error response
+
+        :param page:                    Page in the JSON format
+        :return:                        List of records, or None
+        """
+
+        if not isinstance(page, dict):
+            return None
+        if self.record_key is None:
+            return [page]
+        return page.get(self.record_key)
+
+    async def paginate(self, session, url, max_pages=None, callback=None, cache=None, headers=None,
+                       record_stream=None):
+        raise NotImplementedError
+
+
+class OffsetPagination(Pagination):
+    """
+    Pages through APIs which take an offset and a limit, such as Opensea, keeping a bounded number of pages in flight
+    """
+
+    def __init__(self, record_key, offset_param='offset', limit_param='limit', default_limit=20, max_offset=None,
+                 window=4):
+        """
+        :param record_key:              Key of the list of records in each page
+        :param offset_param:            Name of the offset query parameter
+        :param limit_param:             Name of the limit query parameter
+        :param default_limit:           Page size the API uses when the URL does not define one
+        :param max_offset:              Largest offset the API accepts, None if uncapped
+        :param window:                  Maximum number of pages in flight at once
+        """
+
+        super().__init__(record_key)
+        self.offset_param = offset_param
+        self.limit_param = limit_param
+        self.default_limit = default_limit
+        self.max_offset = max_offset
+        self.window = window
+        # URLs whose data went on past the largest offset the API accepts
+        self.capped = []
+
+    def reset(self):
+        super().reset()
+        self.capped = []
+
+    async def paginate(self, session, url, max_pages=None, callback=None, cache=None, headers=None,
+                       record_stream=None):
+        """
+        Requests the next offset as soon as a page comes back, until a page comes back short or empty
+
+        :param session:                 aiohttp ClientSession object
+        :param url:                     URL of the first page
+        :param max_pages:               Maximum number of pages to request, None to follow until the data runs out
+        :param callback:                Optional function which consumes each non-empty page in offset order as soon
+                                        as the pages before it are in, in which case the pages are not kept
+        :param cache:                   Optional ResponseCache object
+        :param headers:                 Optional dict of headers sent with every request
+        :param record_stream:           Optional RecordStream object to pull only the records and fields of interest
+                                        out of each page
+        :return:                        List of non-empty pages in the JSON format, ordered by offset; pages which
+                                        failed for good are left out and kept in self.failures
+        """
+
+        start = int(getQueryParameter(url, self.offset_param, 0))
+        limit = int(getQueryParameter(url, self.limit_param, self.default_limit))
+        next_offset = start
+        requested = 0
+        exhausted = False
+        failed_in_row = 0
+        in_flight = {}
+        finished = {}
+        next_emit = start
+        pages = []
+        emit = callback if callback is not None else pages.append
+
+        while True:
+            # top up the window until the data or the caps run out
+            while not exhausted and len(in_flight) < self.window \
+                    and (max_pages is None or requested < max_pages) \
+                    and (self.max_offset is None or next_offset < self.max_offset):
+                page_url = setQueryParameter(url, self.offset_param, next_offset)
+                task = asyncio.ensure_future(fetch(session, page_url, cache, headers=headers,
+                                                  record_stream=record_stream))
+                in_flight[task] = next_offset
+                next_offset += limit
+                requested += 1
+
+            if not in_flight:
+                break
+
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                offset = in_flight.pop(task)
+                result = task.result()
+                if result.error is not None:
+                    # a page which failed for good is a hole in the data, not its end, so the pages after it are
+                    # still requested, unless a whole window of pages failed in a row and the API is taken as down
+                    self.failures.append(result.record())
+                    finished[offset] = None
+                    failed_in_row += 1
+                    if failed_in_row >= self.window:
+                        exhausted = True
+                    continue
+
+                failed_in_row = 0
+                records = self.records(result.payload)
+                finished[offset] = result.payload if records else None
+                if not records or len(records) < limit:
+                    exhausted = True
+
+            # hand over every page which is now contiguous with the ones already handed over
+            while next_emit in finished:
+                page = finished.pop(next_emit)
+                if page is not None:
+                    emit(page)
+                next_emit += limit
+
+        if not exhausted and self.max_offset is not None and next_offset >= self.max_offset:
+            self.capped.append(url)
+        return pages
+
+
+class TimeSlicedPagination(OffsetPagination):
+    """
+    Pages through more records than the offset cap allows, such as Opensea's event histories, by splitting the time
+    window of the query into sub-windows which are each paged by offset under the cap, all of them concurrently
+
+    A sub-window which comes back full is cut where its pages stopped, and what is left of it is split again: the newest
+    new sub-window is sized for the density of the records just fetched to fill it well under the cap, and each older
+    one is twice as wide, as activity tends to fall off going back in time; any which comes back full again is split
+    the same way, and the records it did return are kept. Records on the shared boundary seconds of sub-windows are
+    deduplicated on their id
+    """
+
+    def __init__(self, record_key, after_param='occurred_after', before_param='occurred_before',
+                 timestamp_key='created_date', id_key='id', shards=8, fill=0.5, earliest=0, **kwargs):
+        """
+        :param record_key:              Key of the list of records in each page
+        :param after_param:             Name of the query parameter of the start of the window
+        :param before_param:            Name of the query parameter of the end of the window
+        :param timestamp_key:           Key of the timestamp of each record
+        :param id_key:                  Key of the unique id of each record
+        :param shards:                  Number of sub-windows the window is first split into, which is also the
+                                        maximum number of sub-windows paged at once
+        :param fill:                    Share of the cap the newest sub-window is sized to hold when a full one is
+                                        split again
+        :param earliest:                Start of the window in seconds since the Unix epoch if the query has none
+        :param kwargs:                  Arguments of OffsetPagination; max_offset is required
+        """
+
+        super().__init__(record_key, **kwargs)
+        if self.max_offset is None:
+            raise ValueError('Error: Time slicing requires an API with an offset cap. Try again.')
+
+        self.after_param = after_param
+        self.before_param = before_param
+        self.timestamp_key = timestamp_key
+        self.id_key = id_key
+        self.shards = shards
+        self.fill = fill
+        self.earliest = earliest
+        self.windows = 0
+        self.truncated = []
+
+    async def paginate(self, session, url, max_pages=None, callback=None, cache=None, headers=None,
+                       record_stream=None):
+        """
+        Pages through every sub-window of the query's time window, splitting again the ones which come back full
+
+        :param session:                 aiohttp ClientSession object
+        :param url:                     URL of the first page of the query
+        :param max_pages:               Maximum number of pages to request per sub-window
+        :param callback:                Optional function which consumes each non-empty page as soon as it can be
+                                        handed over, in which case the pages are not kept
+        :param cache:                   Optional ResponseCache object
+        :param headers:                 Optional dict of headers sent with every request
+        :param record_stream:           Optional RecordStream object to pull only the records and fields of interest
+                                        out of each page; the timestamps and ids are always kept
+        :return:                        List of non-empty pages in the JSON format, by sub-window, newest first within
+                                        each
+        """
+
+        cap = self.max_offset - int(getQueryParameter(url, self.offset_param, 0))
+        limit = int(getQueryParameter(url, self.limit_param, self.default_limit))
+        after = parseTimestamp(getQueryParameter(url, self.after_param))
+        before = parseTimestamp(getQueryParameter(url, self.before_param))
+        after = int(after) if after is not None else int(self.earliest)
+        before = math.ceil(before) if before is not None else int(time.time()) + 1
+
+        if record_stream is not None and record_stream.fields is not None:
+            record_stream = RecordStream(record_stream.record_key,
+                                         record_stream.fields | {self.timestamp_key, self.id_key},
+                                         record_stream.threshold)
+
+        pages = []
+        emit = callback if callback is not None else pages.append
+        semaphore = asyncio.Semaphore(self.shards)
+        # seconds around the boundaries of the sub-windows, the only ones two sub-windows can both return records of,
+        # and the ids of the records already handed over from those seconds
+        edges = set()
+        seen = set()
+
+        def addEdges(windows):
+            for lo, hi in windows:
+                edges.update((lo - 1, lo, lo + 1, hi - 1, hi, hi + 1))
+
+        async def pageWindow(lo, hi):
+            # seconds and ids of the records of the window, at most a cap's worth
+            window = {'records': 0, 'oldest': None, 'stamps': []}
+
+            def onPage(page):
+                records = self.records(page)
+                window['records'] += len(records)
+                kept = []
+                for record in records:
+                    key = record.get(self.id_key) if isinstance(record, dict) else None
+                    second = self.recordSecond(record)
+                    if second is not None:
+                        window['stamps'].append((second, key))
+                        if window['oldest'] is None or second < window['oldest']:
+                            window['oldest'] = second
+                    if key is not None and (second is None or second in edges):
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                    kept.append(record)
+
+                if len(kept) < len(records):
+                    if not kept:
+                        return
+                    page = dict(page)
+                    page[self.record_key] = kept
+                emit(page)
+
+            window_url = setQueryParameter(setQueryParameter(url, self.after_param, lo), self.before_param, hi)
+            async with semaphore:
+                self.windows += 1
+                await OffsetPagination.paginate(self, session, window_url, max_pages, onPage, cache, headers,
+                                                record_stream)
+
+            # failed pages are kept in self.failures to be retried, but they still count towards filling the window,
+            # as the records older than the cap would otherwise never be asked for
+            window_key = setQueryParameter(window_url, self.offset_param, None)
+            failed = sum(setQueryParameter(failure['url'], self.offset_param, None) == window_key
+                         for failure in self.failures)
+            oldest = window['oldest']
+            if window['records'] + failed * limit < cap or oldest is None:
+                return
+
+            # the window came back full, so every record older than the last one fetched is still missing
+            rest = oldest + 1
+            if rest >= hi:
+                # more records than the cap share the newest second, which no narrower window can page through, so
+                # the rest of the window steps back past it
+                if (oldest, oldest + 1) not in self.truncated:
+                    self.truncated.append((oldest, oldest + 1))
+                rest = hi - 1
+            if rest <= lo:
+                return
+
+            density = window['records'] / max(1, hi - oldest)
+            windows = splitBackwards(lo, rest, cap * self.fill / density)
+            addEdges(windows)
+            # the records fetched on the seconds the new windows reach up to would be returned a second time
+            seen.update(key for second, key in window['stamps'] if second <= rest + 1 and key is not None)
+            window['stamps'] = None
+            await asyncio.gather(*(pageWindow(lo, hi) for lo, hi in windows))
+
+        windows = splitWindow(after, before, self.shards)
+        addEdges(windows)
+        await asyncio.gather(*(pageWindow(lo, hi) for lo, hi in windows))
+        return pages
+
+    def recordSecond(self, record):
+        """
+        Returns the second a record occurred at, None if the record has no readable timestamp
+        """
+
+        if not isinstance(record, dict):
+            return None
+        try:
+            stamp = parseTimestamp(record.get(self.timestamp_key))
+        except (ValueError, TypeError):
+            return None
+        return None if stamp is None else int(stamp)
+
+
+class TokenPagination(Pagination):
+    """
+    Follows the next-page token returned in the body of each page, such as ImmutableX's cursor, Rarible's
+    continuation and Mintable's lastKey
+    """
+
+    def __init__(self, token_key, token_param=None, record_key=None, more_key=None):
+        """
+        :param token_key:               Key of the next-page token in each page
+        :param token_param:             Name of the query parameter the token is sent back in, defaults to token_key
+        :param record_key:              Key of the list of records in each page
+        :param more_key:                Key of the flag which tells if more pages remain, None if the API has none
+        """
+
+        super().__init__(record_key)
+        self.token_key = token_key
+        self.token_param = token_param if token_param is not None else token_key
+        self.more_key = more_key
+
+    async def paginate(self, session, url, max_pages=None, callback=None, cache=None, headers=None,
+                       record_stream=None):
+        """
+        Requests the next page as soon as the current one arrives, until no token or an empty page is returned
+
+        :param session:                 aiohttp ClientSession object
+        :param url:                     URL of the first page
+        :param max_pages:               Maximum number of pages to request, None to follow until the data runs out
+        :param callback:                Optional function which consumes each non-empty page as soon as it arrives, in
+                                        which case the pages are not kept
+        :param cache:                   Optional ResponseCache object
+        :param headers:                 Optional dict of headers sent with every request
+        :param record_stream:           Optional RecordStream object to pull only the records and fields of interest
+                                        out of each page
+        :return:                        List of non-empty pages in the JSON format, in the order they were returned;
+                                        a page which failed for good ends the pagination and is kept in
+                                        self.failures
+        """
+
+        pages = []
+        emit = callback if callback is not None else pages.append
+        requested = 0
+        seen = set()
+
+        while max_pages is None or requested < max_pages:
+            result = await fetch(session, url, cache, headers=headers, record_stream=record_stream)
+            requested += 1
+            if result.error is not None:
+                # the next token was in the failed page, so the rest of the data is out of reach until it is retried
+                self.failures.append(result.record())
+                break
+
+            page = result.payload
+            records = self.records(page)
+            if not records:
+                break
+            emit(page)
+
+            token = page.get(self.token_key)
+            if token in (None, '') or token in seen:
+                break
+            if self.more_key is not None and not page.get(self.more_key):
+                break
+
+            seen.add(token)
+            url = setQueryParameter(url, self.token_param, token)
+
+        return pages
+
+
+async def paginate_all(urls, pagination, headers=None, max_pages=None, callback=None, cache=None,
+                       record_stream=None):
+    """
+    Async main function to follow the pagination of every URL concurrently over the session shared by the running
+    event loop
+
+    :param urls:                    List of URLs of the first pages
+    :param pagination:              Pagination object describing how the API pages its data
+    :param headers:                 Optional dict of headers sent with every request
+    :param max_pages:               Maximum number of pages to request per URL
+    :param callback:                Optional function which consumes each page as soon as it can be handed over
+    :param cache:                   Optional ResponseCache object
+    :param record_stream:           Optional RecordStream object to pull only the records and fields of interest out
+                                    of each page
+    :return:                        List of pages in the JSON format, empty if a callback consumed them
+    """
+
+    pagination.reset()
+    session = getSessionPool().session()
+    results = await asyncio.gather(*(pagination.paginate(session, url, max_pages, callback, cache, headers,
+                                                         record_stream) for url in urls))
+    return [page for pages in results for page in pages]
+
+
+def fetchAllPages(urls, pagination, headers=None, max_pages=None, timeout=None, callback=None, use_cache=False,
+                  record_stream=None):
+    """
+    Follows the pagination of every URL on the shared event loop and blocks until the data runs out
+
+    :param urls:                    List of URLs of the first pages
+    :param pagination:              Pagination object describing how the API pages its data
+    :param headers:                 Optional dict of headers sent with every request
+    :param max_pages:               Maximum number of pages to request per URL
+    :param timeout:                 Seconds to wait before giving up, None to wait forever
+    :param callback:                Optional function which consumes each page on the event loop as it arrives
+    :param use_cache:               Serve and store the pages through the shared on-disk response cache
+    :param record_stream:           Optional RecordStream object to pull only the records and fields of interest out
+                                    of each page
+    :return:                        List of pages in the JSON format, empty if a callback consumed them
+    """
+
+    cache = getResponseCache() if use_cache else None
+    return waitFor(submit(paginate_all(urls, pagination, headers=headers, max_pages=max_pages, callback=callback,
+                                       cache=cache, record_stream=record_stream)), timeout)
@@ -0,0 +1,193 @@
+"""
+This is a helper script to profile large DataFrames quickly, either on a random sample of rows or by streaming summary
+statistics chunk by chunk, and to cache the reports per dataset so that a rerun never profiles the same data twice
+"""
+
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+
+from collections import Counter, OrderedDict
+from utils.frame_builder import isNested, serializeNested
+
+
+PROFILE_MODES = ('Sample', 'Chunked', 'Full')
+DEFAULT_SAMPLE_ROWS = 10000
+DEFAULT_CHUNK_ROWS = 50000
+TOP_VALUES = 5
+REPORT_CACHE_SIZE = 16
+
+_REPORTS = OrderedDict()
+_REPORTS_LOCK = threading.Lock()
+
+
+def toHashable(frame):
+    """
+    Serializes the nested JSON columns of a DataFrame into strings, which both the hashing and pandas-profiling need
+
+    :param frame:                   Pandas DataFrame
+    :return:                        Pandas DataFrame without nested values
+    """
+
+    nested = [column for column in frame.columns
+              if frame[column].dtype == object and frame[column].map(isNested).any()]
+    if len(nested) == 0:
+        return frame
+
+    frame = frame.copy()
+    for column in nested:
+        frame[column] = frame[column].map(serializeNested)
+    return frame
+
+
+def datasetHash(frame):
+    """
+    Hashes the contents, columns and dtypes of a DataFrame
+
+    :param frame:                   Pandas DataFrame
+    :return:                        Hex digest of the dataset
+    """
+
+    digest = hashlib.sha256()
+    digest.update(repr([(str(column), str(dtype)) for column, dtype in frame.dtypes.items()]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(toHashable(frame), index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+def sampleFrame(frame, rows=DEFAULT_SAMPLE_ROWS, seed=0):
+    """
+    Draws a reproducible random sample of rows, keeping the dtypes of the frame
+
+    :param frame:                   Pandas DataFrame
+    :param rows:                    Number of rows to keep, None to keep every row
+    :param seed:                    Seed of the sample, so that reruns profile the same rows
+    :return:                        Pandas DataFrame
+    """
+
+    if rows is None or len(frame) <= rows:
+        return frame
+    return frame.sample(n=rows, random_state=seed).sort_index()
+
+
+class ColumnSummary:
+    """
+    Running statistics of one column, merged chunk by chunk so that the column is never held in full
+    """
+
+    def __init__(self, name, dtype):
+        self.name = name
+        self.dtype = dtype
+        self.count = 0
+        self.missing = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.numeric = 0
+        self.minimum = None
+        self.maximum = None
+        self.values = Counter()
+        self.discrete = not (pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_datetime64_any_dtype(dtype)) \
+            or pd.api.types.is_bool_dtype(dtype)
+
+    def update(self, series):
+        """
+        Merges the statistics of one chunk of the column
+
+        :param series:                  Pandas Series of the chunk
+        """
+
+        self.count += len(series)
+        present = series.dropna()
+        self.missing += len(series) - len(present)
+        if len(present) == 0:
+            return
+
+        if pd.api.types.is_numeric_dtype(present) and not pd.api.types.is_bool_dtype(present):
+            values = present.to_numpy(dtype='float64')
+            # merge the chunk's mean and sum of squared deviations into the running ones (Chan et al.)
+            count, mean = len(values), values.mean()
+            m2 = ((values - mean) ** 2).sum()
+            delta = mean - self.mean
+            total = self.numeric + count
+            self.mean += delta * count / total
+            self.m2 += m2 + delta ** 2 * self.numeric * count / total
+            self.numeric = total
+
+        if pd.api.types.is_numeric_dtype(present) or pd.api.types.is_datetime64_any_dtype(present):
+            low, high = present.min(), present.max()
+            self.minimum = low if self.minimum is None else min(self.minimum, low)
+            self.maximum = high if self.maximum is None else max(self.maximum, high)
+
+        # counting every distinct number or timestamp costs more than it tells, so only discrete columns are counted
+        if self.discrete:
+            if present.dtype == object:
+                present = present.map(serializeNested)
+            self.values.update({value: count for value, count in present.value_counts().items() if count > 0})
+
+    def summary(self):
+        std = np.sqrt(self.m2 / (self.numeric - 1)) if self.numeric > 1 else None
+        return {'column': self.name,
+                'dtype': str(self.dtype),
+                'count': self.count,
+                'missing': self.missing,
+                'missing_share': self.missing / self.count if self.count else None,
+                'distinct': len(self.values) if self.discrete else None,
+                'mean': self.mean if self.numeric else None,
+                'std': std,
+                'min': self.minimum,
+                'max': self.maximum,
+                'top_values': ', '.join(f'{value} ({count})' for value, count in self.values.most_common(TOP_VALUES))}
+
+
+def chunkedSummary(frame, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Streams per-column statistics over the DataFrame one chunk of rows at a time, using the real dtypes
+
+    :param frame:                   Pandas DataFrame
+    :param chunk_rows:              Rows per chunk
+    :return:                        Pandas DataFrame with one row of statistics per column
+    """
+
+    summaries = [ColumnSummary(column, dtype) for column, dtype in frame.dtypes.items()]
+    for start in range(0, len(frame), chunk_rows):
+        chunk = frame.iloc[start:start + chunk_rows]
+        for index, summary in enumerate(summaries):
+            summary.update(chunk.iloc[:, index])
+    return pd.DataFrame([summary.summary() for summary in summaries])
+
+
+def profileReport(frame, mode='Sample', rows=DEFAULT_SAMPLE_ROWS):
+    """
+    Profiles a DataFrame, reusing the report of an identical dataset profiled before with the same settings
+
+    :param frame:                   Pandas DataFrame
+    :param mode:                    Sample to run pandas-profiling on a random sample of rows, Chunked to stream summary
+                                    statistics over every row, Full to run pandas-profiling on every row
+    :param rows:                    Rows in the sample of the Sample mode
+    :return:                        HTML of the pandas-profiling report for the Sample and Full modes, Pandas DataFrame
+                                    of the statistics for the Chunked mode
+    """
+
+    if mode not in PROFILE_MODES:
+        raise ValueError(f'Error: Unknown profiling mode {mode}. Use one of {PROFILE_MODES}.')
+
+    key = (datasetHash(frame), mode, rows if mode == 'Sample' else None)
+    with _REPORTS_LOCK:
+        if key in _REPORTS:
+            _REPORTS.move_to_end(key)
+            return _REPORTS[key]
+
+    if mode == 'Chunked':
+        report = chunkedSummary(frame)
+    else:
+        # importing pandas_profiling registers DataFrame.profile_report()
+        import pandas_profiling
+
+        data = toHashable(sampleFrame(frame, rows) if mode == 'Sample' else frame)
+        report = data.profile_report(explorative=True, minimal=True).to_html()
+
+    with _REPORTS_LOCK:
+        _REPORTS[key] = report
+        while len(_REPORTS) > REPORT_CACHE_SIZE:
+            _REPORTS.popitem(last=False)
+    return report
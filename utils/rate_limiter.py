@@ -0,0 +1,190 @@
+"""
+This is a helper script to pace requests per marketplace host and back off when the host pushes back
+"""
+
+import asyncio
+import random
+import threading
+import time
+import weakref
+
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+
+# (requests per second, burst, concurrent requests) allowed per host before any throttling is observed
+DEFAULT_HOST_LIMITS = {'api.opensea.io': (4, 4, 8),
+                       'api.x.immutable.com': (20, 20, 32),
+                       'api.mintable.app': (5, 5, 8),
+                       'api-staging.rarible.com': (10, 10, 16)}
+DEFAULT_LIMITS = (10, 10, 16)
+MIN_RATE = 0.2
+MAX_RETRY_AFTER = 120
+
+_LIMITER = None
+_LIMITER_LOCK = threading.Lock()
+
+
+def parseRetryAfter(value):
+    """
+    Converts a Retry-After header into a number of seconds
+
+    :param value:                   Retry-After header, either a number of seconds or an HTTP date
+    :return:                        Seconds to wait, or None if the header is missing or malformed
+    """
+
+    if not value:
+        return None
+
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0), MAX_RETRY_AFTER)
+
+
+def isThrottled(status, headers):
+    """
+    Checks if a response means that the host is rate limiting us, including Cloudflare challenge pages
+
+    :param status:                  HTTP status code of the response
+    :param headers:                 Headers of the response
+    :return:                        True if the request should be retried later at a lower rate
+    """
+
+    if status == 429:
+        return True
+    if headers.get('cf-mitigated', '').lower() == 'challenge':
+        return True
+    if status in (403, 503) and headers.get('Server', '').lower() == 'cloudflare' \
+            and 'text/html' in headers.get('Content-Type', ''):
+        return True
+    return False
+
+
+def backoff(attempt, base=0.5, cap=30):
+    """
+    Returns a jittered exponential delay
+
+    :param attempt:                 Number of attempts made so far, starting at 0
+    :param base:                    Delay of the first retry in seconds
+    :param cap:                     Largest delay in seconds
+    :return:                        Seconds to wait before the next attempt
+    """
+
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class HostLimiter:
+    """
+    Token bucket plus a concurrency ceiling for one host; the rate is halved on every throttled response and creeps
+    back up towards the initial rate on every successful one
+    """
+
+    def __init__(self, rate, burst, concurrency):
+        """
+        :param rate:                    Requests per second
+        :param burst:                   Number of requests which can be sent back to back
+        :param concurrency:             Maximum number of requests in flight
+        """
+
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """
+        Waits for a concurrency slot and a token
+        """
+
+        await self.semaphore.acquire()
+        try:
+            async with self.lock:
+                while True:
+                    now = time.monotonic()
+                    self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+
+                    wait = self.blocked_until - now
+                    if wait <= 0 and self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    await asyncio.sleep(max(wait, (1 - self.tokens) / self.rate))
+        except BaseException:
+            self.semaphore.release()
+            raise
+
+    def release(self):
+        self.semaphore.release()
+
+    def onThrottle(self, retry_after=None):
+        """
+        Halves the rate and, if the host told us how long to wait, stops all requests to it until then
+
+        :param retry_after:             Seconds to wait from the Retry-After header
+        """
+
+        self.rate = max(MIN_RATE, self.rate / 2)
+        self.tokens = min(self.tokens, 0)
+        if retry_after:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+    def onSuccess(self):
+        """
+        Raises the rate back towards its initial value
+        """
+
+        self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+
+class RateLimiter:
+    """
+    Registry of one HostLimiter per host, shared by every scrape running on the same event loop
+    """
+
+    def __init__(self, host_limits=None, default_limits=DEFAULT_LIMITS):
+        """
+        :param host_limits:             Dict of host to (rate, burst, concurrency), defaults to DEFAULT_HOST_LIMITS
+        :param default_limits:          (rate, burst, concurrency) of hosts not in host_limits
+        """
+
+        self.host_limits = host_limits if host_limits is not None else DEFAULT_HOST_LIMITS
+        self.default_limits = default_limits
+        self.limiters = weakref.WeakKeyDictionary()
+
+    def forURL(self, url):
+        """
+        Returns the limiter of the host of the URL, created on the running event loop on first use
+
+        :param url:                     URL of the request
+        :return:                        HostLimiter object
+        """
+
+        host = urlsplit(url).netloc.lower()
+        limiters = self.limiters.setdefault(asyncio.get_running_loop(), {})
+        if host not in limiters:
+            limiters[host] = HostLimiter(*self.host_limits.get(host, self.default_limits))
+        return limiters[host]
+
+
+def getRateLimiter():
+    """
+    Returns the rate limiter shared by every scrape in this process
+
+    :return:                        RateLimiter object
+    """
+
+    global _LIMITER
+
+    with _LIMITER_LOCK:
+        if _LIMITER is None:
+            _LIMITER = RateLimiter()
+    return _LIMITER
@@ -0,0 +1,275 @@
+"""
+This is a helper script to cache API responses on disk between scrapes
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from utils.decoding import loads, dumps
+
+
+# seconds a response stays fresh, matched against the host and path of the URL; the first match wins
+DEFAULT_TTLS = [('api.opensea.io/api/v1/events', 60),
+                ('api.opensea.io/api/v1/assets', 900),
+                ('api.opensea.io/api/v1/bundles', 900),
+                ('api.opensea.io/api/v1/collections', 3600),
+                ('api.x.immutable.com/v1/assets', 900),
+                ('api.x.immutable.com/v1/collections', 3600),
+                ('api.x.immutable.com/v1/tokens', 86400),
+                ('api.mintable.app', 600),
+                ('rarible.com', 600)]
+DEFAULT_TTL = 300
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_CACHE_DIR = os.path.join(os.getcwd(), '.cache', 'responses')
+# query parameters holding credentials, which tell requests apart in the cache key but are never written to disk
+SECRET_PARAMS = ('X-API-KEY',)
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def normalizeURL(url):
+    """
+    Normalizes a URL so that equivalent requests share a cache key
+
+    :param url:                     URL to normalize
+    :return:                        URL with a lowercase scheme and host, an empty path as /, sorted query parameters
+                                    and no fragment
+    """
+
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)), safe=',')
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', query, ''))
+
+
+def redactURL(url, secret_params=SECRET_PARAMS):
+    """
+    Normalizes a URL without its credentials, as kept in the entries of the cache
+
+    :param url:                     URL to redact
+    :param secret_params:           Query parameters holding credentials
+    :return:                        Normalized URL without the credential parameters
+    """
+
+    parts = urlsplit(url)
+    query = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+             if name not in secret_params]
+    return normalizeURL(urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query, safe=','), '')))
+
+
+class ResponseCache:
+    """
+    Stores one JSON file per response, keyed by the normalized URL plus the request headers, with per-endpoint TTLs,
+    ETag/Last-Modified revalidation and least-recently-used eviction once the cache outgrows its size bound; every
+    method does blocking file I/O, so coroutines call them through asyncio.to_thread()
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, ttls=None, default_ttl=DEFAULT_TTL):
+        """
+        :param cache_dir:               Directory to store the responses in
+        :param max_bytes:               Total size of the cache after which the least recently used responses are
+                                        evicted
+        :param ttls:                    List of (host and path prefix, seconds) pairs, defaults to DEFAULT_TTLS
+        :param default_ttl:             Seconds a response stays fresh if no prefix matches
+        """
+
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttls = ttls if ttls is not None else DEFAULT_TTLS
+        self.default_ttl = default_ttl
+        self.index = None
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def key(self, url, headers=None):
+        """
+        Returns the cache key of a request
+
+        :param url:                     URL of the request
+        :param headers:                 Dict of headers sent with the request
+        :return:                        Hex digest identifying the request
+        """
+
+        headers = sorted((str(k).lower(), str(v)) for k, v in (headers or {}).items())
+        return hashlib.sha256(json.dumps([normalizeURL(url), headers]).encode('utf-8')).hexdigest()
+
+    def ttl(self, url):
+        """
+        Returns the number of seconds a response of this URL stays fresh
+
+        :param url:                     URL of the request
+        :return:                        TTL in seconds
+        """
+
+        parts = urlsplit(url)
+        location = f'{parts.netloc.lower()}{parts.path}'
+        for prefix, seconds in self.ttls:
+            if prefix in location:
+                return seconds
+        return self.default_ttl
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.json')
+
+    def loadIndex(self):
+        """
+        Builds the in-memory index of entry sizes and last access times from the cache directory on first use
+        """
+
+        if self.index is not None:
+            return
+
+        self.index = {}
+        self.total_bytes = 0
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.json'):
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                    self.index[name[:-5]] = [stat.st_size, stat.st_mtime]
+                    self.total_bytes += stat.st_size
+
+    def get(self, url, headers=None):
+        """
+        Returns the cached entry of a request, fresh or stale
+
+        :param url:                     URL of the request
+        :param headers:                 Dict of headers sent with the request
+        :return:                        Dict with the payload, validators and storage time, or None on a miss
+        """
+
+        key = self.key(url, headers)
+        with self.lock:
+            self.loadIndex()
+            if key not in self.index:
+                return None
+
+            try:
+                with open(self.path(key), 'rb') as f:
+                    entry = loads(f.read())
+            except (OSError, ValueError):
+                self.discard(key)
+                return None
+
+            # mark as recently used
+            now = time.time()
+            self.index[key][1] = now
+            os.utime(self.path(key), (now, now))
+        return entry
+
+    def isFresh(self, entry):
+        """
+        Checks if an entry can be served without contacting the API
+
+        :param entry:                   Entry returned by get()
+        :return:                        True if the entry is younger than its TTL
+        """
+
+        return time.time() - entry['stored_at'] < entry['ttl']
+
+    def validators(self, entry):
+        """
+        Returns the conditional request headers used to revalidate a stale entry
+
+        :param entry:                   Entry returned by get()
+        :return:                        Dict of If-None-Match/If-Modified-Since headers, empty if the entry has none
+        """
+
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, url, headers, payload, etag=None, last_modified=None):
+        """
+        Stores a response and evicts the least recently used entries if the cache outgrows its size bound
+
+        :param url:                     URL of the request
+        :param headers:                 Dict of headers sent with the request
+        :param payload:                 Response in the JSON format
+        :param etag:                    ETag header of the response
+        :param last_modified:           Last-Modified header of the response
+        """
+
+        key = self.key(url, headers)
+        entry = {'url': redactURL(url),
+                 'stored_at': time.time(),
+                 'ttl': self.ttl(url),
+                 'etag': etag,
+                 'last_modified': last_modified,
+                 'payload': payload}
+        data = dumps(entry)
+
+        with self.lock:
+            self.loadIndex()
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self.path(key), 'wb') as f:
+                f.write(data)
+
+            if key in self.index:
+                self.total_bytes -= self.index[key][0]
+            self.index[key] = [len(data), time.time()]
+            self.total_bytes += len(data)
+            self.evict()
+
+    def refresh(self, url, headers, entry):
+        """
+        Restarts the TTL of an entry after the API confirmed it is unchanged
+
+        :param url:                     URL of the request
+        :param headers:                 Dict of headers sent with the request
+        :param entry:                   Entry returned by get()
+        """
+
+        self.put(url, headers, entry['payload'], entry.get('etag'), entry.get('last_modified'))
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits its size bound
+        """
+
+        if self.total_bytes <= self.max_bytes:
+            return
+
+        for key, _ in sorted(self.index.items(), key=lambda item: item[1][1]):
+            self.discard(key)
+            if self.total_bytes <= self.max_bytes:
+                break
+
+    def discard(self, key):
+        if key in self.index:
+            self.total_bytes -= self.index.pop(key)[0]
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        """
+        Removes every cached response
+        """
+
+        with self.lock:
+            self.loadIndex()
+            for key in list(self.index):
+                self.discard(key)
+
+
+def getResponseCache():
+    """
+    Returns the response cache shared by every scrape in this process
+
+    :return:                        ResponseCache object
+    """
+
+    global _CACHE
+
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = ResponseCache(cache_dir=os.environ.get('NFTSCRAPER_CACHE_DIR', DEFAULT_CACHE_DIR))
+    return _CACHE
@@ -0,0 +1,215 @@
+"""
+This is a helper script to keep the DataFrames of finished scrapes in memory across Streamlit reruns, keyed by a
+fingerprint of the query, so that changing how a result is displayed or exported never sends the query again
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+from collections import OrderedDict
+
+
+DEFAULT_MAX_BYTES = int(os.environ.get('NFTSCRAPER_RESULT_CACHE_MB', 512)) * 1024 * 1024
+# arguments of the load* functions which change how a result is built, not which records it holds
+IGNORED_ARGUMENTS = ('columns', 'spill_rows', 'use_cache')
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def fingerprint(scraper, target, args=(), kwargs=None):
+    """
+    Hashes everything that decides which records a scrape returns: the marketplace, the class, its URLs and headers,
+    and the function run with its arguments
+
+    :param scraper:                 Marketplace class with its URLs set
+    :param target:                  Function doing the scrape
+    :param args:                    Positional arguments of the function
+    :param kwargs:                  Keyword arguments of the function
+    :return:                        Hex digest of the query
+    """
+
+    def describe(value):
+        return getattr(value, '__name__', repr(value))
+
+    query = {'marketplace': getattr(scraper, 'marketplace', None),
+             'class': type(scraper).__name__,
+             'urls': list(scraper.URLs),
+             'headers': sorted(getattr(scraper, 'headers', {}).items()),
+             'target': describe(target),
+             'args': [describe(arg) for arg in args],
+             'kwargs': sorted((key, describe(value)) for key, value in (kwargs or {}).items()
+                              if key not in IGNORED_ARGUMENTS)}
+    return hashlib.sha256(json.dumps(query, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def selectColumns(frame, columns=None):
+    """
+    Keeps the columns asked for which the frame has, in the order asked for
+
+    :param frame:                   Pandas DataFrame
+    :param columns:                 Columns to keep, None or empty to keep all columns
+    :return:                        Pandas DataFrame
+    """
+
+    if not columns:
+        return frame
+    return frame[[column for column in columns if column in frame.columns]]
+
+
+def discardExport(value):
+    """
+    Releases an export kept beside a result, such as the temporary file of an ExportFile
+    """
+
+    if hasattr(value, 'discard'):
+        value.discard()
+
+
+class ResultCache:
+    """
+    Least-recently-used cache of result DataFrames, and of the exports derived from them, held within a memory budget;
+    exports which sit on disk are deleted together with their result
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        :param max_bytes:               Memory budget across every entry; the newest entry is always kept, even if it
+                                        is larger than the budget on its own
+        """
+
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def sizeOf(value):
+        if hasattr(value, 'memory_usage'):
+            return int(value.memory_usage(index=True, deep=True).sum())
+        return len(value)
+
+    def put(self, key, frame, columns=None):
+        """
+        Stores the result of a query, evicting the least recently used results until the budget holds
+
+        :param key:                     Fingerprint of the query
+        :param frame:                   Pandas DataFrame of the result
+        :param columns:                 Columns the result was built with, None or empty if it holds every column
+        """
+
+        entry = {'frame': frame, 'columns': set(columns) if columns else None, 'exports': {},
+                 'bytes': self.sizeOf(frame)}
+        with self.lock:
+            self.discardLocked(key)
+            self.entries[key] = entry
+            self.used_bytes += entry['bytes']
+            self.evictLocked()
+
+    def get(self, key, columns=None):
+        """
+        Returns the result of a query if it is cached and holds every column asked for
+
+        :param key:                     Fingerprint of the query
+        :param columns:                 Columns needed, an empty list if every column is needed, None to take the
+                                        result with whichever columns it holds
+        :return:                        Pandas DataFrame, or None on a miss
+        """
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or (columns is not None and entry['columns'] is not None
+                                 and (len(columns) == 0 or not set(columns) <= entry['columns'])):
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry['frame']
+
+    def export(self, key, name, build):
+        """
+        Returns an export of a cached result, such as its CSV bytes, building it only the first time it is asked for
+
+        :param key:                     Fingerprint of the query
+        :param name:                    Hashable name of the export, unique per format and column selection
+        :param build:                   Function taking the cached DataFrame and returning the export
+        :return:                        Export, or None if the result is not cached
+        """
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if name in entry['exports']:
+                self.entries.move_to_end(key)
+                return entry['exports'][name]
+            frame = entry['frame']
+
+        value = build(frame)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and name not in entry['exports']:
+                entry['exports'][name] = value
+                entry['bytes'] += self.sizeOf(value)
+                self.used_bytes += self.sizeOf(value)
+                self.entries.move_to_end(key)
+                self.evictLocked()
+                return value
+            stored = entry['exports'][name] if entry is not None else None
+
+        # another session built the same export in the meantime, or the result was evicted while building it
+        discardExport(value)
+        return stored
+
+    def discard(self, key):
+        with self.lock:
+            self.discardLocked(key)
+
+    def discardLocked(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.used_bytes -= entry['bytes']
+            for value in entry['exports'].values():
+                discardExport(value)
+
+    def evictLocked(self):
+        while self.used_bytes > self.max_bytes and len(self.entries) > 1:
+            self.discardLocked(next(iter(self.entries)))
+            self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            for key in list(self.entries):
+                self.discardLocked(key)
+
+    def stats(self):
+        """
+        Returns the usage of the cache
+
+        :return:                        Dict of the number of entries, bytes used, budget, hits, misses and evictions
+        """
+
+        with self.lock:
+            return {'entries': len(self.entries), 'used_bytes': self.used_bytes, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+def getResultCache():
+    """
+    Returns the result cache shared by every session in this process
+
+    :return:                        ResultCache object
+    """
+
+    global _CACHE
+
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = ResultCache()
+    return _CACHE
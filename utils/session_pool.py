@@ -0,0 +1,91 @@
+"""
+This is a helper script to share long-lived HTTP sessions between scrapes so that connections, DNS lookups and TLS
+handshakes are reused
+"""
+
+import asyncio
+import threading
+import weakref
+import aiohttp
+
+
+DEFAULT_LIMIT = 100
+DEFAULT_LIMIT_PER_HOST = 32
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 60
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=300, sock_connect=30)
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+class SessionPool:
+    """
+    Keeps one aiohttp ClientSession per event loop, backed by a connector with per-host connection limits, a DNS cache
+    and keep-alive; request headers are sent per request so that scrapes with different API keys share the same
+    connections
+    """
+
+    def __init__(self, limit=DEFAULT_LIMIT, limit_per_host=DEFAULT_LIMIT_PER_HOST, dns_cache_ttl=DNS_CACHE_TTL,
+                 keepalive_timeout=KEEPALIVE_TIMEOUT, timeout=DEFAULT_TIMEOUT, trace_configs=None):
+        """
+        :param limit:                   Maximum number of open connections across every host
+        :param limit_per_host:          Maximum number of open connections to one host
+        :param dns_cache_ttl:           Seconds a resolved address is reused before it is looked up again
+        :param keepalive_timeout:       Seconds an idle connection is kept open for the next request
+        :param timeout:                 aiohttp ClientTimeout applied to every request
+        :param trace_configs:           Optional list of aiohttp TraceConfig objects attached to new sessions
+        """
+
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        self.trace_configs = list(trace_configs or [])
+        self.sessions = weakref.WeakKeyDictionary()
+
+    def session(self):
+        """
+        Returns the session of the running event loop, opening it on first use or if it was closed
+
+        :return:                        aiohttp ClientSession object
+        """
+
+        loop = asyncio.get_running_loop()
+        session = self.sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit,
+                                             limit_per_host=self.limit_per_host,
+                                             use_dns_cache=True,
+                                             ttl_dns_cache=self.dns_cache_ttl,
+                                             keepalive_timeout=self.keepalive_timeout,
+                                             enable_cleanup_closed=True)
+            session = aiohttp.ClientSession(connector=connector, timeout=self.timeout,
+                                            trace_configs=self.trace_configs or None)
+            self.sessions[loop] = session
+        return session
+
+    async def close(self):
+        """
+        Closes the session of the running event loop, if any
+        """
+
+        session = self.sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None and not session.closed:
+            await session.close()
+
+
+def getSessionPool():
+    """
+    Returns the session pool shared by every scrape in this process
+
+    :return:                        SessionPool object
+    """
+
+    global _POOL
+
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = SessionPool()
+    return _POOL
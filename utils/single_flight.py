@@ -0,0 +1,113 @@
+"""
+This is a helper script to coalesce identical requests which are in flight at the same time, so that concurrent scrapes
+asking for the same page share one upstream call instead of each sending their own
+"""
+
+import asyncio
+import hashlib
+import threading
+import weakref
+
+from utils.response_cache import normalizeURL
+
+
+# headers which change what the API returns to the caller; every other header only changes how it is sent
+SCOPE_HEADERS = ('authorization', 'x-api-key', 'cookie')
+
+_FLIGHT = None
+_FLIGHT_LOCK = threading.Lock()
+
+
+def authScope(headers):
+    """
+    Hashes the credentials sent with a request, so that callers with different API keys never share a response
+
+    :param headers:                 Dict of headers sent with the request, or None
+    :return:                        Hex digest of the credentials, empty for anonymous requests
+    """
+
+    scope = sorted((key.lower(), str(value)) for key, value in (headers or {}).items()
+                   if key.lower() in SCOPE_HEADERS)
+    if not scope:
+        return ''
+    return hashlib.sha256(repr(scope).encode('utf-8')).hexdigest()
+
+
+def requestKey(url, headers=None):
+    return normalizeURL(url), authScope(headers)
+
+
+class SingleFlight:
+    """
+    Keeps the upstream call of every request in flight on each event loop; a caller asking for a request which is
+    already in flight waits for that call instead of starting its own, and the call is only cancelled once every
+    caller waiting for it has been cancelled
+    """
+
+    def __init__(self):
+        self.calls = weakref.WeakKeyDictionary()
+        self.started = 0
+        self.shared = 0
+
+    async def do(self, key, function):
+        """
+        Runs the coroutine function once per key at a time, handing its result to every caller which asked for the
+        same key while it ran
+
+        :param key:                     Hashable key of the request, see requestKey()
+        :param function:                Function returning the coroutine of the upstream call
+        :return:                        Result of the call
+        """
+
+        loop = asyncio.get_running_loop()
+        calls = self.calls.setdefault(loop, {})
+        call = calls.get(key)
+        if call is None:
+            task = loop.create_task(function())
+            call = {'task': task, 'waiters': 0}
+            calls[key] = call
+
+            def land(_):
+                # a later call for the key may already have taken this one's place
+                if calls.get(key) is call:
+                    del calls[key]
+
+            task.add_done_callback(land)
+            self.started += 1
+        else:
+            self.shared += 1
+
+        call['waiters'] += 1
+        try:
+            # shielded, so that one caller being cancelled never cancels the call under the others
+            return await asyncio.shield(call['task'])
+        except asyncio.CancelledError:
+            if not call['task'].done() and call['waiters'] == 1:
+                call['task'].cancel()
+            raise
+        finally:
+            call['waiters'] -= 1
+
+    def stats(self):
+        """
+        Returns how many upstream calls were started and how many callers shared a call started by another
+
+        :return:                        Dict of started and shared calls
+        """
+
+        return {'started': self.started, 'shared': self.shared}
+
+
+def getSingleFlight():
+    """
+    Returns the single-flight layer shared by every scrape in this process
+
+    :return:                        SingleFlight object
+    """
+
+    global _FLIGHT
+
+    with _FLIGHT_LOCK:
+        if _FLIGHT is None:
+            _FLIGHT = SingleFlight()
+    return _FLIGHT
@@ -0,0 +1,143 @@
+"""
+This is a helper script to keep a local store and a high-water mark per query for incremental syncs
+"""
+
+import hashlib
+import json
+import os
+import pandas as pd
+
+from utils.pagination import setQueryParameter
+from utils.response_cache import normalizeURL
+
+
+DEFAULT_SYNC_DIR = os.path.join(os.environ.get('NFTSCRAPER_DATA_DIR', os.path.join(os.getcwd(), 'data')), 'sync')
+# query parameters which do not change the identity of a query synced over and over
+SYNC_IGNORED_PARAMS = ('offset', 'limit', 'occurred_after', 'X-API-KEY')
+
+
+def queryKey(url, ignored_params=SYNC_IGNORED_PARAMS):
+    """
+    Returns the URL of a query without the pagination, watermark and API key parameters, normalized so that the same
+    query always maps to the same string
+
+    :param url:                     URL of the query
+    :param ignored_params:          Query parameters which do not change the identity of the query
+    :return:                        Normalized URL
+    """
+
+    for param in ignored_params:
+        url = setQueryParameter(url, param, None)
+    return normalizeURL(url)
+
+
+def queryScope(urls, ignored_params=SYNC_IGNORED_PARAMS):
+    """
+    Returns a short hash identifying a set of queries across runs, such as the queries behind one scrape
+
+    :param urls:                    List of URLs of the queries
+    :param ignored_params:          Query parameters which do not change the identity of a query
+    :return:                        Hex digest of 16 characters
+    """
+
+    queries = sorted({queryKey(url, ignored_params) for url in urls})
+    return hashlib.sha256('\n'.join(queries).encode('utf-8')).hexdigest()[:16]
+
+
+class SyncStore:
+    """
+    Stores every record synced for one query together with the high-water mark of the last sync; the query is
+    identified by its URL without the pagination, watermark and API key parameters
+    """
+
+    def __init__(self, url, store_dir=DEFAULT_SYNC_DIR, ignored_params=SYNC_IGNORED_PARAMS):
+        """
+        :param url:                     URL of the query
+        :param store_dir:               Directory holding one sub-directory per query
+        :param ignored_params:          Query parameters which do not change the identity of the query
+        """
+
+        self.query = queryKey(url, ignored_params)
+        self.key = hashlib.sha256(self.query.encode('utf-8')).hexdigest()[:16]
+        self.path = os.path.join(store_dir, self.key)
+        self.frame_path = os.path.join(self.path, 'records.pkl')
+        self.state_path = os.path.join(self.path, 'state.json')
+
+    def loadWatermark(self):
+        """
+        Returns the high-water mark of the last sync
+
+        :return:                        Seconds since the Unix epoch, or None if the query was never synced
+        """
+
+        if not os.path.exists(self.state_path):
+            return None
+        with open(self.state_path, 'r') as f:
+            return json.load(f).get('watermark')
+
+    def loadFrame(self):
+        """
+        Returns every record synced so far
+
+        :return:                        Pandas DataFrame, empty if the query was never synced
+        """
+
+        if not os.path.exists(self.frame_path):
+            return pd.DataFrame()
+        return pd.read_pickle(self.frame_path)
+
+    def unseen(self, frame, key='id'):
+        """
+        Returns the records of a fetch which are not in the store yet, such as the ones to append to an archive, as a
+        fetch from just before the high-water mark gets some stored records again
+
+        :param frame:                   Pandas DataFrame of the newly fetched records
+        :param key:                     Column which uniquely identifies a record
+        :return:                        Pandas DataFrame of the records whose key was never synced
+        """
+
+        stored = self.loadFrame()
+        if key not in frame.columns or key not in stored.columns:
+            return frame
+        return frame[~frame[key].isin(stored[key])].reset_index(drop=True)
+
+    def merge(self, frame, key='id', timestamp='created_date', advance=True, ceiling=None):
+        """
+        Merges newly fetched records into the store, deduplicating on the key, and moves the high-water mark to the
+        newest record
+
+        :param frame:                   Pandas DataFrame of the newly fetched records
+        :param key:                     Column which uniquely identifies a record
+        :param timestamp:               Column holding the time of each record
+        :param advance:                 Move the high-water mark; False keeps the previous one, for a fetch which left
+                                        holes in the records, so that the next sync asks for the same window again
+        :param ceiling:                 Seconds since the Unix epoch the high-water mark may not move past, such as the
+                                        second of records which could not all be fetched, None for no ceiling
+        :return:                        Complete Pandas DataFrame of every record synced for the query, newest first
+        """
+
+        stored = self.loadFrame()
+        merged = pd.concat([stored, frame], ignore_index=True) if len(stored) > 0 else frame
+        if len(merged) == 0:
+            return merged
+
+        if key in merged.columns:
+            merged = merged.drop_duplicates(subset=key, keep='last')
+
+        watermark = self.loadWatermark()
+        if timestamp in merged.columns:
+            times = pd.to_datetime(merged[timestamp], errors='coerce', utc=True)
+            merged = merged.loc[times.sort_values(ascending=False, na_position='last').index].reset_index(drop=True)
+            if advance and times.notna().any():
+                watermark = int(times.max().timestamp())
+                if ceiling is not None:
+                    watermark = min(watermark, int(ceiling))
+
+        os.makedirs(self.path, exist_ok=True)
+        merged.to_pickle(f'{self.frame_path}.tmp')
+        os.replace(f'{self.frame_path}.tmp', self.frame_path)
+        with open(f'{self.state_path}.tmp', 'w') as f:
+            json.dump({'query': self.query, 'watermark': watermark, 'records': len(merged)}, f)
+        os.replace(f'{self.state_path}.tmp', self.state_path)
+
+        return merged
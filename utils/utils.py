@@ -2,28 +2,401 @@
 This file contains all the helper functions that is used across the app
 """
 
+import copy
+import time
 import pandas
 import streamlit as st
-import pandas_profiling
+import streamlit.components.v1 as components
 
-from streamlit_pandas_profiling import st_profile_report
+from utils.jobs import getJobManager, POLL_SECONDS
+from utils.result_cache import getResultCache, fingerprint, selectColumns
+from utils.sync_store import queryScope
+from utils.profiling import profileReport, DEFAULT_SAMPLE_ROWS
+from utils.exporter import ExportFile, EXPORT_FORMATS, MAX_DOWNLOAD_BYTES
+from analytics.rarity import rankRarity
+from analytics.sales import getSalesSeries
 
 
-def assertType(default, test, conditions=None):
-    if isinstance(test, default):
-        if conditions is not None:
-            if test in conditions:
-                return True
-            else:
-                raise AssertionError(f'{test} is not one of the accepted parameter {conditions}')
-        else:
-            return True
+class SessionConfig:
+    """
+    Copy of the constants of a page's config module which belongs to one browser session
+    """
+
+    def __init__(self, module):
+        for name, value in vars(module).items():
+            if name.isupper():
+                setattr(self, name, copy.deepcopy(value))
+
+
+def getSessionConfig(module):
+    """
+    Returns the current browser session's own copy of a page's config module, so that concurrent sessions never
+    overwrite each other's inputs through the module shared by the process
+
+    Parameter
+    ----------
+    module:                             Config module of the page
+    ----------
+    """
+
+    key = f'config_{module.__name__}'
+    if key not in st.session_state:
+        st.session_state[key] = SessionConfig(module)
+    return st.session_state[key]
+
+
+def startJob(key, scraper, target, *args, reuse_result=True, **kwargs):
+    """
+    Runs a scrape in the background and remembers its job in the current browser session; the page picks the result
+    up with showJob() and showResult() on the reruns that follow. A query whose result is still in the result cache
+    is not sent again, unless the scrape is asked not to use cached responses
+
+    Parameter
+    ----------
+    key:                                Name of the job slot in the session, one per kind of scrape
+    scraper:                            Marketplace class handed back by showJob() once the scrape is done
+    target:                             Function doing the scrape, usually a load* function of the scraper
+    args:                               Positional arguments of the function
+    reuse_result:                       Serve the query from the result cache if it was scraped before; turn off
+                                        for scrapes whose result changes on every run, such as incremental syncs
+    kwargs:                             Keyword arguments of the function
+    ----------
+    """
+
+    previous = st.session_state.get(f'job_{key}')
+    if previous is not None:
+        getJobManager().cancel(previous)
+        del st.session_state[f'job_{key}']
+    st.session_state.pop(f'failed_{key}', None)
+    st.session_state.pop(f'retry_{key}', None)
+
+    query = fingerprint(scraper, target, args, kwargs)
+    columns = kwargs.get('columns')
+    # the query the records come from, whatever window or page of it was fetched, for state kept across scrapes
+    st.session_state[f'scope_{key}'] = queryScope(scraper.URLs)
+    if reuse_result and kwargs.get('use_cache', True) and getResultCache().get(query, columns) is not None:
+        st.session_state[f'result_{key}'] = query
+        scraper.resetAll()
+        return
+
+    job = getJobManager().submit(key, target, *args, result=scraper, **kwargs)
+    st.session_state[f'job_{key}'] = job.id
+    st.session_state[f'query_{key}'] = (query, columns)
+
+
+def showJob(key):
+    """
+    Renders the progress, a cancel button and the partial results of the job started with startJob() while it runs,
+    polling until it finishes
+
+    Parameter
+    ----------
+    key:                                Name of the job slot in the session
+    ----------
+
+    Returns
+    ----------
+    The scraper once the job is done, None while it runs or if it failed or was cancelled
+    ----------
+    """
+
+    job_id = st.session_state.get(f'job_{key}')
+    if job_id is None:
+        return None
+
+    manager = getJobManager()
+    job = manager.get(job_id)
+    if job is None:
+        del st.session_state[f'job_{key}']
+        return None
+
+    if not job.isFinished():
+        progress = job.progress()
+        st.markdown('### Extraction Progress')
+        if progress['expected_pages']:
+            st.progress(min(1.0, progress['pages'] / progress['expected_pages']))
+        eta = f'{progress["eta"]:.0f}s' if progress['eta'] is not None else 'unknown'
+        st.info(f'**Status**: {progress["status"]} | **Pages Fetched**: {progress["pages"]} | '
+                f'**Rows Parsed**: {progress["rows"]} | **Errors**: {progress["errors"]} | '
+                f'**Elapsed**: {progress["elapsed"]:.0f}s | **ETA**: {eta}')
+        if st.button('Cancel Extraction', key=f'cancel_{key}'):
+            job.cancel()
+
+        preview = job.preview()
+        if len(preview) > 0:
+            st.markdown('### Partial Results')
+            st.dataframe(preview, height=300, width=800)
+
+        time.sleep(POLL_SECONDS * 4)
+        st.experimental_rerun()
+
+    manager.pop(job_id)
+    del st.session_state[f'job_{key}']
+    query, columns = st.session_state.pop(f'query_{key}', (None, None))
+
+    retried = st.session_state.pop(f'retry_{key}', False)
+
+    if job.status == 'cancelled':
+        st.warning(f'Extraction cancelled after {job.pages} pages.')
+        return None
+    if job.status == 'failed':
+        st.error(f'Error: {job.error}')
+        return None
+
+    frame = job.result.response_frame
+    if retried and query is not None:
+        # a retry only fetched the requests which failed, so what it recovered is added to the earlier result
+        earlier = getResultCache().get(query)
+        if earlier is not None:
+            frame = mergeRecovered(earlier, frame)
+    if query is not None:
+        getResultCache().put(query, frame, columns)
+    st.session_state[f'result_{key}'] = query
+
+    if job.failures:
+        kinds = ', '.join(f'{kind}: {count}' for kind, count in job.error_kinds.most_common())
+        st.warning(f'{job.errors} of {job.pages} requests failed ({kinds}). Retry them from the results below.')
+        st.session_state[f'failed_{key}'] = (job, query, columns)
+    else:
+        st.session_state.pop(f'failed_{key}', None)
+    return job.result
+
+
+def mergeRecovered(earlier, recovered):
+    """
+    Adds the rows recovered by retrying failed requests to the result they were missing from; pages which were
+    fetched again while resuming a pagination are dropped as duplicates
+
+    Parameter
+    ----------
+    earlier:                            Pandas DataFrame of the result with the failed requests missing
+    recovered:                          Pandas DataFrame of the rows the retry fetched
+    ----------
+    """
+
+    if len(recovered) == 0:
+        return earlier
+    return pandas.concat([earlier, recovered], ignore_index=True).drop_duplicates(ignore_index=True)
+
+
+def retryFailed(key):
+    """
+    Runs the last scrape of the job slot again in the background over only the requests which failed for good, to be
+    merged into the result shown by showResult() once it is done
+
+    Parameter
+    ----------
+    key:                                Name of the job slot in the session
+    ----------
+    """
+
+    failed = st.session_state.get(f'failed_{key}')
+    if failed is None:
+        return
+
+    job, query, columns = failed
+    try:
+        retry = getJobManager().retryFailed(job)
+    except ValueError as ex:
+        st.error(str(ex))
+        return
+    st.session_state.pop(f'failed_{key}')
+    if retry is not None:
+        st.session_state[f'job_{key}'] = retry.id
+        st.session_state[f'query_{key}'] = (query, columns)
+        st.session_state[f'retry_{key}'] = True
+
+
+def showFailures(key):
+    """
+    Renders the requests of the last scrape of the job slot which failed for good, with a button retrying only them
+
+    Parameter
+    ----------
+    key:                                Name of the job slot in the session
+    ----------
+    """
+
+    failed = st.session_state.get(f'failed_{key}')
+    if failed is None:
+        return
+
+    job = failed[0]
+    with st.expander(f'{len(job.failedURLs())} Failed Requests'):
+        st.dataframe(pandas.DataFrame(job.failures), height=300, width=800)
+    if st.button('Retry Failed Requests Only', key=f'retry_{key}_button'):
+        retryFailed(key)
+        if f'failed_{key}' not in st.session_state:
+            st.experimental_rerun()
+
+
+def showResult(key, columns=None):
+    """
+    Returns the result of the last scrape of the job slot from the result cache, so that the page can display and
+    export it on every rerun without scraping again
+
+    Parameter
+    ----------
+    key:                                Name of the job slot in the session
+    columns:                            Columns to show, None or empty to show all columns
+    ----------
+
+    Returns
+    ----------
+    Pandas DataFrame, or None if nothing was scraped yet or the result was evicted from the cache
+    ----------
+    """
+
+    if f'result_{key}' not in st.session_state:
+        return None
+
+    query = st.session_state[f'result_{key}']
+    frame = getResultCache().get(query)
+    if frame is None:
+        del st.session_state[f'result_{key}']
+        st.info('The result of the last extraction no longer fits in the result cache. Extract it again to see it.')
+        return None
+
+    missing = [column for column in columns or [] if column not in frame.columns]
+    if missing:
+        st.info(f'**Fields not in the last extraction**: {missing}. Extract again to include them.')
+    showFailures(key)
+    return selectColumns(frame, columns)
+
+
+def downloadResult(key, fmt='CSV', columns=None):
+    """
+    Renders a download button, and a button saving the file to the export directory, for the last scrape of the job
+    slot; the export is written to a temporary file chunk by chunk, once per format and column selection, but the
+    download button reads the whole file into memory to serve it, so exports larger than MAX_DOWNLOAD_BYTES can only
+    be saved to the export directory
+
+    Parameter
+    ----------
+    key:                                Name of the job slot in the session
+    fmt:                                Name of the format in EXPORT_FORMATS
+    columns:                            Columns to export, None or empty to export all columns
+    ----------
+    """
+
+    query = st.session_state.get(f'result_{key}')
+    export = getResultCache().export(query, (fmt, tuple(columns or ())),
+                                     lambda frame: ExportFile(frame, fmt, columns)) if query is not None else None
+    if export is None:
+        return
+
+    size = export.size()
+    if size > MAX_DOWNLOAD_BYTES:
+        st.warning(f'The {fmt} export is {size / 1024 ** 2:.0f} MB, too large to download through the browser. Save '
+                   f'it to the export directory instead.')
+    else:
+        with export.open() as f:
+            st.download_button(f'Download {fmt}',
+                               data=f,
+                               file_name=export.file_name,
+                               mime=export.mime,
+                               key=f'download_{key}')
+    if st.button('Save to the Export Directory', key=f'save_{key}'):
+        extension = EXPORT_FORMATS[fmt][0]
+        path = export.saveTo(file_name=f'{key}-{time.strftime("%Y%m%d-%H%M%S")}{extension}')
+        st.success(f'Saved to {path}')
+
+
+def showRarity(key, verbose_level=0):
+    """
+    Renders the tokens of the last scrape of the job slot ranked by the rarity of their traits; the ranking is kept
+    beside the result in the result cache, so reruns do not score the collection again
+
+    Parameter
+    ----------
+    key:                                Name of the job slot in the session
+    verbose_level:                      The number of tokens to display, 0 to display every token
+    ----------
+    """
+
+    query = st.session_state.get(f'result_{key}')
+    if query is None:
+        return
+
+    try:
+        ranking = getResultCache().export(query, ('rarity',), rankRarity)
+    except KeyError:
+        st.error('Error: The extraction has no traits field. Select it in the outputs and extract again.')
+        return
+
+    if ranking is not None:
+        st.dataframe(ranking.head(verbose_level) if verbose_level != 0 else ranking, height=600, width=800)
+
+
+def showSalesSeries(key, freq='1D', currency='eth'):
+    """
+    Merges the events of the last scrape of the job slot into the sales series of its query, shared by the sessions
+    scraping the same query, and renders the series of every collection; events already merged by an earlier scrape
+    are skipped, so refreshes only aggregate what is new
+
+    Parameter
+    ----------
+    key:                                Name of the job slot in the session
+    freq:                               Fixed-width Pandas offset alias of the buckets, such as 1H, 1D or 7D
+    currency:                           Currency of the OHLC and floor prices, eth or usd
+    ----------
+    """
+
+    query = st.session_state.get(f'result_{key}')
+    if query is None:
+        return
+
+    series = getSalesSeries(freq, currency, scope=st.session_state.get(f'scope_{key}'))
+
+    def build(frame):
+        added = series.update(frame)
+        if added:
+            series.save()
+        return series.series()
+
+    try:
+        ohlc = getResultCache().export(query, ('sales', freq, currency), build)
+    except KeyError as ex:
+        st.error(f'{ex.args[0]} Select them in the outputs and extract again.')
+        return
+
+    if ohlc is None or len(ohlc) == 0:
+        st.info('No sales or listings with a price found in the extraction.')
+        return
+
+    collection = st.selectbox('Collection', tuple(ohlc['collection'].unique()), key=f'series_{key}')
+    chart = ohlc[ohlc['collection'] == collection].set_index('bucket')
+    st.line_chart(chart[['open', 'high', 'low', 'close', 'floor']])
+    st.bar_chart(chart[f'volume_{currency}'])
+    st.dataframe(chart, height=600, width=800)
+
+
+def showProfileReport(data: pandas.DataFrame, mode: str = 'Sample', rows: int = DEFAULT_SAMPLE_ROWS):
+    """
+    Renders a profile of the DataFrame on a sample of its rows, as summary statistics streamed over every row or on
+    every row; reports are cached per dataset, so reruns over the same data render at once
+
+    Parameter
+    ----------
+    data:                               Pandas DataFrame to profile
+    mode:                               One of Sample, Chunked or Full
+    rows:                               Number of rows profiled in the Sample mode
+    ----------
+    """
+
+    if mode == 'Sample' and len(data) > rows:
+        st.caption(f'Profiled on a random sample of {rows} of {len(data)} rows.')
+
+    report = profileReport(data, mode=mode, rows=rows)
+    if mode == 'Chunked':
+        st.dataframe(report, height=600, width=800)
     else:
-        raise AssertionError(f'{type(test)} is not the same as {type(default)}. Try again.')
+        components.html(report, height=1000, scrolling=True)
 
 
 def printDataFrame(data: pandas.DataFrame, verbose_level: int, advanced: bool,
-                   extract_from: str or None = None):
+                   extract_from: str or None = None, profile_mode: str = 'Sample',
+                   profile_rows: int = DEFAULT_SAMPLE_ROWS):
     """
     Takes in a Pandas DataFrame and prints out the DataFrame in Streamlit
 
@@ -33,6 +406,8 @@ def printDataFrame(data: pandas.DataFrame, verbose_level: int, advanced: bool,
     extract_from:                       Name of column to extract data from
     verbose_level:                      The number of rows of data to display
     advanced:                           Conduct Advanced Analysis on the DataFrame
+    profile_mode:                       How the Advanced Analysis profiles the DataFrame, see showProfileReport()
+    profile_rows:                       Number of rows profiled in the Sample mode
     dtm:                                Special processing for DTMs
     ----------
     """
@@ -54,14 +429,10 @@ def printDataFrame(data: pandas.DataFrame, verbose_level: int, advanced: bool,
             if advanced:
                 if extract_from is not None:
                     with st.expander('Advanced Profile Report'):
-                        st_profile_report(data[[extract_from]].profile_report(
-                            explorative=True,
-                            minimal=True))
+                        showProfileReport(data[[extract_from]], profile_mode, profile_rows)
                 else:
                     with st.expander('Advanced Profile Report'):
-                        st_profile_report(data.profile_report(
-                            explorative=True,
-                            minimal=True))
+                        showProfileReport(data, profile_mode, profile_rows)
     else:
         try:
             if extract_from is not None:
@@ -79,11 +450,7 @@ def printDataFrame(data: pandas.DataFrame, verbose_level: int, advanced: bool,
             if advanced:
                 if extract_from is not None:
                     with st.expander('Advanced Profile Report'):
-                        st_profile_report(data[[extract_from]].profile_report(
-                            explorative=True,
-                            minimal=True))
+                        showProfileReport(data[[extract_from]], profile_mode, profile_rows)
                 else:
                     with st.expander('Advanced Profile Report'):
-                        st_profile_report(data.profile_report(
-                            explorative=True,
-                            minimal=True))
+                        showProfileReport(data, profile_mode, profile_rows)
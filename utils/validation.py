@@ -0,0 +1,17 @@
+"""
+This file contains the input checks used by the marketplace classes, kept apart from the UI helpers so that the classes
+can be imported without streamlit
+"""
+
+
+def assertType(default, test, conditions=None):
+    if isinstance(test, default):
+        if conditions is not None:
+            if test in conditions:
+                return True
+            else:
+                raise AssertionError(f'{test} is not one of the accepted parameter {conditions}')
+        else:
+            return True
+    else:
+        raise AssertionError(f'{type(test)} is not the same as {type(default)}. Try again.')